@@ -0,0 +1,259 @@
+""" benchmarks (run with python -m image_meta.benchmark) """
+
+import io
+import os
+import sys
+import glob
+import time
+import random
+import re
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+from image_meta.geo import Geo
+from image_meta.geocoder import GeoClient
+from image_meta.geoserver import NominatimServer
+from image_meta.controller import Controller
+from image_meta.persistence import Persistence
+
+class Benchmark:
+    """ throughput measurements against local stand-ins (no remote services) """
+
+    # latency in seconds / server rate limit in requests per second (None: no limit)
+    LATENCIES = [0.,0.02,0.1]
+    SERVER_RATES = [None,50.,10.]
+
+    @staticmethod
+    def get_image_coordinates(num_images=100,latlon=(49.0,8.4),spread=0.05,seed=0)->dict:
+        """ synthetic image coordinates { image filename: geo dict (lat,lon,ele) } """
+        rnd = random.Random(seed)
+        return {f"img_{i:05d}.jpg":{"lat":latlon[0]+rnd.uniform(-spread,spread),
+                                    "lon":latlon[1]+rnd.uniform(-spread,spread),"ele":100.}
+                for i in range(num_images)}
+
+    @staticmethod
+    def benchmark_geocoding(num_images=100,latency=0.,server_rate=None,client_rate=1000.,
+                            cluster_radius=0,debug=False)->dict:
+        """ measures folder throughput of Controller.augment_gps_data with a
+            GeoClient pointed to a local NominatimServer, returns result dict """
+        server = NominatimServer(latency=latency,rate=server_rate)
+        server.start()
+        client = GeoClient(url=server.url,rate=client_rate,burst=1,retries=10,backoff=0.05)
+        img_coordinates = Benchmark.get_image_coordinates(num_images)
+
+        with tempfile.TemporaryDirectory() as img_path:
+            params = {Controller.TEMPLATE_CREATE_GEO_METADATA:True,
+                      Controller.PARAM_GEO_CLIENT:client}
+            geo_clusters = {}
+            if cluster_radius:
+                geo_clusters = Geo.cluster_latlon({k:(v["lat"],v["lon"]) for k,v in img_coordinates.items()},
+                                                  radius=cluster_radius)
+            geo_cache = {}
+            num_found = 0
+            t_start = time.perf_counter()
+            # augment_gps_data prints per image, output is suppressed during measurement
+            with redirect_stdout(io.StringIO()):
+                for img,geo_dict in img_coordinates.items():
+                    gps_data = Controller.augment_gps_data(os.path.join(img_path,img),geo_dict,params,{},
+                                                           latlon_geocode=geo_clusters.get(img),geo_cache=geo_cache)
+                    if gps_data.get("City"):
+                        num_found += 1
+            duration = time.perf_counter() - t_start
+
+        server.stop()
+
+        result = {"images":num_images,"latency":latency,"server_rate":server_rate,"client_rate":client_rate,
+                  "cluster_radius":cluster_radius,"duration":round(duration,3),
+                  "images_per_s":round(num_images/duration,1),"found":num_found,
+                  "requests":client.num_requests,"rejected":server.num_rejected,
+                  "client_wait":round(client.wait_time,3)}
+        if debug:
+            print(f"[Benchmark] {result}")
+        return result
+
+    @staticmethod
+    def benchmark_geocoding_grid(num_images=100,latencies=None,server_rates=None,client_rate=1000.,
+                                 cluster_radius=0,debug=True)->list:
+        """ runs geocoding benchmark for all combinations of latency and server rate limit """
+        if latencies is None:
+            latencies = Benchmark.LATENCIES
+        if server_rates is None:
+            server_rates = Benchmark.SERVER_RATES
+        results = []
+        for latency in latencies:
+            for server_rate in server_rates:
+                results.append(Benchmark.benchmark_geocoding(num_images=num_images,latency=latency,
+                                                             server_rate=server_rate,client_rate=client_rate,
+                                                             cluster_radius=cluster_radius,debug=False))
+        if debug:
+            Benchmark.print_results(results)
+        return results
+
+    @staticmethod
+    def create_file_tree(path:str,num_files=1000000,files_per_dir=500,dirs_per_dir=20,
+                         ext=["jpg","arw","xmp","txt"])->int:
+        """ creates a synthetic directory tree with empty files (round robin extensions),
+            returns number of created files """
+        num_dirs = max(1,num_files // files_per_dir)
+        created = 0
+        for d in range(num_dirs):
+            # directory path from digits of directory number (dirs_per_dir subfolders per level)
+            parts = []
+            n = d
+            while True:
+                parts.append(f"d{n % dirs_per_dir:02d}")
+                n //= dirs_per_dir
+                if n == 0:
+                    break
+            dirpath = os.path.join(path,*reversed(parts))
+            os.makedirs(dirpath,exist_ok=True)
+            for i in range(min(files_per_dir,num_files-created)):
+                with open(os.path.join(dirpath,f"img_{d:06d}_{i:04d}.{ext[i % len(ext)]}"),"wb"):
+                    pass
+                created += 1
+        return created
+
+    @staticmethod
+    def walk_files_os_walk(fp:str,ext=None)->list:
+        """ reference: directory listing as previously done in Persistence.get_file_list_mult
+            (os.walk, os.path.ismount per directory, Path.stat per attribute) """
+        ext_set = Persistence.get_ext_set(ext)
+        result = []
+        for subpath,_,files in os.walk(fp):
+            is_mount = os.path.ismount(subpath)
+            file_list = []
+            for f in files:
+                if ( ext_set is not None ) and ( Path(f).suffix.lower() not in ext_set ):
+                    continue
+                file_abspath = os.path.join(subpath,f)
+                file_list.append((f,Path(file_abspath).stat().st_size,Path(file_abspath).stat().st_ctime,
+                                  Path(file_abspath).stat().st_mtime))
+            result.append((subpath,is_mount,file_list))
+        return result
+
+    @staticmethod
+    def benchmark_file_list(num_files=1000000,path=None,ext=None,debug=True)->list:
+        """ compares directory listing of a synthetic tree: os.walk based reference vs
+            Persistence.walk_files (scandir) / walk_files_parallel, glob vs Persistence.get_file_names,
+            and the complete Persistence.get_file_list_mult, returns result dicts """
+        results = []
+        with tempfile.TemporaryDirectory(dir=path) as tmp_path:
+            t_start = time.perf_counter()
+            created = Benchmark.create_file_tree(tmp_path,num_files=num_files)
+            if debug:
+                print(f"[Benchmark] created {created} files in {round(time.perf_counter()-t_start,1)}s")
+
+            def measure(name,f):
+                t_start = time.perf_counter()
+                out = f()
+                duration = time.perf_counter() - t_start
+                results.append({"method":name,"files":created,"ext":str(ext),"duration":round(duration,3),
+                                "files_per_s":round(created/duration)})
+                return out
+
+            reference = measure("os.walk + Path.stat",lambda:Benchmark.walk_files_os_walk(tmp_path,ext=ext))
+            walked = measure("Persistence.walk_files",lambda:list(Persistence.walk_files(tmp_path,ext=ext)))
+            walked_parallel = measure("Persistence.walk_files_parallel",
+                                      lambda:Persistence.walk_files_parallel([tmp_path],ext=ext))
+            if debug and ( ( reference != walked ) or ( reference != walked_parallel ) ):
+                print("[Benchmark] listings differ")
+            measure("Persistence.get_file_list_mult",lambda:Persistence.get_file_list_mult(tmp_path,ext=ext))
+
+            # jpg files per folder: glob vs scandir
+            dirs = [subpath for subpath,_,_ in reference]
+            measure("glob (jpg per folder)",lambda:[list(map(os.path.normpath,glob.glob(os.path.join(d,"*.jp*g"))))
+                                                    for d in dirs])
+            measure("Persistence.get_file_names",lambda:[Persistence(d).get_file_names() for d in dirs])
+
+        if debug:
+            Benchmark.print_results(results)
+        return results
+
+    @staticmethod
+    def group_files_reference(filelist:dict,regex_list:list,file_match_type="ANY",single_match=True)->dict:
+        """ reference: file grouping as previously done in Persistence.get_file_groups
+            (re.match for each rule and each file) """
+        filegroup_dict = {}
+        for f in filelist.keys():
+            file_regex_match_list = []
+            regex_match_result_list = []
+            for r in regex_list:
+                m = re.match(r,f)
+                file_regex_match_list.append(m is not None)
+                if m:
+                    regex_match_result_list.append(m.groups()[0])
+            if file_match_type == "ALL":
+                file_match_result = all(file_regex_match_list)
+            else:
+                file_match_result = any(file_regex_match_list)
+            if file_match_result:
+                for regex_match_result in regex_match_result_list:
+                    fg_list = filegroup_dict.get(regex_match_result,[])
+                    for p in filelist[f]["path"]:
+                        fg_list.append(os.path.join(p,f))
+                    filegroup_dict[regex_match_result] = fg_list
+                    if single_match:
+                        break
+        return filegroup_dict
+
+    @staticmethod
+    def benchmark_file_groups(num_files=500000,regex_list=None,debug=True)->list:
+        """ compares file grouping of a synthetic file listing (as returned by get_file_list_mult,
+            no file system access): re.match per rule and file vs Persistence.group_files (RuleSet) """
+        if regex_list is None:
+            regex_list = [r"^(DSC\d{5})",r"^(IMG_\d{4})",r"^img_(\d{4})",r"^(img_\d{6})_"]
+        ext = ["jpg","arw","xmp","txt"]
+        filelist = {}
+        for n in range(num_files):
+            d,i = divmod(n,500)
+            filelist[f"img_{d:06d}_{i:04d}.{ext[i % len(ext)]}"] = {"path":[f"/archive/d{d % 20:02d}"]}
+
+        results = []
+        for file_match_type,single_match in [("ANY",True),("ANY",False),("ALL",True)]:
+            durations = {}
+            outputs = {}
+            for name,f in [("re.match per rule",Benchmark.group_files_reference),
+                           ("Persistence.group_files",Persistence.group_files)]:
+                t_start = time.perf_counter()
+                outputs[name] = f(filelist,regex_list,file_match_type=file_match_type,single_match=single_match)
+                durations[name] = time.perf_counter() - t_start
+                results.append({"method":name,"files":num_files,"match":file_match_type,"single":single_match,
+                                "groups":len(outputs[name]),"duration":round(durations[name],3),
+                                "files_per_s":round(num_files/durations[name])})
+            if debug and ( len(set([str(o) for o in outputs.values()])) > 1 ):
+                print(f"[Benchmark] file groups differ ({file_match_type},{single_match})")
+
+        if debug:
+            Benchmark.print_results(results)
+        return results
+
+    @staticmethod
+    def print_results(results:list):
+        """ prints list of result dicts as table """
+        if not results:
+            return
+        keys = list(results[0].keys())
+        widths = [max(len(k),*[len(str(r[k])) for r in results]) for k in keys]
+        print(" | ".join([k.rjust(w) for k,w in zip(keys,widths)]))
+        print("-+-".join(["-"*w for w in widths]))
+        for r in results:
+            print(" | ".join([str(r[k]).rjust(w) for k,w in zip(keys,widths)]))
+
+if __name__ == "__main__":
+    # python -m image_meta.benchmark [geo|files|groups] [number of files]
+    benchmarks = sys.argv[1:2] or ["geo","files"]
+    if "geo" in benchmarks:
+        print("### Geocoding throughput (Controller.augment_gps_data vs local NominatimServer)")
+        Benchmark.benchmark_geocoding_grid(num_images=50)
+        print("\n### client rate limited to server rate (no 429 responses)")
+        Benchmark.benchmark_geocoding_grid(num_images=50,latencies=[0.02],server_rates=[10.],client_rate=10.)
+    if "files" in benchmarks:
+        num_files = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+        print(f"\n### Directory listing ({num_files} files)")
+        Benchmark.benchmark_file_list(num_files=num_files)
+        print(f"\n### Directory listing ({num_files} files, extension filter jpg)")
+        Benchmark.benchmark_file_list(num_files=num_files,ext=["jpg"])
+    if "groups" in benchmarks:
+        num_files = int(sys.argv[2]) if len(sys.argv) > 2 else 500000
+        print(f"\n### File grouping ({num_files} files)")
+        Benchmark.benchmark_file_groups(num_files=num_files)
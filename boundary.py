@@ -0,0 +1,296 @@
+""" offline lookup of administrative boundaries (point in polygon) """
+
+import os
+import json
+import traceback
+from math import floor
+
+class BoundaryIndex:
+    """ loads administrative boundary polygons from GeoJSON (or shapefiles if
+        pyshp is installed) and resolves lat lon coordinates into country,
+        state and city, using a grid index of polygon bounding boxes and an
+        exact point in polygon test. Result is a flattened dict using the
+        same keys as Geo.nominatimreverse2dict, so it can be used
+        for ExifTool.map_geo2exif
+    """
+
+    # grid cell size in degrees for the bounding box index
+    GRID_SIZE = 1.0
+
+    # OSM admin levels mapped to reverse geo attribute
+    # (https://wiki.openstreetmap.org/wiki/Key:admin_level)
+    LEVEL_COUNTRY = "country"
+    LEVEL_STATE = "state"
+    LEVEL_CITY = "city"
+    ADMIN_LEVELS = {2:LEVEL_COUNTRY,4:LEVEL_STATE,8:LEVEL_CITY}
+
+    # feature properties to look up (in this order), covers OSM boundary exports
+    # and Natural Earth admin files
+    PROPERTIES_NAME = ("name","NAME","name_de","ADMIN","admin")
+    PROPERTIES_LEVEL = ("admin_level","ADMIN_LEVEL")
+    PROPERTIES_COUNTRY_CODE = ("ISO3166-1:alpha2","ISO3166-1","ISO_A2","iso_a2","country_code")
+
+    # reverse geo keys per level (top down), used to merge with nominatim data,
+    # levels are compared by the first key found (country by code)
+    REVERSE_KEYS = ((LEVEL_COUNTRY,("address_country_code","address_country")),
+                    (LEVEL_STATE,("address_state",)),
+                    (LEVEL_CITY,("address_city","address_town","address_village")))
+    # nominatim keys describing the location below city level
+    REVERSE_KEYS_DETAIL = ("properties_name","properties_display_name")
+
+    def __init__(self,grid_size=GRID_SIZE,admin_levels=None,debug=False):
+        """ constructor: grid size of bounding box index in degrees,
+            admin_levels: optional mapping admin level > (country,state,city),
+            levels may be strings (json keys) """
+        self.debug = debug
+        self.grid_size = grid_size
+        if admin_levels is None:
+            admin_levels = BoundaryIndex.ADMIN_LEVELS
+        self.admin_levels = {int(k):v for k,v in admin_levels.items()}
+        # polygons: list of dicts (level,name,country_code,bbox,polygons)
+        self.boundaries = []
+        # grid cell (lat,lon) > list of boundary indices
+        self.grid = {}
+        self.files = []
+
+    @staticmethod
+    def get_property(properties:dict,keys:tuple,default=None):
+        """ returns first property value found for a list of keys """
+        for k in keys:
+            v = properties.get(k)
+            if v is not None and v != "":
+                return v
+        return default
+
+    @staticmethod
+    def get_polygons(geometry:dict)->list:
+        """ returns list of polygons (each a list of rings [(lon,lat),...])
+            for a GeoJSON Polygon or MultiPolygon geometry """
+        if not isinstance(geometry,dict):
+            return []
+        geo_type = geometry.get("type")
+        coords = geometry.get("coordinates",[])
+        if geo_type == "Polygon":
+            polygons = [coords]
+        elif geo_type == "MultiPolygon":
+            polygons = coords
+        else:
+            return []
+        return [[[(float(p[0]),float(p[1])) for p in ring] for ring in polygon]
+                for polygon in polygons]
+
+    @staticmethod
+    def get_bbox(polygons:list)->tuple:
+        """ bounding box (lat_min,lon_min,lat_max,lon_max) of outer rings """
+        lons = [p[0] for polygon in polygons for p in polygon[0]]
+        lats = [p[1] for polygon in polygons for p in polygon[0]]
+        return (min(lats),min(lons),max(lats),max(lons))
+
+    @staticmethod
+    def point_in_polygon(latlon,polygon:list)->bool:
+        """ ray casting (even odd rule) over all rings of a polygon,
+            holes are handled since they are rings too """
+        lat,lon = latlon
+        inside = False
+        for ring in polygon:
+            n = len(ring)
+            j = n - 1
+            for i in range(n):
+                xi,yi = ring[i]
+                xj,yj = ring[j]
+                if ((yi > lat) != (yj > lat)) and \
+                   (lon < (xj - xi) * (lat - yi) / (yj - yi) + xi):
+                    inside = not inside
+                j = i
+        return inside
+
+    def get_cells(self,bbox:tuple):
+        """ grid cells covered by a bounding box """
+        lat_min,lon_min,lat_max,lon_max = bbox
+        g = self.grid_size
+        for lat_cell in range(floor(lat_min/g),floor(lat_max/g)+1):
+            for lon_cell in range(floor(lon_min/g),floor(lon_max/g)+1):
+                yield (lat_cell,lon_cell)
+
+    def add_feature(self,feature:dict,admin_level=None)->bool:
+        """ adds a GeoJSON feature, admin level is read from feature properties
+            (admin_level) if not supplied """
+        properties = feature.get("properties") or {}
+        if admin_level is None:
+            admin_level = BoundaryIndex.get_property(properties,BoundaryIndex.PROPERTIES_LEVEL)
+        try:
+            level = self.admin_levels.get(int(admin_level))
+        except (TypeError,ValueError):
+            level = None
+        if level is None:
+            return False
+
+        polygons = BoundaryIndex.get_polygons(feature.get("geometry"))
+        if not polygons:
+            return False
+
+        bbox = BoundaryIndex.get_bbox(polygons)
+        country_code = BoundaryIndex.get_property(properties,BoundaryIndex.PROPERTIES_COUNTRY_CODE)
+        if isinstance(country_code,str):
+            country_code = country_code.lower()
+
+        boundary = {"level":level,
+                    "name":BoundaryIndex.get_property(properties,BoundaryIndex.PROPERTIES_NAME),
+                    "country_code":country_code,
+                    "bbox":bbox,
+                    "area":(bbox[2]-bbox[0])*(bbox[3]-bbox[1]),
+                    "polygons":polygons}
+
+        idx = len(self.boundaries)
+        self.boundaries.append(boundary)
+        for cell in self.get_cells(bbox):
+            self.grid.setdefault(cell,[]).append(idx)
+        return True
+
+    def add_file(self,filepath:str,admin_level=None)->int:
+        """ reads boundaries from a GeoJSON file or shapefile (requires pyshp),
+            admin_level can be supplied for files containing a single level only
+            (eg Natural Earth admin_0 / admin_1). returns number of added boundaries """
+
+        if not os.path.isfile(filepath):
+            print(f"[BoundaryIndex] {filepath} is not a file")
+            return 0
+
+        features = []
+        suffix = os.path.splitext(filepath)[1][1:].lower()
+
+        try:
+            if suffix == "shp":
+                try:
+                    import shapefile
+                except ImportError:
+                    print("[BoundaryIndex] reading shapefiles requires pyshp (pip install pyshp)")
+                    return 0
+                with shapefile.Reader(filepath) as reader:
+                    for sr in reader.iterShapeRecords():
+                        features.append({"properties":sr.record.as_dict(),
+                                         "geometry":sr.shape.__geo_interface__})
+            else:
+                with open(filepath,encoding="utf-8") as f:
+                    geo_json = json.load(f)
+                if geo_json.get("type") == "Feature":
+                    features = [geo_json]
+                else:
+                    features = geo_json.get("features",[])
+        except:
+            print(f"[BoundaryIndex] Error reading boundary file {filepath}")
+            print(traceback.format_exc())
+            return 0
+
+        num = 0
+        for feature in features:
+            if self.add_feature(feature,admin_level=admin_level):
+                num += 1
+
+        self.files.append(filepath)
+
+        if self.debug:
+            print(f"[BoundaryIndex] {filepath}: {num} of {len(features)} features added, {len(self.grid)} grid cells")
+
+        return num
+
+    def lookup(self,latlon)->dict:
+        """ returns the boundaries containing latlon as dict level > boundary,
+            in case of overlaps the boundary with smallest extension is used """
+        try:
+            lat,lon = float(latlon[0]),float(latlon[1])
+        except (TypeError,ValueError,IndexError):
+            return {}
+
+        g = self.grid_size
+        cell = (floor(lat/g),floor(lon/g))
+        found = {}
+        for idx in self.grid.get(cell,[]):
+            boundary = self.boundaries[idx]
+            lat_min,lon_min,lat_max,lon_max = boundary["bbox"]
+            if not ( lat_min <= lat <= lat_max and lon_min <= lon <= lon_max ):
+                continue
+            level = boundary["level"]
+            if level in found and found[level]["area"] <= boundary["area"]:
+                continue
+            if any(BoundaryIndex.point_in_polygon((lat,lon),p) for p in boundary["polygons"]):
+                found[level] = boundary
+        return found
+
+    def reverse(self,latlon,debug=False)->dict:
+        """ reverse lookup of lat lon coordinates, returns flattened dict in
+            nominatim format (address_country, address_country_code,
+            address_state, address_city) or empty dict if nothing was found """
+
+        found = self.lookup(latlon)
+        if not found:
+            return {}
+
+        geo_dict = {}
+        country = found.get(BoundaryIndex.LEVEL_COUNTRY)
+        if country is not None:
+            geo_dict["address_country"] = country["name"]
+            if country["country_code"] is not None:
+                geo_dict["address_country_code"] = country["country_code"]
+        state = found.get(BoundaryIndex.LEVEL_STATE)
+        if state is not None:
+            geo_dict["address_state"] = state["name"]
+            if ( "address_country_code" not in geo_dict ) and ( state["country_code"] is not None ):
+                geo_dict["address_country_code"] = state["country_code"]
+        city = found.get(BoundaryIndex.LEVEL_CITY)
+        if city is not None:
+            geo_dict["address_city"] = city["name"]
+
+        # drop empty names
+        geo_dict = {k:v for k,v in geo_dict.items() if v is not None}
+        geo_dict["address_keys"] = list(geo_dict.keys())
+        geo_dict["latlon"] = [round(float(latlon[0]),5),round(float(latlon[1]),5)]
+
+        if debug or self.debug:
+            print(f"[BoundaryIndex] {latlon} -> {geo_dict}")
+
+        return geo_dict
+
+    @staticmethod
+    def merge(reverse_geo:dict,boundary_geo:dict)->dict:
+        """ merges boundary data (see reverse) into nominatim reverse geo data: levels down to the
+            first level where boundary and nominatim differ are taken from nominatim (missing ones
+            from boundary), from there on only boundary data are used and the nominatim address below
+            (eg city, display name of a neighbouring country) is dropped """
+        reverse_geo = dict(reverse_geo or {})
+        if not boundary_geo:
+            return reverse_geo
+
+        def get_value(geo_dict:dict,keys:tuple):
+            for k in keys:
+                v = geo_dict.get(k)
+                if v is not None:
+                    return str(v).lower()
+            return None
+
+        differs = False
+        kept_keys = []
+        for _,keys in BoundaryIndex.REVERSE_KEYS:
+            if not differs:
+                boundary_value = get_value(boundary_geo,keys)
+                reverse_value = get_value(reverse_geo,keys)
+                if ( boundary_value is not None ) and ( reverse_value is not None ) and ( boundary_value != reverse_value ):
+                    differs = True
+            if differs:
+                for k in keys:
+                    reverse_geo.pop(k,None)
+            else:
+                kept_keys.extend(keys)
+            for k in keys:
+                if ( k in boundary_geo ) and ( reverse_geo.get(k) is None ):
+                    reverse_geo[k] = boundary_geo[k]
+
+        # drop nominatim address details below the first differing level
+        if differs:
+            for k in list(reverse_geo.keys()):
+                if k in BoundaryIndex.REVERSE_KEYS_DETAIL or \
+                   ( k.startswith("address_") and ( k != "address_keys" ) and not ( k in kept_keys or k in boundary_geo ) ):
+                    reverse_geo.pop(k)
+        if "address_keys" in reverse_geo:
+            reverse_geo["address_keys"] = [k for k in reverse_geo.keys() if k.startswith("address_") and k != "address_keys"]
+        return reverse_geo
@@ -0,0 +1,200 @@
+""" persistent file catalog (SQLite) with incremental rescans """
+
+import os
+import sqlite3
+import time
+import traceback
+from image_meta.persistence import Persistence
+
+class FileCatalog:
+    """ SQLite catalog of directories and files (name, size, ctime, mtime) of directory trees.
+        Directories are only scanned again if their mtime changed since the last scan,
+        unchanged directories are served from the catalog (one stat call per directory).
+        Note: the mtime of a directory changes when entries are added, removed or renamed,
+        changes of file contents only (without rename) are picked up with full=True, so
+        sizes / times of files from the catalog may be stale (operations on file contents
+        need to stat the files again, see Persistence.get_duplicates).
+        Directories modified within RACY_SECONDS before their scan are scanned again next time,
+        as changes in the same mtime tick after the scan wouldn't change the directory mtime
+    """
+
+    CATALOG_FILE = "file_catalog.sqlite"
+
+    SQL_CREATE = [
+        """CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT,
+           idx INTEGER, mtime_ns INTEGER)""",
+        "CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)",
+        """CREATE TABLE IF NOT EXISTS files (dir TEXT, idx INTEGER, name TEXT, size INTEGER,
+           ctime REAL, mtime REAL, PRIMARY KEY (dir,idx))""",
+        """CREATE TABLE IF NOT EXISTS file_hashes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+           partial TEXT, full TEXT)""",
+    ]
+
+    # all subdirectories of a directory (recursive)
+    SQL_SUBTREE = """WITH RECURSIVE subtree(path) AS (SELECT ? UNION ALL
+                     SELECT dirs.path FROM dirs JOIN subtree ON dirs.parent = subtree.path)
+                     SELECT path FROM subtree"""
+
+    # mtime for directories that were never scanned (or need to be scanned again)
+    MTIME_NEW = -1
+    # directories with mtime that close to the scan time are not trusted (racy timestamps)
+    RACY_SECONDS = 2
+
+    def __init__(self,db_path:str=None,debug=False):
+        """ opens / creates catalog database (default: CATALOG_FILE in current directory) """
+        self._debug = debug
+        if db_path is None:
+            db_path = FileCatalog.CATALOG_FILE
+        self._db_path = db_path
+        self._con = sqlite3.connect(db_path)
+        for sql in FileCatalog.SQL_CREATE:
+            self._con.execute(sql)
+        self._con.commit()
+        # statistics of last walk
+        self.num_scanned = 0
+        self.num_cached = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,exc_traceback):
+        self.close()
+
+    def close(self):
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    @staticmethod
+    def get_key(path:str)->str:
+        """ catalog key of a directory (normalized absolute path) """
+        return os.path.normpath(os.path.abspath(path))
+
+    def get_dir(self,key:str)->tuple:
+        """ catalog row (mtime_ns,) of a directory, None if not in catalog """
+        return self._con.execute("SELECT mtime_ns FROM dirs WHERE path = ?",(key,)).fetchone()
+
+    def get_files(self,key:str)->list:
+        """ [(filename,size,ctime,mtime)] of a directory from catalog (scan order) """
+        return self._con.execute("SELECT name,size,ctime,mtime FROM files WHERE dir = ? ORDER BY idx",
+                                 (key,)).fetchall()
+
+    def get_subdirs(self,key:str)->list:
+        """ keys of subdirectories of a directory from catalog (scan order) """
+        rows = self._con.execute("SELECT path FROM dirs WHERE parent = ? ORDER BY idx",(key,)).fetchall()
+        return [r[0] for r in rows]
+
+    def delete_tree(self,key:str):
+        """ deletes directory and all its subdirectories and files from catalog """
+        keys = [r[0] for r in self._con.execute(FileCatalog.SQL_SUBTREE,(key,)).fetchall()]
+        self._con.executemany("DELETE FROM files WHERE dir = ?",[(k,) for k in keys])
+        self._con.executemany("DELETE FROM dirs WHERE path = ?",[(k,) for k in keys])
+
+    def update_dir(self,key:str,parent:str,mtime_ns:int,files:list,subdir_keys:list):
+        """ stores scan result of a directory: files, subdirectories (removed ones are deleted) """
+        cur = self._con
+        cur.execute("""INSERT INTO dirs (path,parent,idx,mtime_ns) VALUES (?,?,0,?)
+                       ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns""",(key,parent,mtime_ns))
+        cur.execute("DELETE FROM files WHERE dir = ?",(key,))
+        cur.executemany("INSERT INTO files (dir,idx,name,size,ctime,mtime) VALUES (?,?,?,?,?,?)",
+                        [(key,i,*f) for i,f in enumerate(files)])
+        removed = set(self.get_subdirs(key)).difference(subdir_keys)
+        for subdir_key in removed:
+            self.delete_tree(subdir_key)
+        cur.executemany("""INSERT INTO dirs (path,parent,idx,mtime_ns) VALUES (?,?,?,?)
+                           ON CONFLICT(path) DO UPDATE SET parent = excluded.parent, idx = excluded.idx""",
+                        [(k,key,i,FileCatalog.MTIME_NEW) for i,k in enumerate(subdir_keys)])
+
+    def get_hashes(self,files:list)->dict:
+        """ cached content hashes for [(filepath,size,mtime_ns)], only if size and mtime_ns are unchanged
+            (pass live os.stat values, not the catalog's file rows), returns
+            { filepath: (partial hash, full hash) } (hashes may be None) """
+        hashes = {}
+        for filepath,size,mtime_ns in files:
+            row = self._con.execute("SELECT size,mtime_ns,partial,full FROM file_hashes WHERE path = ?",
+                                    (FileCatalog.get_key(filepath),)).fetchone()
+            if ( row is not None ) and ( row[0] == size ) and ( row[1] == mtime_ns ):
+                hashes[filepath] = (row[2],row[3])
+        return hashes
+
+    def set_hashes(self,hashes:list):
+        """ stores content hashes [(filepath,size,mtime_ns,partial hash,full hash)], a missing
+            hash (None) keeps a stored one of the same file version """
+        rows = [(FileCatalog.get_key(filepath),size,mtime_ns,partial,full) for filepath,size,mtime_ns,partial,full in hashes]
+        self._con.executemany("""INSERT INTO file_hashes (path,size,mtime_ns,partial,full) VALUES (?,?,?,?,?)
+                                 ON CONFLICT(path) DO UPDATE SET
+                                 partial = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns
+                                           THEN coalesce(excluded.partial,partial) ELSE excluded.partial END,
+                                 full = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns
+                                        THEN coalesce(excluded.full,full) ELSE excluded.full END,
+                                 size = excluded.size, mtime_ns = excluded.mtime_ns""",rows)
+        self._con.commit()
+
+    def walk_files(self,fp:str,ignore_paths=None,ext=None,full=False):
+        """ walks directory tree like Persistence.walk_files (same results and order),
+            directories with unchanged mtime are read from catalog, others are scanned and
+            the catalog is updated. full=True scans all directories.
+            Yields per directory (subpath, is_mount, [(filename,size,ctime,mtime)]) """
+        ext_set = Persistence.get_ext_set(ext)
+        ignore_list = Persistence.get_ignore_list(ignore_paths)
+        self.num_scanned = 0
+        self.num_cached = 0
+        try:
+            dev = os.stat(fp).st_dev
+        except OSError:
+            return
+
+        # (walk path,catalog key,parent key,is_mount,st_dev of parent)
+        stack = [(fp,FileCatalog.get_key(fp),None,os.path.ismount(fp),dev)]
+        try:
+            while stack:
+                subpath,key,parent,is_mount,parent_dev = stack.pop()
+                if ignore_list and Persistence.is_ignored(subpath,ignore_list):
+                    continue
+                try:
+                    stat = os.stat(subpath)
+                except OSError:
+                    continue
+                if parent is not None:
+                    is_mount = ( stat.st_dev != parent_dev )
+
+                row = self.get_dir(key)
+                if ( not full ) and ( row is not None ) and ( row[0] == stat.st_mtime_ns ):
+                    files = self.get_files(key)
+                    subdir_keys = self.get_subdirs(key)
+                    self.num_cached += 1
+                else:
+                    scan = Persistence.scan_dir(subpath)
+                    if scan is None:
+                        continue
+                    files,dirs = scan
+                    subdir_keys = [os.path.join(key,entry.name) for entry in dirs]
+                    mtime_ns = stat.st_mtime_ns
+                    if ( time.time_ns() - mtime_ns ) < FileCatalog.RACY_SECONDS * 1000000000:
+                        mtime_ns = FileCatalog.MTIME_NEW
+                    self.update_dir(key,parent,mtime_ns,files,subdir_keys)
+                    self.num_scanned += 1
+
+                if ext_set is not None:
+                    files = [f for f in files if os.path.splitext(f[0])[1].lower() in ext_set]
+                yield (subpath,is_mount,[tuple(f) for f in files])
+
+                for subdir_key in reversed(subdir_keys):
+                    stack.append((os.path.join(subpath,os.path.basename(subdir_key)),subdir_key,key,False,stat.st_dev))
+        except sqlite3.Error:
+            print(f"[FileCatalog] Exception accessing catalog {self._db_path}")
+            print(traceback.format_exc())
+        finally:
+            self._con.commit()
+
+        if self._debug:
+            print(f"[FileCatalog] {fp}: {self.num_scanned} directories scanned, {self.num_cached} from catalog")
+
+    def scan(self,fp:str,ignore_paths=None,full=False)->dict:
+        """ updates catalog for a directory tree, returns number of directories / files """
+        num_dirs = 0
+        num_files = 0
+        for _,_,files in self.walk_files(fp,ignore_paths=ignore_paths,full=full):
+            num_dirs += 1
+            num_files += len(files)
+        return {"dirs":num_dirs,"files":num_files,"scanned":self.num_scanned,"cached":self.num_cached}
@@ -2,12 +2,18 @@
 
 import os
 import pytz
-import time
 import traceback
 from image_meta.persistence import Persistence
 from image_meta.util import Util
 from image_meta.geo import Geo
 from image_meta.exif import ExifTool
+from image_meta.boundary import BoundaryIndex
+from image_meta.geocoder import GeoClient
+from image_meta.geocoder import GeoQueue
+from image_meta.track import Track
+from image_meta.track import TrackCache
+from image_meta.track import TrackTail
+from image_meta.tzconvert import TzConverter
 from pathlib import Path
 from datetime import datetime
 
@@ -55,6 +61,8 @@ class Controller(object):
     TEMPLATE_CALIB_IMG = "CALIB_IMG"
     TEMPLATE_CALIB_DATETIME = "CALIB_DATETIME"
     TEMPLATE_CALIB_OFFSET = "CALIB_OFFSET"
+    TEMPLATE_CALIB_ESTIMATE = "CALIB_ESTIMATE"
+    TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE = "CALIB_ESTIMATE_MIN_CONFIDENCE"
     TEMPLATE_GPX = "GPX"
     TEMPLATE_GPX_FILE = "GPX_FILE"
     TEMPLATE_GPX_FILE = "GPX_FILE_ACTIONS"
@@ -69,6 +77,28 @@ class Controller(object):
     TEMPLATE_DEFAULT_META_EXT = "DEFAULT_META_EXT"   
     TEMPLATE_DEFAULT_GPS_EXT = "DEFAULT_GPS_EXT"   
     TEMPLATE_GPS_READ_REMOTE = "GPS_READ_REMOTE"   
+    TEMPLATE_BOUNDARY = "BOUNDARY"
+    TEMPLATE_BOUNDARY_LEVEL = "BOUNDARY_LEVEL"
+    TEMPLATE_BOUNDARY_LEVELS = "BOUNDARY_LEVELS"
+    TEMPLATE_NOMINATIM_URL = "NOMINATIM_URL"
+    TEMPLATE_NOMINATIM_RATE = "NOMINATIM_RATE"
+    TEMPLATE_GEO_QUEUE = "GEO_QUEUE"
+    TEMPLATE_GEO_CLUSTER_RADIUS = "GEO_CLUSTER_RADIUS"
+    TEMPLATE_GPX_CACHE = "GPX_CACHE"
+    TEMPLATE_GPX_PATHS = "GPX_PATHS"
+    TEMPLATE_GPX_PRIORITY = "GPX_PRIORITY"
+    TEMPLATE_GPX_LIVE = "GPX_LIVE"
+    TEMPLATE_GPX_TIMEFRAME = "GPX_TIMEFRAME"
+    TEMPLATE_GPX_INTERPOLATE = "GPX_INTERPOLATE"
+    TEMPLATE_GPX_MAX_GAP = "GPX_MAX_GAP"
+    TEMPLATE_GPX_SIMPLIFY = "GPX_SIMPLIFY"
+    TEMPLATE_GPX_SIMPLIFY_INTERVAL = "GPX_SIMPLIFY_INTERVAL"
+
+    # runtime objects created in prepare_execution (not template parameters):
+    # geo client instance, image timestamps / coordinates read with exiftool
+    PARAM_GEO_CLIENT = "GEO_CLIENT"
+    PARAM_IMG_TAG_VALUES = "IMG_TAG_VALUES"
+    RUNTIME_PARAMS = [PARAM_GEO_CLIENT,PARAM_IMG_TAG_VALUES]
 
     TEMPLATE_PARAMS = [TEMPLATE_WORK_DIR,TEMPLATE_IMG_EXTENSIONS,TEMPLATE_EXIFTOOL, TEMPLATE_META, TEMPLATE_OVERWRITE_KEYWORD, 
                        TEMPLATE_OVERWRITE_META, TEMPLATE_KEYWORD_HIER, TEMPLATE_TECH_KEYWORDS, TEMPLATE_COPYRIGHT, 
@@ -79,7 +109,13 @@ class Controller(object):
                        TEMPLATE_CALIB_IMG, TEMPLATE_CALIB_DATETIME,TEMPLATE_CALIB_OFFSET,TEMPLATE_GPX, 
                        TEMPLATE_DEFAULT_LATLON,TEMPLATE_CREATE_LATLON,
                        TEMPLATE_CREATE_DEFAULT_LATLON,TEMPLATE_DEFAULT_MAP_DETAIL,
-                       TEMPLATE_DEFAULT_REVERSE_GEO,TEMPLATE_DEFAULT_GPS_EXT,TEMPLATE_DEFAULT_META_EXT,TEMPLATE_GPS_READ_REMOTE]
+                       TEMPLATE_DEFAULT_REVERSE_GEO,TEMPLATE_DEFAULT_GPS_EXT,TEMPLATE_DEFAULT_META_EXT,TEMPLATE_GPS_READ_REMOTE,
+                       TEMPLATE_BOUNDARY,TEMPLATE_BOUNDARY_LEVEL,TEMPLATE_BOUNDARY_LEVELS,TEMPLATE_NOMINATIM_URL,TEMPLATE_NOMINATIM_RATE,
+                       TEMPLATE_GEO_QUEUE,TEMPLATE_GEO_CLUSTER_RADIUS,TEMPLATE_GPX_CACHE,
+                       TEMPLATE_GPX_PATHS,TEMPLATE_GPX_PRIORITY,TEMPLATE_GPX_LIVE,
+                       TEMPLATE_GPX_TIMEFRAME,TEMPLATE_GPX_INTERPOLATE,TEMPLATE_GPX_MAX_GAP,
+                       TEMPLATE_GPX_SIMPLIFY,TEMPLATE_GPX_SIMPLIFY_INTERVAL,
+                       TEMPLATE_CALIB_ESTIMATE,TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE]
     
     # mapping template values to meta data
     TEMPLATE_META_MAP = {}
@@ -111,7 +147,22 @@ class Controller(object):
                                 TEMPLATE_CALIB_OFFSET:0,
                                 TEMPLATE_DEFAULT_GPS_EXT:"geo",
                                 TEMPLATE_DEFAULT_META_EXT:"meta",
-                                TEMPLATE_CREATE_GEO_METADATA:True }     
+                                TEMPLATE_CREATE_GEO_METADATA:True,
+                                TEMPLATE_BOUNDARY_LEVEL:None,
+                                TEMPLATE_BOUNDARY_LEVELS:None,
+                                TEMPLATE_NOMINATIM_URL:GeoClient.NOMINATIM_URL,
+                                TEMPLATE_NOMINATIM_RATE:GeoClient.RATE,
+                                TEMPLATE_GEO_QUEUE:False,
+                                TEMPLATE_GEO_CLUSTER_RADIUS:0,
+                                TEMPLATE_GPX_CACHE:True,
+                                TEMPLATE_GPX_LIVE:False,
+                                TEMPLATE_GPX_TIMEFRAME:None,
+                                TEMPLATE_GPX_INTERPOLATE:True,
+                                TEMPLATE_GPX_MAX_GAP:None,
+                                TEMPLATE_GPX_SIMPLIFY:0,
+                                TEMPLATE_GPX_SIMPLIFY_INTERVAL:0,
+                                TEMPLATE_CALIB_ESTIMATE:0,
+                                TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE:0.5 }     
 
     # artifact file extensions (gps data, metadata)
     ARTIFACT_EXT = ["_original",TEMPLATE_DEFAULT_VALUES[TEMPLATE_DEFAULT_GPS_EXT],TEMPLATE_DEFAULT_VALUES[TEMPLATE_DEFAULT_META_EXT]]
@@ -180,11 +231,34 @@ class Controller(object):
         tpl_dict["INFO_CALIB_OFFSET2"] = "      DATETIME_OFFSET = GPS_DATETIME - CAMERA_DATETIME"
         tpl_dict["INFO_CALIB_OFFSET3"] = "      Image datetime and gps datetime will be ignored if this value is <> 0"
         tpl_dict["CALIB_OFFSET"] = 0   
+        tpl_dict["INFO_CALIB_ESTIMATE"] = "INFO: Estimate offset from gpx track if there is no offset / calibration image: search window in seconds (0: off, eg 3600)"
+        tpl_dict["INFO_CALIB_ESTIMATE2"] = "      uses images with gps coordinates (distance to track), otherwise track coverage of images"
+        tpl_dict["CALIB_ESTIMATE"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_CALIB_ESTIMATE]
+        tpl_dict["INFO_CALIB_ESTIMATE_MIN_CONFIDENCE"] = "INFO: Estimated offset is only used with this confidence (0...1), otherwise offset stays 0"
+        tpl_dict["CALIB_ESTIMATE_MIN_CONFIDENCE"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE]
 
         tpl_dict["INFO_TIMEZONE"] = "INFO: Enter Time Zone (values as defined by pytz), default is 'Europe/Berlin'"
         tpl_dict["TIMEZONE"] = "Europe/Berlin"
         tpl_dict["INFO_GPX_FILE"] = "INFO: Filepath to your gpx file from your gps device"
         tpl_dict["GPX_FILE"] = "geo.gpx"       
+        tpl_dict["INFO_GPX_CACHE"] = "Cache parsed gpx tracks (True: folder .gpx_cache next to gpx file, False: off, or cache folder path)"
+        tpl_dict["GPX_CACHE"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GPX_CACHE]
+        tpl_dict["INFO_GPX_PATHS"] = "Additional gpx folders / glob patterns, all gpx files are merged into one track"
+        tpl_dict["GPX_PATHS"] = []
+        tpl_dict["INFO_GPX_LIVE"] = "GPX file is growing (live tracking), only appended track points are read (requires GPX_CACHE)"
+        tpl_dict["GPX_LIVE"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GPX_LIVE]
+        tpl_dict["INFO_GPX_TIMEFRAME"] = "Max time difference (s) between image and nearest gpx track point (None: no limit, eg 60)"
+        tpl_dict["GPX_TIMEFRAME"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GPX_TIMEFRAME]
+        tpl_dict["INFO_GPX_INTERPOLATE"] = "Interpolate image coordinates between the gpx track points before and after the image"
+        tpl_dict["GPX_INTERPOLATE"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GPX_INTERPOLATE]
+        tpl_dict["INFO_GPX_MAX_GAP"] = "Images taken in gaps of the gpx track longer than this (s) get no coordinates (None: no check, eg 300)"
+        tpl_dict["GPX_MAX_GAP"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GPX_MAX_GAP]
+        tpl_dict["INFO_GPX_SIMPLIFY"] = "Simplify gpx track before matching: tolerance in m (0: off, eg 5), track points next to images are kept"
+        tpl_dict["GPX_SIMPLIFY"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GPX_SIMPLIFY]
+        tpl_dict["INFO_GPX_SIMPLIFY_INTERVAL"] = "Simplify gpx track: keep about one track point per interval seconds (0: off)"
+        tpl_dict["GPX_SIMPLIFY_INTERVAL"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GPX_SIMPLIFY_INTERVAL]
+        tpl_dict["INFO_GPX_PRIORITY"] = "File name patterns of gpx devices in order of priority for overlapping tracks, eg ['*watch*','*phone*']"
+        tpl_dict["GPX_PRIORITY"] = []
         tpl_dict["INFO_DEFAULT_LATLON"] = "DEFAULT LAT LON COORDINATES if Geocoordinates or GPX Data can't be found"
         tpl_dict["DEFAULT_LATLON"] = (49.01304,8.40433)  
         tpl_dict["INFO_CREATE_LATLON"] = "Create LATLON FILE, values (0:ignore, C:create, R:read , U:update)"
@@ -199,6 +273,20 @@ class Controller(object):
         tpl_dict["DEFAULT_GPS_EXT"] = "geo"   
         tpl_dict["INFO_GPS_READ_REMOTE"] = "Read Remote Service Data"
         tpl_dict["GPS_READ_REMOTE"] = True                     
+        tpl_dict["INFO_BOUNDARY_FILE"] = "GeoJSON / shapefile with admin boundaries (admin_level 2,4,8) for offline country/state/city lookup"
+        tpl_dict["BOUNDARY_FILE"] = "boundaries.geojson"
+        tpl_dict["INFO_BOUNDARY_LEVEL"] = "Admin level of all boundaries in files without admin_level property, eg Natural Earth admin_0: 2, admin_1: 4 (None: read admin_level)"
+        tpl_dict["BOUNDARY_LEVEL"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_BOUNDARY_LEVEL]
+        tpl_dict["INFO_BOUNDARY_LEVELS"] = "Mapping admin level > country/state/city, eg {'2':'country','4':'state','6':'city'} (None: 2,4,8)"
+        tpl_dict["BOUNDARY_LEVELS"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_BOUNDARY_LEVELS]
+        tpl_dict["INFO_NOMINATIM_URL"] = "Nominatim Server Url (eg self hosted server)"
+        tpl_dict["NOMINATIM_URL"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_NOMINATIM_URL]
+        tpl_dict["INFO_NOMINATIM_RATE"] = "Max requests per second (public nominatim server: 1)"
+        tpl_dict["NOMINATIM_RATE"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_NOMINATIM_RATE]
+        tpl_dict["INFO_GEO_QUEUE"] = "Reverse geo lookups in background, location data will be written in a 2nd pass"
+        tpl_dict["GEO_QUEUE"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GEO_QUEUE]
+        tpl_dict["INFO_GEO_CLUSTER_RADIUS"] = "Radius (m) to cluster image coordinates, reverse geo lookup only for one image per cluster (0:off, eg 100)"
+        tpl_dict["GEO_CLUSTER_RADIUS"] = Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_GEO_CLUSTER_RADIUS]
 
         if not showinfo:
             keys = list(tpl_dict.keys())
@@ -296,11 +384,14 @@ class Controller(object):
         return control_params
 
     @staticmethod
-    def retrieve_nominatim_reverse(filepath=None,latlon=None,save=False,zoom=17,remote=False,debug=False)->dict:
+    def retrieve_nominatim_reverse(filepath=None,latlon=None,save=False,zoom=17,remote=False,debug=False,client=None,cache:dict=None)->dict:
         """ retrieves reverse geodata from a file, or from nominatim reverse service
             if file doesn't exist. Save will retrieve existing geodata.
             remote forces remote retrieve 
             Optional only data from file will be read if latlon is set to initial
+            client: GeoClient to be used (rate limit is done by client)
+            cache: dict (latlon,zoom) > reverse geo data, remote results are reused for same coordinates
+            failed lookups (error / http status) are neither cached nor saved, an empty dict is returned
         """
         geo_dict = {}
 
@@ -317,15 +408,27 @@ class Controller(object):
                 geo_dict = Persistence.read_json(filepath)
             except:
                 geo_dict = {}
+            # failed lookup saved by an earlier version: lookup again
+            if geo_dict and not GeoClient.is_valid_result(geo_dict):
+                geo_dict = {}
+                file_exists = False
         
         # read from nominatim reverse search
         if ((not geo_dict) and ( latlon is not None )): 
             if debug is True:
                 print(f"    reading reverse geo data for latlon {latlon}")
-            time.sleep(1) # graceful access to remote location
-            geo_dict = Geo.geo_reverse_from_nominatim(latlon,zoom=zoom,debug=debug)
-
-        if ((save is True) and (filepath is not None) and (file_exists is False)):
+            cache_key = (*[round(float(c),7) for c in latlon],zoom)
+            if ( cache is not None ) and ( cache_key in cache ):
+                geo_dict = dict(cache[cache_key])
+            else:
+                geo_dict = Geo.geo_reverse_from_nominatim(latlon,zoom=zoom,debug=debug,client=client)
+                if not GeoClient.is_valid_result(geo_dict):
+                    print(f"    No reverse geo data for latlon {latlon}: {geo_dict.get('error',geo_dict.get('http_status'))}")
+                    geo_dict = {}
+                elif cache is not None:
+                    cache[cache_key] = geo_dict
+
+        if ((save is True) and (filepath is not None) and (file_exists is False) and geo_dict):
             try:
                 Persistence.save_json(filepath=filepath,data=geo_dict)
                 if (debug is True):
@@ -435,6 +538,19 @@ class Controller(object):
         input_dict[Controller.TEMPLATE_DEFAULT_GPS_EXT] = template_dict.get(Controller.TEMPLATE_DEFAULT_GPS_EXT,"geo")
         input_dict[Controller.TEMPLATE_GPS_READ_REMOTE] = template_dict.get(Controller.TEMPLATE_GPS_READ_REMOTE,True)
 
+        # geo server client (shared per server url, so rate limit applies across runs)
+        nominatim_url = template_dict.get(Controller.TEMPLATE_NOMINATIM_URL,GeoClient.NOMINATIM_URL)
+        nominatim_rate = template_dict.get(Controller.TEMPLATE_NOMINATIM_RATE,GeoClient.RATE)
+        input_dict[Controller.TEMPLATE_NOMINATIM_URL] = nominatim_url
+        input_dict[Controller.TEMPLATE_NOMINATIM_RATE] = nominatim_rate
+        geo_client = GeoClient.get_client(url=nominatim_url,rate=nominatim_rate,debug=showinfo)
+        input_dict[Controller.PARAM_GEO_CLIENT] = geo_client
+        input_dict[Controller.TEMPLATE_GEO_QUEUE] = template_dict.get(Controller.TEMPLATE_GEO_QUEUE,False)
+        input_dict[Controller.TEMPLATE_GEO_CLUSTER_RADIUS] = template_dict.get(Controller.TEMPLATE_GEO_CLUSTER_RADIUS,0)
+        input_dict[Controller.TEMPLATE_GPX_TIMEFRAME] = template_dict.get(Controller.TEMPLATE_GPX_TIMEFRAME,None)
+        input_dict[Controller.TEMPLATE_GPX_INTERPOLATE] = template_dict.get(Controller.TEMPLATE_GPX_INTERPOLATE,True)
+        input_dict[Controller.TEMPLATE_GPX_MAX_GAP] = template_dict.get(Controller.TEMPLATE_GPX_MAX_GAP,None)
+
         # direct input of datetime offset from file
         input_dict[Controller.TEMPLATE_CALIB_OFFSET] = template_dict.get(Controller.TEMPLATE_CALIB_OFFSET,None)
 
@@ -510,7 +626,8 @@ class Controller(object):
                 if not op_default_lat_lon == Persistence.MODE_DELETE:
                     input_dict[Controller.TEMPLATE_DEFAULT_REVERSE_GEO] = Controller.retrieve_nominatim_reverse(filepath=f,
                                                                             latlon=default_lat_lon,save=save,
-                                                                            zoom=map_detail,remote=remote,debug=showinfo)    
+                                                                            zoom=map_detail,remote=remote,debug=showinfo,
+                                                                            client=geo_client)    
                 else:
                     print("DELETE OPERATION CURRENTLY NOT SUPPORTED") 
 
@@ -521,15 +638,96 @@ class Controller(object):
                 print(f"file operation {op_default_lat_lon} ({Persistence.MODE_TXT.get(op_default_lat_lon)})")
 
         # get gpx file
+        gpx_cache = template_dict.get(Controller.TEMPLATE_GPX_CACHE,True)
+        input_dict[Controller.TEMPLATE_GPX_CACHE] = gpx_cache
         if is_file(Controller.TEMPLATE_GPX):
             k = Controller.TEMPLATE_GPX+"_FILE"
             f = template_dict.get(k,"")
             ka = k+"_ACTIONS"
             input_dict[k] = f
             input_dict[ka] = template_dict.get(ka,"")
-            gpx_data = Persistence.read_gpx(gpsx_path=f,debug=showinfo,tz=pytz.timezone(tz))
+            gpx_live = template_dict.get(Controller.TEMPLATE_GPX_LIVE,False)
+            input_dict[Controller.TEMPLATE_GPX_LIVE] = gpx_live
+            cache_dir = gpx_cache if isinstance(gpx_cache,str) else None
+            if gpx_cache and gpx_live:
+                gpx_data = TrackTail(cache=TrackCache(cache_dir=cache_dir),debug=showinfo).get_track(f,tz=pytz.timezone(tz))
+            elif gpx_cache:
+                gpx_data = TrackCache(cache_dir=cache_dir).get_track(f,debug=showinfo,tz=pytz.timezone(tz))
+            else:
+                gpx_data = Track.from_gpx(gpsx_path=f,debug=showinfo,tz=pytz.timezone(tz))
             input_dict[Controller.TEMPLATE_GPX] = gpx_data
 
+        # get multiple gpx files (folders / glob patterns), merged into one track
+        gpx_paths = template_dict.get(Controller.TEMPLATE_GPX_PATHS)
+        if gpx_paths:
+            if isinstance(gpx_paths,str):
+                gpx_paths = [gpx_paths]
+            gpx_priority = template_dict.get(Controller.TEMPLATE_GPX_PRIORITY)
+            input_dict[Controller.TEMPLATE_GPX_PATHS] = gpx_paths
+            input_dict[Controller.TEMPLATE_GPX_PRIORITY] = gpx_priority
+            # track of GPX_FILE is already read (also in live mode), it is merged as is
+            gpx_loaded = None
+            if is_file(Controller.TEMPLATE_GPX):
+                gpx_file = input_dict[Controller.TEMPLATE_GPX+"_FILE"]
+                gpx_paths = [gpx_file,*gpx_paths]
+                gpx_loaded = {gpx_file:input_dict[Controller.TEMPLATE_GPX]}
+            input_dict[Controller.TEMPLATE_GPX] = Track.from_gpx_files(gpx_paths,priority=gpx_priority,
+                                                                       cache_dir=gpx_cache,loaded=gpx_loaded,debug=showinfo)
+
+        calib_estimate = template_dict.get(Controller.TEMPLATE_CALIB_ESTIMATE,0)
+        input_dict[Controller.TEMPLATE_CALIB_ESTIMATE] = calib_estimate
+        min_confidence = template_dict.get(Controller.TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE,
+                                           Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE])
+        input_dict[Controller.TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE] = min_confidence
+        gpx_simplify = template_dict.get(Controller.TEMPLATE_GPX_SIMPLIFY,0)
+        gpx_simplify_interval = template_dict.get(Controller.TEMPLATE_GPX_SIMPLIFY_INTERVAL,0)
+        input_dict[Controller.TEMPLATE_GPX_SIMPLIFY] = gpx_simplify
+        input_dict[Controller.TEMPLATE_GPX_SIMPLIFY_INTERVAL] = gpx_simplify_interval
+        gpx_data = input_dict.get(Controller.TEMPLATE_GPX)
+        do_estimate = calib_estimate and ( not input_dict[Controller.TEMPLATE_CALIB_OFFSET] ) and isinstance(gpx_data,Track)
+        do_simplify = ( gpx_simplify or gpx_simplify_interval ) and isinstance(gpx_data,Track) and ( len(gpx_data) > 0 )
+
+        # image dates / coordinates are read once for offset estimation and track simplification
+        img_tag_values = None
+        if do_estimate or do_simplify:
+            img_tag_values = Controller.read_img_tag_values(exiftool_ref,work_dir,ext=input_dict[Controller.TEMPLATE_IMG_EXTENSIONS])
+            input_dict[Controller.PARAM_IMG_TAG_VALUES] = img_tag_values
+
+        # estimate time offset from gpx track, if there is no offset / calibration image
+        if do_estimate:
+            estimate = Controller.estimate_calib_offset(exiftool_ref,work_dir,gpx_data,ext=input_dict[Controller.TEMPLATE_IMG_EXTENSIONS],
+                                                        timezone=tz,window=calib_estimate,
+                                                        max_gap=input_dict.get(Controller.TEMPLATE_GPX_MAX_GAP) or Track.MAX_GAP,
+                                                        showinfo=showinfo,tag_values=img_tag_values)
+            # ambiguous estimates (eg coverage of a dense track) would shift all gpx matches
+            if ( estimate.get("offset") is not None ) and ( estimate["confidence"] >= min_confidence ):
+                input_dict[Controller.TEMPLATE_CALIB_OFFSET] = estimate["offset"]
+            elif estimate.get("offset") is not None:
+                print(f"    Estimated time offset {estimate['offset']}s not used, confidence {estimate['confidence']:.2f} "
+                      f"< {min_confidence} ({Controller.TEMPLATE_CALIB_ESTIMATE_MIN_CONFIDENCE}), offset stays 0")
+
+        # simplify gpx track, keeping track points next to image timestamps
+        if do_simplify:
+            img_timestamps = Controller.get_img_timestamps(exiftool_ref,work_dir,
+                                                           ext=input_dict[Controller.TEMPLATE_IMG_EXTENSIONS],
+                                                           timezone=tz,offset=input_dict.get(Controller.TEMPLATE_CALIB_OFFSET),
+                                                           tag_values=img_tag_values)
+            max_gap = input_dict.get(Controller.TEMPLATE_GPX_MAX_GAP) or Track.MAX_GAP
+            input_dict[Controller.TEMPLATE_GPX] = gpx_data.simplify(tolerance=gpx_simplify,interval=gpx_simplify_interval,
+                                                                    keep_timestamps=list(img_timestamps.values()),
+                                                                    max_gap=max_gap,debug=showinfo)
+
+        # get admin boundaries for offline country / state / city lookup
+        if is_file(Controller.TEMPLATE_BOUNDARY):
+            f = template_dict.get(Controller.TEMPLATE_BOUNDARY+"_FILE")
+            boundary_level = template_dict.get(Controller.TEMPLATE_BOUNDARY_LEVEL)
+            boundary_levels = template_dict.get(Controller.TEMPLATE_BOUNDARY_LEVELS)
+            input_dict[Controller.TEMPLATE_BOUNDARY_LEVEL] = boundary_level
+            input_dict[Controller.TEMPLATE_BOUNDARY_LEVELS] = boundary_levels
+            boundary_index = BoundaryIndex(admin_levels=boundary_levels,debug=showinfo)
+            if boundary_index.add_file(f,admin_level=boundary_level) > 0:
+                input_dict[Controller.TEMPLATE_BOUNDARY] = boundary_index
+
         # get default values from template / initialize
         template_default_values = Controller.get_template_default_values()
 
@@ -544,8 +742,82 @@ class Controller(object):
 
         Util.print_dict_info(d=augmented_params,show_info=showinfo,list_elems=3)        
 
+        for k in Controller.RUNTIME_PARAMS:
+            if k in input_dict:
+                augmented_params[k] = input_dict[k]
+
         return augmented_params
     
+    @staticmethod
+    def read_img_tag_values(exiftool_ref:str,path:str,ext=["jpg","jpeg"])->dict:
+        """ reads CreateDate and gps coordinates (numeric) of images in path (single exiftool call)
+            returns { filepath: { tag: value or None } } """
+        if not ( exiftool_ref and path ):
+            return {}
+        with ExifTool(exiftool_ref) as exif:
+            return exif.get_tag_values(path,["CreateDate","GPSLatitude","GPSLongitude"],
+                                       file_type_filter=ext,numeric=True)
+
+    @staticmethod
+    def get_img_timestamps(exiftool_ref:str,path:str,ext=["jpg","jpeg"],timezone="Europe/Berlin",offset=None,
+                           tag_values:dict=None)->dict:
+        """ reads utc timestamps of images in path (CreateDate in timezone, plus offset in seconds)
+            tag_values: image dates already read (read_img_tag_values), images aren't read again
+            returns { filepath: utc timestamp (None if there is no date) } """
+        img_timestamps = {}
+        if tag_values is None:
+            tag_values = Controller.read_img_tag_values(exiftool_ref,path,ext=ext)
+        filepaths = list(tag_values.keys())
+        timestamps = TzConverter(timezone).get_timestamps([tag_values[f].get("CreateDate") for f in filepaths])
+        for filepath,timestamp in zip(filepaths,timestamps):
+            if not ( timestamp is None or offset is None ):
+                timestamp = int(timestamp) + int(offset)
+            img_timestamps[filepath] = timestamp
+        return img_timestamps
+
+    @staticmethod
+    def estimate_calib_offset(exiftool_ref:str,path:str,track:Track,ext=["jpg","jpeg"],timezone="Europe/Berlin",
+                              window=3600,max_gap=Track.MAX_GAP,showinfo=False,tag_values:dict=None)->dict:
+        """ estimates camera time offset (GPS time - camera time, s) of images in path from gpx track,
+            using images with gps coordinates if there are any, otherwise track coverage (Track.estimate_offset)
+            tag_values: image dates / coordinates already read (read_img_tag_values), images aren't read again
+            returns { offset (None if not found), confidence, score, method, images } """
+        img_latlons = []
+        if tag_values is None:
+            tag_values = Controller.read_img_tag_values(exiftool_ref,path,ext=ext)
+        img_timestamps = TzConverter(timezone).get_timestamps([values["CreateDate"] for values in tag_values.values()])
+        for values in tag_values.values():
+            latlon = None
+            if isinstance(values["GPSLatitude"],(int,float)) and isinstance(values["GPSLongitude"],(int,float)):
+                latlon = (values["GPSLatitude"],values["GPSLongitude"])
+            img_latlons.append(latlon)
+
+        # use gps coordinates of images if available
+        if not any(img_latlons):
+            img_latlons = None
+        estimate = track.estimate_offset(img_timestamps,latlons=img_latlons,window=window,max_gap=max_gap,debug=showinfo)
+        if showinfo:
+            print(f"    Estimated time offset {estimate['offset']}s from {estimate['images']} images "
+                  f"({estimate['method']}), confidence {estimate['confidence']:.2f}")
+        return estimate
+
+    @staticmethod
+    def get_gpx_coverage(img_timestamps:dict,gpx:Track,max_gap=None,showinfo=False)->dict:
+        """ coverage of images { fileref: utc timestamp } by continuous segments of the gpx track
+            (gaps longer than max_gap seconds), returns report per image folder (see Track.get_coverage) """
+        if max_gap is None:
+            max_gap = Track.MAX_GAP
+        folders = {}
+        for fileref,timestamp in img_timestamps.items():
+            folders.setdefault(str(Path(fileref).parent),{})[fileref] = timestamp
+        coverage = {folder:gpx.get_coverage(timestamps,max_gap=max_gap) for folder,timestamps in folders.items()}
+        if showinfo:
+            for folder,report in coverage.items():
+                print(f"--- GPX coverage {folder}: {len(report['covered'])} of {report['images']} images in track segments, "+
+                      f"{len(report['gap'])} in gaps > {max_gap}s, {len(report['outside'])} outside of track, "+
+                      f"{len(report['no_timestamp'])} without date")
+        return coverage
+
     @staticmethod
     def get_template_default_values()->dict:
         """ get predefined template values """
@@ -591,8 +863,14 @@ class Controller(object):
         return augmented_meta
 
     @staticmethod
-    def augment_gps_data(fileref:str,geo_dict:dict,template_dict:dict,metadata_dict:dict,utc_timestamp:int=None,debug=False,verbose=False):
-        """ blend default and gps data """
+    def augment_gps_data(fileref:str,geo_dict:dict,template_dict:dict,metadata_dict:dict,utc_timestamp:int=None,debug=False,verbose=False,
+                         geo_queue:GeoQueue=None,latlon_geocode=None,geo_cache:dict=None,stem_index:dict=None):
+        """ blend default and gps data
+            if a geo_queue is supplied, missing reverse geo data are looked up in background
+            and only the coordinates are returned until the lookup is finished
+            latlon_geocode: coordinates used for reverse geo lookup instead of image coordinates
+            (representative of a coordinate cluster), geo_cache: dict to reuse lookup results
+            stem_index: index of the image directory (Persistence.get_stem_index) to look up geo files """
 
         # geo metadata handling deactivated
         if not ( template_dict.get(Controller.TEMPLATE_CREATE_GEO_METADATA,False) ):
@@ -618,14 +896,11 @@ class Controller(object):
         default_reverse_geo = template_dict.get(Controller.TEMPLATE_DEFAULT_REVERSE_GEO,None)
 
         # get the geo filepath / check if file exists already
-        file_info = Persistence.get_filepath_info(fileref)
-        filepath = file_info.get(Persistence.FILEINFO_FILEPATH,None)
-        file_suffix_len = len(file_info.get(Persistence.FILEINFO_SUFFIX))
-        
+        filepath = os.path.normpath(fileref)
+        stem_path,_ = Persistence.get_stem_path(filepath)
         geo_suffix = template_dict.get(Controller.TEMPLATE_DEFAULT_GPS_EXT,"geo")
-        filepath_geo = filepath[:-file_suffix_len]+geo_suffix
-        file_info_geo = Persistence.get_filepath_info(filepath_geo)
-        geo_exists = file_info_geo.get(Persistence.FILEINFO_EXISTS,False) 
+        filepath_geo = stem_path+"."+geo_suffix
+        geo_exists = ( Persistence.get_sidecar(filepath,geo_suffix,stem_index=stem_index) is not None )
 
         create_latlon_file = template_dict.get(Controller.TEMPLATE_CREATE_LATLON,Persistence.MODE_IGNORE) 
         geo_detail_level = template_dict.get(Controller.TEMPLATE_DEFAULT_MAP_DETAIL,18) 
@@ -648,13 +923,43 @@ class Controller(object):
         else:
             save_latlon = False
         
+        # offline admin boundaries, remote service will only be used if allowed
+        boundary_index = template_dict.get(Controller.TEMPLATE_BOUNDARY,None)
+        latlon_remote = latlon
+        if ( latlon is not None ) and ( latlon_geocode is not None ):
+            latlon_remote = list(latlon_geocode)
+        if ( boundary_index is not None ) and ( template_dict.get(Controller.TEMPLATE_GPS_READ_REMOTE,True) is False ):
+            latlon_remote = None
+
+        # lookup in background queue, only coordinates are written until result is available
+        reverse_geo = None
+        if ( geo_queue is not None ) and ( not geo_exists ):
+            reverse_geo = geo_queue.get_result(filepath_geo)
+            if ( reverse_geo is None ) and ( latlon_remote is not None ):
+                geo_queue.put(filepath_geo,latlon_remote,zoom=geo_detail_level,save=save_latlon,ref=fileref)
+                if debug:
+                    print(f"        Controller.augment_gps_data, latlon Coordinates: {latlon} (QUEUED)")
+                return Geo.get_exifmeta_from_latlon(latlon=latlon,altitude=altitude,timestamp=utc_timestamp)
+
         # read data from file / from url
-        reverse_geo = Controller.retrieve_nominatim_reverse(filepath=filepath_geo,latlon=latlon,save=save_latlon,
-                                                            zoom=geo_detail_level,remote=(not geo_exists),debug=verbose)
+        if reverse_geo is None:
+            reverse_geo = Controller.retrieve_nominatim_reverse(filepath=filepath_geo,latlon=latlon_remote,save=save_latlon,
+                                                                zoom=geo_detail_level,remote=(not geo_exists),debug=verbose,
+                                                                client=template_dict.get(Controller.PARAM_GEO_CLIENT),
+                                                                cache=geo_cache)
+            # geo file created: images with the same stem (eg IMG_1.jpg, IMG_1.arw) use it
+            if ( stem_index is not None ) and ( not geo_exists ) and save_latlon and os.path.isfile(filepath_geo):
+                stem_index.setdefault(stem_path,{})[geo_suffix] = filepath_geo
         
         if debug:
             print(f"        Controller.augment_gps_data, latlon Coordinates: {latlon}")
 
+        # exact country / state / city from admin boundaries (correct near borders)
+        if ( boundary_index is not None ) and ( latlon is not None ):
+            boundary_geo = boundary_index.reverse(latlon,debug=verbose)
+            if boundary_geo:
+                reverse_geo = BoundaryIndex.merge(reverse_geo,boundary_geo)
+
         # if nothing found, fallback to default reverse geo data
         if ( not reverse_geo ) and default_reverse_geo:
             reverse_geo = default_reverse_geo
@@ -685,8 +990,11 @@ class Controller(object):
         return reverse_geo_dict
 
     @staticmethod
-    def prepare_img_write(params:dict,debug=False,verbose=False,meta_txt=True):
-        """ blend template and metadata for each image file """
+    def prepare_img_write(params:dict,debug=False,verbose=False,meta_txt=True,geo_queue:GeoQueue=None,filerefs:list=None):
+        """ blend template and metadata for each image file, returns metadata read from images
+            if geo_queue is supplied reverse geo lookups are done in background, location
+            data need to be added afterwards (apply_geo_queue)
+            filerefs: image files to be processed (default: all images in work dir) """
         
         now = datetime.now()
         date_s = now.strftime("%Y:%m:%d")
@@ -712,6 +1020,14 @@ class Controller(object):
 
         gps_offset = params[Controller.TEMPLATE_CALIB_OFFSET]
 
+        # max time difference (s) image / gpx track point, interpolation of coordinates
+        gpx_timeframe = params.get(Controller.TEMPLATE_GPX_TIMEFRAME)
+        gpx_interpolate = params.get(Controller.TEMPLATE_GPX_INTERPOLATE,True)
+        gpx_max_gap = params.get(Controller.TEMPLATE_GPX_MAX_GAP)
+
+        # radius in m for clustering coordinates before reverse geo lookups
+        cluster_radius = params.get(Controller.TEMPLATE_GEO_CLUSTER_RADIUS,0)
+
         # extension for metadata file
         meta_ext = params.get(Controller.TEMPLATE_DEFAULT_META_EXT,"meta")
 
@@ -755,10 +1071,11 @@ class Controller(object):
             print(f" --- Controller.prepare_img_write / SHOW DEFAULT IPTC PARAMS ----\n")
             Util.print_dict_info(default_iptc)
 
-        if not gpx is None:
-            gpx_keys = sorted(gpx.keys())
-        else:    
-            gpx_keys = []
+        # gpx track (sorted arrays), gpx dicts are converted
+        if gpx is None:
+            gpx = Track()
+        elif not isinstance(gpx,Track):
+            gpx = Track.from_dict(gpx)
         
         metadata_filter = ExifTool.IMG_SEGMENT
 
@@ -771,7 +1088,8 @@ class Controller(object):
         
         # read all metadata
         with ExifTool(exif_ref,debug=debug) as exif:
-            img_meta_list = exif.get_metadict_from_img(filenames=workdir,metafilter=metadata_filter,filetypes=ext)
+            img_meta_list = exif.get_metadict_from_img(filenames=workdir if filerefs is None else filerefs,
+                                                       metafilter=metadata_filter,filetypes=ext)
 
         if debug:
             if isinstance(img_meta_list,dict):
@@ -782,32 +1100,65 @@ class Controller(object):
             print(f"     COPYRIGHT INFO {copyright_template} notice {copyright_notice_template} credit {credit_template} source {source_template}")
 
 
+        # pre pass: get corrected creation timestamps for all images
+        img_gps = {}
+        creation_timestamps = TzConverter(timezone).get_timestamps([m.get("CreateDate",None) for m in img_meta_list.values()])
+        for fileref,creation_timestamp in zip(img_meta_list.keys(),creation_timestamps):
+            if not ( creation_timestamp is None or gps_offset is None ):                                                 
+                creation_timestamp = int(creation_timestamp) + int(gps_offset)                                    
+            img_gps[fileref] = {"creation_timestamp":creation_timestamp,"timestamp_gpx":None,"geo_data":None}
+
+        # match all images with gpx track in one go (coordinates interpolated between track points)
+        filerefs = list(img_gps.keys())
+        gpx_match = gpx.match([img_gps[f]["creation_timestamp"] for f in filerefs],
+                              timeframe=gpx_timeframe,interpolate=gpx_interpolate,max_gap=gpx_max_gap)
+        # coverage report (only displayed, not needed for processing)
+        if debug and ( len(gpx) > 0 ):
+            Controller.get_gpx_coverage({f:img_gps[f]["creation_timestamp"] for f in filerefs},gpx,
+                                        max_gap=gpx_max_gap,showinfo=debug)
+        for i,fileref in enumerate(filerefs):
+            geo_data = gpx.get_matched_point(gpx_match,i)
+            if geo_data is None:
+                continue
+            img_gps[fileref]["timestamp_gpx"] = int(gpx_match["timestamp"][i])
+            img_gps[fileref]["geo_data"] = geo_data
+
+        # cluster image coordinates, reverse geo lookup is only done for one point per cluster
+        geo_clusters = {}
+        if cluster_radius:
+            img_latlon = {}
+            for fileref,gps_info in img_gps.items():
+                geo_data = gps_info["geo_data"]
+                if geo_data is not None:
+                    img_latlon[fileref] = (geo_data["lat"],geo_data["lon"])
+            geo_clusters = Geo.cluster_latlon(img_latlon,radius=cluster_radius)
+            if debug:
+                num_clusters = len(set(geo_clusters.values()))
+                print(f"\n###### {len(img_latlon)} images with coordinates in {num_clusters} clusters (radius {cluster_radius}m) ######")
+
+        # reverse geo data per cluster 
+        geo_cache = {}
+
+        # existing sidecar files (geo data) of the images, single directory scan
+        stem_index = Persistence.get_stem_index(workdir)
+
         for fileref,metadata_dict in img_meta_list.items():
             if debug:
                 print(f"\n--- Controller.prepare_img_write BEGIN \n    PROCESS {fileref}")
 
-            creation_date = metadata_dict.get("CreateDate",None)
-            cam_creation_date=creation_date
-            creation_timestamp = Util.get_localized_datetime(dt_in=creation_date,tz_in=timezone,tz_out="UTC",
-                                                             debug=False,as_timestamp=True) 
-            if not ( creation_timestamp is None or gps_offset is None ):                                                 
-                creation_timestamp = int(creation_timestamp) + int(gps_offset)                                    
-                                                            
+            cam_creation_date = metadata_dict.get("CreateDate",None)
+            creation_timestamp = img_gps[fileref]["creation_timestamp"]
+            timestamp_gpx = img_gps[fileref]["timestamp_gpx"]
+            geo_data = img_gps[fileref]["geo_data"]
+
             if isinstance(creation_timestamp,int):
                 creation_datetime = datetime.utcfromtimestamp(creation_timestamp)
             else:
                 creation_datetime = None
 
-            timestamp_index = None
-            timestamp_gpx = None
             datetime_gpx = None
-            geo_data = None            
-            timestamp_index = Util.get_nearby_index(creation_timestamp,sorted_list=gpx_keys,debug=False)            
-            
-            if timestamp_index != Util.NOT_FOUND:
-                timestamp_gpx = gpx_keys[timestamp_index]
+            if timestamp_gpx is not None:
                 datetime_gpx = datetime.utcfromtimestamp(timestamp_gpx)
-                geo_data = gpx[timestamp_gpx]
             
             if geo_data is None:
                 latlon = "<No Coordinates>"
@@ -846,7 +1197,10 @@ class Controller(object):
                                                          metadata=metadata_dict,overwrite_meta=overwrite_meta)
             
             # gps metadata
-            gps_data = Controller.augment_gps_data(fileref=fileref,geo_dict=geo_data,template_dict=params,metadata_dict=metadata_dict,utc_timestamp=creation_timestamp,debug=debug) 
+            gps_data = Controller.augment_gps_data(fileref=fileref,geo_dict=geo_data,template_dict=params,metadata_dict=metadata_dict,
+                                                   utc_timestamp=creation_timestamp,debug=debug,geo_queue=geo_queue,
+                                                   latlon_geocode=geo_clusters.get(fileref),geo_cache=geo_cache,
+                                                   stem_index=stem_index)
 
             # gps keywords
             try:
@@ -933,8 +1287,8 @@ class Controller(object):
                 
             # get the fileref for properties file
             if meta_txt:
-                fp_info_suffix_len = len(Persistence.get_filepath_info(fileref).get("suffix",""))
-                fileref_meta = fileref[:(-fp_info_suffix_len)] + meta_ext
+                stem_path,_ = Persistence.get_stem_path(fileref)
+                fileref_meta = stem_path + "." + meta_ext
                 if debug:
                     print(f"       Save {fileref_meta}")
                 try:
@@ -949,7 +1303,65 @@ class Controller(object):
             if debug:
                 print(f"\n    PROCESSING {fileref} \n--- Controller.prepare_img_write END")
         
-        return None
+        return img_meta_list
+
+    @staticmethod
+    def apply_geo_queue(params:dict,img_meta_list:dict,geo_queue:GeoQueue,timeout=None,debug=False,verbose=False)->list:
+        """ 2nd pass after prepare_img_write with geo queue: waits for the background reverse
+            geo lookups and adds location data to the metadata files of the images
+            img_meta_list: image metadata as returned by prepare_img_write
+            returns list of image filerefs with updated metadata files """
+
+        img_filerefs = []
+        overwrite_meta = params.get(Controller.TEMPLATE_OVERWRITE_META,False)
+        meta_ext = params.get(Controller.TEMPLATE_DEFAULT_META_EXT,"meta")
+
+        if not geo_queue.join(timeout=timeout):
+            print(f"Controller.apply_geo_queue: timeout, pending lookups remain in queue file {geo_queue.filepath}")
+
+        for filepath_geo,queue_ref in geo_queue.get_refs().items():
+            fileref = queue_ref["ref"]
+            metadata_dict = img_meta_list.get(fileref)
+            if ( metadata_dict is None ) or ( geo_queue.get_result(filepath_geo) is None ):
+                continue
+
+            stem_path,_ = Persistence.get_stem_path(fileref)
+            fileref_meta = stem_path + "." + meta_ext
+            if os.path.isfile(fileref_meta):
+                new_metadata = ExifTool.arg2dict(Persistence.read_file(fileref_meta))
+            else:
+                new_metadata = {}
+
+            # geo file may not be saved, result will be taken from queue
+            latlon = queue_ref["latlon"]
+            gps_data = Controller.augment_gps_data(fileref=fileref,geo_dict={"lat":latlon[0],"lon":latlon[1]},template_dict=params,
+                                                   metadata_dict=metadata_dict,debug=debug,verbose=verbose,geo_queue=geo_queue)
+            # coordinates were already written in 1st pass
+            for k in ExifTool.IMG_SEGMENT_GPS:
+                gps_data.pop(k,None)
+
+            for key,new in gps_data.items():
+                if key in ExifTool.META_DATA_LIST:
+                    # list values are only written if they were written in 1st pass
+                    old_list = new_metadata.get(key)
+                    if old_list is None:
+                        continue
+                    if not isinstance(new,list):
+                        new = [new]
+                    new_metadata[key] = list(dict.fromkeys([*old_list,*new]))
+                elif ( metadata_dict.get(key,None) is None ) or overwrite_meta:
+                    new_metadata[key] = new
+
+            if debug:
+                print(f"    Controller.apply_geo_queue: Save {fileref_meta}")
+            try:
+                Persistence.save_file(data=ExifTool.dict2arg(meta_dict=new_metadata),filename=fileref_meta)
+                img_filerefs.append(fileref)
+            except:
+                print(f"Exception with file {fileref_meta}, processing will be skipped")
+                print(traceback.format_exc())
+
+        return img_filerefs
 
     @staticmethod
     def img_write(img_path,exif_ref,img_ext=TEMPLATE_IMG_EXTENSIONS,meta_ext=TEMPLATE_DEFAULT_META_EXT,show_info=False):
@@ -962,8 +1374,9 @@ class Controller(object):
         return img_file_refs
 
     @staticmethod
-    def show_file_data(fp_img,fp_exif_tool=None,fp_gpx=None,geo_ext="geo",meta_ext="meta"):
-        """ displays data as found in auxiliary files (gpx, metadata and geo data) for a given image """
+    def show_file_data(fp_img,fp_exif_tool=None,fp_gpx=None,geo_ext="geo",meta_ext="meta",stem_index:dict=None):
+        """ displays data as found in auxiliary files (gpx, metadata and geo data) for a given image
+            stem_index: index of the image directory (Persistence.get_stem_index) to look up the auxiliary files """
         
         def print_file_info(in_dict,attributes=None,prefix=None,show_info=True):
             out_dict = {}   
@@ -999,6 +1412,8 @@ class Controller(object):
         file_stem = file_info.get("stem",None)
         file_geo = os.path.join(file_parent,(file_stem+"."+geo_ext))
         file_meta = os.path.join(file_parent,(file_stem+"."+meta_ext))
+        sidecar_geo = Persistence.get_sidecar(fp_img,geo_ext,stem_index=stem_index)
+        sidecar_meta = Persistence.get_sidecar(fp_img,meta_ext,stem_index=stem_index)
 
         if os.path.isfile(fp_exif_tool) and file_info["exists"]:
             with ExifTool(fp_exif_tool) as exiftool:
@@ -1015,10 +1430,9 @@ class Controller(object):
                     return
         
         if os.path.isfile(fp_gpx):
-            gpx = Persistence.read_gpx(gpsx_path=fp_gpx)
-            gpx_ts = sorted(list(gpx.keys()))
+            gpx = Track.from_gpx(gpsx_path=fp_gpx)
             if isinstance(timestamp_created,int):
-                timestamp_gpx = gpx_ts[Util.get_nearby_index(timestamp_created,gpx_ts)]        
+                timestamp_gpx = gpx.get_timestamp(gpx.get_index(timestamp_created))
                 print(f"\n--- File: {file_info.get('filepath',None)}")
                 print(f"    Date/Datetime {date_created}/{datetime_created} \n    Timestamp image: {timestamp_created} timestamp gpx {timestamp_gpx} diff {timestamp_created-timestamp_gpx}")            
                 latlon = (gpx[timestamp_gpx]["lat"],gpx[timestamp_gpx]["lon"])
@@ -1034,16 +1448,16 @@ class Controller(object):
         else:
             print(f"Image data for file {fp_img} doesn't exist")  
             
-        if os.path.isfile(file_geo):
+        if sidecar_geo is not None:
             print(f"\n    --- Geo File")
-            geo_dict = Persistence.read_json(file_geo)
+            geo_dict = Persistence.read_json(sidecar_geo)
             print_file_info(geo_dict,attributes=geo_file_attributes,prefix="GEO",show_info=True)                  
         else:
             print(f"Reverse geo data file {file_geo} doesn't exist")    
             
-        if os.path.isfile(file_meta):
+        if sidecar_meta is not None:
             print(f"\n    --- Meta File")
-            metafile_raw = Persistence.read_file(file_meta)
+            metafile_raw = Persistence.read_file(sidecar_meta)
             meta_file_dict = ExifTool.arg2dict(args=metafile_raw)  
             print_file_info(meta_file_dict,attributes=meta_file_attributes,prefix="META",show_info=True)                  
         else:
@@ -1053,7 +1467,8 @@ class Controller(object):
 
     @staticmethod
     def process_images(template_fileref,showinfo=False,verbose=False,copy_dir=None,copy_ext_list=None,
-                       del_ext_list=None, del_src_ext="ARW",persist=True,work_dir=None):
+                       del_ext_list=None, del_src_ext="ARW",persist=True,work_dir=None,geo_timeout=None,filerefs:list=None,
+                       copy_recursive=True,params:dict=None):
         """ executes the whole workflow: read write parameters, write metadata and gps files, execute write to image files, cleanup  
             Arguments
             template_fileref: filepath to arguments file (as created by method create_param_template)
@@ -1065,6 +1480,11 @@ class Controller(object):
             del_src_ext: files with this extension will be used for identifiying files to be deleted 
             persist:really delete & copy files otherwise only show processing results
             work_dir: directly pass over work dir (can be used for external programs)
+            geo_timeout: max waiting time (seconds) for background reverse geo lookups (template param GEO_QUEUE)
+            filerefs: only process these image files of the work dir (default: all images)
+            copy_recursive: copy metadata files of subfolders of the work dir as well
+            params: parameters as returned by prepare_execution (steps 1 and 2 are skipped), to
+            process several batches of a work dir with a single preparation (GPX, boundaries, ...)
             
             See Also
             --------
@@ -1072,15 +1492,19 @@ class Controller(object):
         """
         
         finished = False
+        geo_queue = None
 
         try:
-            if showinfo:
-                print(f"\n##### step 1/4 processs_images: GET PARAMS from {template_fileref}  #####\n")
-            control_params = Controller.read_params_from_file(filepath=template_fileref,showinfo=showinfo,work_dir=work_dir)
-            
-            if showinfo:
-                print("\n##### step 2/4 processs_images: prepare execution #####\n")
-            augmented_params = Controller.prepare_execution(template_dict=control_params,showinfo=showinfo)   
+            if params is None:
+                if showinfo:
+                    print(f"\n##### step 1/4 processs_images: GET PARAMS from {template_fileref}  #####\n")
+                control_params = Controller.read_params_from_file(filepath=template_fileref,showinfo=showinfo,work_dir=work_dir)
+                
+                if showinfo:
+                    print("\n##### step 2/4 processs_images: prepare execution #####\n")
+                augmented_params = Controller.prepare_execution(template_dict=control_params,showinfo=showinfo)   
+            else:
+                augmented_params = params
             
             exif_ref = augmented_params["EXIFTOOL"]
             img_path = augmented_params["WORK_DIR"]
@@ -1090,13 +1514,36 @@ class Controller(object):
 
             if showinfo:
                 print("\n##### step 3/4 processs_images: prepare image write #####\n")            
-            Controller.prepare_img_write(params=augmented_params,debug=showinfo,verbose=verbose)
+            # reverse geo lookups in background, exiftool doesn't need to wait for them
+            if augmented_params.get(Controller.TEMPLATE_GEO_QUEUE,False):
+                geo_queue = GeoQueue(filepath=os.path.join(img_path,GeoQueue.QUEUE_FILE),
+                                     client=augmented_params.get(Controller.PARAM_GEO_CLIENT),debug=verbose)
+                geo_queue.start()
+
+            img_meta_list = Controller.prepare_img_write(params=augmented_params,debug=showinfo,verbose=verbose,geo_queue=geo_queue,
+                                                         filerefs=filerefs)
             
             if showinfo:
                 print("\n##### step 4/4 processs_images: write images #####\n")
             
+            write_path = img_path
+            if filerefs is not None:
+                meta_ext = augmented_params.get(Controller.TEMPLATE_DEFAULT_META_EXT,"meta")
+                write_path = [*filerefs,*[Persistence.get_stem_path(f)[0]+"."+meta_ext for f in filerefs]]
             with ExifTool(executable=exif_ref) as e:
-                img_filerefs = e.write_args2img(img_path=img_path,show_info=showinfo)            
+                img_filerefs = e.write_args2img(img_path=write_path,show_info=showinfo)            
+
+            if geo_queue is not None:
+                if showinfo:
+                    print("\n##### step: write location data from background reverse geo lookups #####\n")
+                geo_filerefs = Controller.apply_geo_queue(params=augmented_params,img_meta_list=img_meta_list,geo_queue=geo_queue,
+                                                          timeout=geo_timeout,debug=showinfo,verbose=verbose)
+                geo_queue.stop()
+                if geo_filerefs:
+                    meta_ext = augmented_params.get(Controller.TEMPLATE_DEFAULT_META_EXT,"meta")
+                    meta_filerefs = [str(Path(f).with_suffix("."+meta_ext)) for f in geo_filerefs]
+                    with ExifTool(executable=exif_ref) as e:
+                        e.write_args2img(img_path=[*geo_filerefs,*meta_filerefs],show_info=showinfo)
 
             if isinstance(copy_ext_list,list) and ( copy_dir is not None ): 
                 regex_filter = ("|".join(copy_ext_list))+"$"
@@ -1104,7 +1551,9 @@ class Controller(object):
                 if showinfo:
                     print(f"\n##### step: copy metadata files matching  ( {regex_filter} ) \n      to {copy_dir}, filter: {regex_filter} #####\n")                
 
-                Persistence.copy_rename(fp=img_path,trg_path_root=copy_dir,regex_filter=regex_filter,debug=showinfo,save=persist)                  
+                # raises if files couldn't be copied: no cleanup without a complete copy
+                Persistence.copy_rename(fp=img_path,trg_path_root=copy_dir,regex_filter=regex_filter,debug=showinfo,save=persist,
+                                        progress=showinfo,recursive=copy_recursive)                
 
             if isinstance(del_ext_list,list) and isinstance(del_src_ext,str):        
 
@@ -1121,5 +1570,75 @@ class Controller(object):
         except:
             print(f"\nException occured with Controller.process_images(fileref={template_fileref})")
             print(traceback.format_exc())
+        finally:
+            # background worker must not outlive the run (pending lookups remain in queue file)
+            if geo_queue is not None:
+                geo_queue.stop()
 
         return finished
+
+    @staticmethod
+    def process_image_tree(template_fileref,root_dir,include=None,exclude=None,recursive=True,ignore_paths=None,
+                           batch_size=None,showinfo=False,verbose=False,copy_dir=None,copy_ext_list=None,
+                           del_ext_list=None,del_src_ext="ARW",persist=True,geo_timeout=None)->dict:
+        """ runs process_images for all directories of a directory tree containing images
+            (extensions IMG_EXTENSIONS of the template). Directories are discovered one at a time
+            while processing (Persistence.walk_matching_files), no complete file list is created
+            include / exclude: glob patterns for image files / directories to be processed or skipped
+            (file name or path relative to root_dir, see Persistence.walk_matching_files)
+            batch_size: max number of images per process_images call (default: all images of a directory)
+            copy and cleanup steps (see process_images) work on the whole directory (not on subfolders), after
+            all batches were processed successfully. Metadata files are copied to the same relative path below copy_dir
+            returns { directory: number of images / None if processing failed } """
+
+        results = {}
+        try:
+            control_params = Controller.read_params_from_file(filepath=template_fileref,showinfo=False,work_dir=root_dir)
+            ext = control_params.get(Controller.TEMPLATE_IMG_EXTENSIONS,
+                                     Controller.TEMPLATE_DEFAULT_VALUES[Controller.TEMPLATE_IMG_EXTENSIONS])
+            img_dirs = Persistence.walk_matching_files(root_dir,ext=ext,include=include,exclude=exclude,
+                                                       recursive=recursive,ignore_paths=ignore_paths)
+        except:
+            print(f"\nException occured with Controller.process_image_tree(fileref={template_fileref},root_dir={root_dir})")
+            print(traceback.format_exc())
+            return results
+
+        for img_dir,filerefs in img_dirs:
+            if showinfo:
+                print(f"\n########## PROCESS DIRECTORY {img_dir} ({len(filerefs)} images) ##########")
+            # parameters are prepared once per directory (work dir specific: GPX, calibration, geo files)
+            try:
+                control_params = Controller.read_params_from_file(filepath=template_fileref,showinfo=showinfo,work_dir=img_dir)
+                augmented_params = Controller.prepare_execution(template_dict=control_params,showinfo=showinfo)
+            except:
+                print(f"\nException occured with Controller.process_image_tree, preparing directory {img_dir}")
+                print(traceback.format_exc())
+                results[img_dir] = None
+                continue
+            if augmented_params is None:
+                results[img_dir] = None
+                continue
+            # metadata files of this directory only, same relative path below copy_dir
+            copy_dir_img = None
+            if copy_dir is not None:
+                copy_dir_img = os.path.normpath(os.path.join(copy_dir,os.path.relpath(img_dir,root_dir)))
+            # whole directory if nothing was filtered out
+            if ( include is None ) and ( exclude is None ) and ( batch_size is None ):
+                batches = [None]
+            else:
+                n = batch_size if batch_size else len(filerefs)
+                batches = [filerefs[i:i+n] for i in range(0,len(filerefs),n)]
+            finished = True
+            for i,batch in enumerate(batches):
+                # copy and cleanup of the directory after the last batch, only if all batches were processed
+                do_copy = finished and ( i == len(batches) - 1 )
+                finished = Controller.process_images(template_fileref,showinfo=showinfo,verbose=verbose,
+                                                     copy_dir=copy_dir_img if do_copy else None,
+                                                     copy_ext_list=copy_ext_list if do_copy else None,
+                                                     del_ext_list=del_ext_list if do_copy else None,
+                                                     del_src_ext=del_src_ext,persist=persist,work_dir=img_dir,
+                                                     geo_timeout=geo_timeout,filerefs=batch,
+                                                     copy_recursive=False,params=augmented_params) and finished
+            results[img_dir] = len(filerefs) if finished else None
+
+        return results
@@ -0,0 +1,210 @@
+""" parallel file copy with kernel side copy (copy_file_range / sendfile), hardlinks and reflinks """
+
+import os
+import errno
+import shutil
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# reflinks (FICLONE ioctl) only on Linux
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class CopyEngine:
+    """ copies lists of files with a thread pool. File data are copied in the kernel
+        (os.copy_file_range, os.sendfile) where supported, otherwise with shutil.
+        Modes: copy, hardlink / reflink (same file system only, otherwise falls back to copy).
+        Progress is reported by copied bytes
+    """
+
+    MODE_COPY = "copy"
+    MODE_HARDLINK = "hardlink"
+    MODE_REFLINK = "reflink"
+    MODES = [MODE_COPY,MODE_HARDLINK,MODE_REFLINK]
+
+    THREADS = 8
+    # max bytes per copy_file_range / sendfile call
+    CHUNK_SIZE = 1024 * 1024 * 1024
+    # seconds between progress messages
+    PROGRESS_INTERVAL = 1.
+    # ioctl FICLONE (linux/fs.h)
+    FICLONE = 0x40049409
+
+    # errors of kernel copy calls indicating they are not supported for the files
+    UNSUPPORTED_ERRNO = {errno.ENOSYS,errno.EXDEV,errno.EINVAL,errno.EOPNOTSUPP,errno.ENOTSUP,errno.EBADF,errno.EPERM,errno.ENOTSOCK}
+
+    def __init__(self,threads=THREADS,mode=MODE_COPY,preserve_metadata=True,progress=None,debug=False):
+        """ threads: number of copy threads
+            mode: MODE_COPY, MODE_HARDLINK or MODE_REFLINK
+            preserve_metadata: copy file times like shutil.copy2, otherwise permissions only like shutil.copy
+            progress: True: prints progress, or function(bytes_done,bytes_total,files_done,files_total) """
+        if not mode in CopyEngine.MODES:
+            print(f"[CopyEngine] mode {mode} is unknown, using {CopyEngine.MODE_COPY}")
+            mode = CopyEngine.MODE_COPY
+        self._threads = threads
+        self._mode = mode
+        self._preserve_metadata = preserve_metadata
+        self._progress = progress
+        self._debug = debug
+        self._lock = threading.Lock()
+        # kernel copy functions, switched off once they turn out to be unsupported
+        self._use_copy_file_range = hasattr(os,"copy_file_range")
+        self._use_sendfile = hasattr(os,"sendfile") and ( os.name == "posix" )
+        self._use_reflink = ( fcntl is not None ) and ( mode == CopyEngine.MODE_REFLINK )
+        self._reset()
+
+    def _reset(self,bytes_total=0,files_total=0):
+        self.bytes_total = bytes_total
+        self.files_total = files_total
+        self.bytes_done = 0
+        self.files_done = 0
+        self.num_linked = 0
+        self.num_errors = 0
+        self._progress_time = time.monotonic()
+
+    def _copy_data(self,src:str,trg:str,size:int):
+        """ copies file content, kernel side if possible """
+        with open(src,"rb") as f_src, open(trg,"wb") as f_trg:
+            fd_src = f_src.fileno()
+            fd_trg = f_trg.fileno()
+
+            if self._use_reflink:
+                try:
+                    fcntl.ioctl(fd_trg,CopyEngine.FICLONE,fd_src)
+                    with self._lock:
+                        self.num_linked += 1
+                    return
+                except OSError as e:
+                    # other file system or file system without reflinks: copy
+                    if self._debug:
+                        print(f"[CopyEngine] no reflink for {trg} ({e.strerror}), copying")
+
+            offset = 0
+            if self._use_copy_file_range and size > 0:
+                try:
+                    while offset < size:
+                        n = os.copy_file_range(fd_src,fd_trg,min(CopyEngine.CHUNK_SIZE,size-offset))
+                        if n == 0:
+                            break
+                        offset += n
+                except OSError as e:
+                    if not ( e.errno in CopyEngine.UNSUPPORTED_ERRNO ) or offset > 0:
+                        raise
+                    self._use_copy_file_range = False
+
+            if self._use_sendfile and offset < size:
+                try:
+                    while offset < size:
+                        n = os.sendfile(fd_trg,fd_src,offset,min(CopyEngine.CHUNK_SIZE,size-offset))
+                        if n == 0:
+                            break
+                        offset += n
+                except OSError as e:
+                    if not ( e.errno in CopyEngine.UNSUPPORTED_ERRNO ) or offset > 0:
+                        raise
+                    self._use_sendfile = False
+
+            # remaining data (file grew or no kernel copy)
+            f_src.seek(offset)
+            f_trg.seek(offset)
+            shutil.copyfileobj(f_src,f_trg)
+
+    def _link(self,src:str,trg:str)->bool:
+        """ hard link to src, replaces existing target, False if link is not possible """
+        trg_tmp = trg+".lnk_tmp"
+        try:
+            os.link(src,trg_tmp)
+            os.replace(trg_tmp,trg)
+        except OSError:
+            if os.path.lexists(trg_tmp):
+                os.remove(trg_tmp)
+            return False
+        with self._lock:
+            self.num_linked += 1
+        return True
+
+    def copy_file(self,src:str,trg:str,size:int=None)->str:
+        """ copies (links) a single file, creates target directory, returns target path
+            or None in case of errors """
+        try:
+            size = os.stat(src).st_size if size is None else size
+            trg_dir = os.path.dirname(trg)
+            if trg_dir:
+                os.makedirs(trg_dir,exist_ok=True)
+
+            if os.path.exists(trg) and os.path.samefile(src,trg):
+                # link of an earlier run (or target linked otherwise): nothing to do
+                if self._mode in [CopyEngine.MODE_HARDLINK,CopyEngine.MODE_REFLINK]:
+                    with self._lock:
+                        self.num_linked += 1
+                    self._show_progress(size)
+                    return trg
+                raise shutil.SameFileError(f"{src} and {trg} are the same file")
+            if not ( ( self._mode == CopyEngine.MODE_HARDLINK ) and self._link(src,trg) ):
+                self._copy_data(src,trg,size)
+                if self._preserve_metadata:
+                    shutil.copystat(src,trg)
+                else:
+                    shutil.copymode(src,trg)
+        except:
+            print(f"[CopyEngine] Exception copying {src} to {trg}")
+            print(traceback.format_exc())
+            with self._lock:
+                self.num_errors += 1
+            self._show_progress(0)
+            return None
+
+        self._show_progress(size)
+        return trg
+
+    def _show_progress(self,size:int):
+        """ counts processed file, reports progress (throttled to PROGRESS_INTERVAL) """
+        with self._lock:
+            self.bytes_done += size
+            self.files_done += 1
+            now = time.monotonic()
+            finished = ( self.files_done == self.files_total )
+            if not self._progress or not ( finished or ( now - self._progress_time >= CopyEngine.PROGRESS_INTERVAL ) ):
+                return
+            self._progress_time = now
+            progress_info = (self.bytes_done,self.bytes_total,self.files_done,self.files_total)
+        if callable(self._progress):
+            self._progress(*progress_info)
+        else:
+            bytes_done,bytes_total,files_done,files_total = progress_info
+            percent = 100. * bytes_done / bytes_total if bytes_total > 0 else 100.
+            print(f"[CopyEngine] {percent:5.1f}% {bytes_done/1e6:.1f}/{bytes_total/1e6:.1f} MB, {files_done}/{files_total} files")
+
+    def copy_files(self,copy_list:list)->list:
+        """ copies list of (source path, target path) in parallel
+            returns list of target paths (None for files that couldn't be copied), same order as copy_list """
+        sizes = []
+        for src,_ in copy_list:
+            try:
+                sizes.append(os.stat(src).st_size)
+            except OSError:
+                sizes.append(None)
+        self._reset(bytes_total=sum([s for s in sizes if s is not None]),files_total=len(copy_list))
+        # largest files first, so the pool isn't waiting for a large file at the end
+        order = sorted(range(len(copy_list)),key=lambda i:-(sizes[i] or 0))
+
+        results = [None] * len(copy_list)
+        def copy_item(i):
+            src,trg = copy_list[i]
+            results[i] = self.copy_file(src,trg,sizes[i])
+
+        if self._threads > 1 and len(copy_list) > 1:
+            with ThreadPoolExecutor(max_workers=self._threads) as executor:
+                list(executor.map(copy_item,order))
+        else:
+            for i in order:
+                copy_item(i)
+
+        if self._debug:
+            print(f"[CopyEngine] {self.files_done-self.num_errors} files ({self.bytes_done/1e6:.1f} MB) copied, " +
+                  f"{self.num_linked} linked, {self.num_errors} errors")
+        return results
@@ -8,6 +8,7 @@ from datetime import datetime
 from image_meta.persistence import Persistence
 from image_meta.util import Util
 from image_meta.geo import Geo
+from image_meta.track import Track
 from pathlib import Path
 
 class ExifTool(object):
@@ -266,7 +267,7 @@ class ExifTool(object):
 
 #           get path and filename from fileref
             if file_dir is None or file_name is None:
-                filepath_info = Persistence.get_filepath_info(filepath=f)
+                filepath_info = Persistence.get_path_parts(f)
                 file_dir = filepath_info["parent"]
                 file_name = f[(len(file_dir)+1):]
 
@@ -423,29 +424,28 @@ class ExifTool(object):
         ext = [*img_ext,meta_ext]
         filerefs = Persistence.get_file_list(path=img_path,file_type_filter=ext)
 
-        # # get all image files with metadata file
+        # pair image files with their metadata files (same stem) in one pass
+        stem_index = Persistence.get_stem_index(filerefs)
+        img_meta_refs = []
         for fileref in filerefs:
-            fp_info = Persistence.get_filepath_info(fileref)
-            suffix = fp_info["suffix"]
+            _,suffix = Persistence.get_stem_path(fileref)
             if suffix == meta_ext:
                 continue
-            if not ((fp_info["filepath"][:-len(suffix)]+meta_ext) in filerefs):
+            meta_fileref = Persistence.get_sidecar(fileref,meta_ext,stem_index=stem_index)
+            if meta_fileref is None:
                 if show_info:
                     print(f"File {fileref} has no metadata file")
-                filerefs.remove(fileref)
+                continue
+            img_meta_refs.append((fileref,meta_fileref))
 
-        img_filerefs = list(filter(lambda fileref: fileref[(len(fileref)-len(meta_ext)):] != meta_ext , filerefs))
+        img_filerefs = [img_fileref for img_fileref,_ in img_meta_refs]
 
         if show_info:
             print(f"Writing metadata for {len(img_filerefs)} files")
 
         args_list_raw = [*self.EXIF_ARG_WRITE,'-charset',charset,'-@']
 
-        for img_fileref in img_filerefs:
-
-            # get metadata ref
-            suffix = Persistence.get_filepath_info(img_fileref)["suffix"]
-            meta_fileref = img_fileref[:-(len(suffix))]+meta_ext
+        for img_fileref,meta_fileref in img_meta_refs:
             args_list = [*args_list_raw,meta_fileref]
             self.execute(*args_list,img_fileref)
             if show_info is True:
@@ -513,6 +513,36 @@ class ExifTool(object):
 
         return s
 
+    def get_tag_values(self,path,tags:list,file_type_filter=['jpg','jpeg'],numeric=False) -> dict:
+        """ reads given tags of all images (single exiftool call), numeric values with numeric=True
+            (eg GPS coordinates as float), returns { filepath: { tag: value or None } } """
+        fileref = Persistence.get_file_list(path=path,file_type_filter=file_type_filter)
+        if isinstance(fileref,str):
+            fileref = [fileref]
+        if not fileref:
+            return {}
+        args = ["-j","-s"]
+        if numeric:
+            args.append("-n")
+        args.extend(["-"+tag for tag in tags])
+        try:
+            meta_data_list_raw = json.loads(self.execute(*args,*fileref))
+        except:
+            print(f"[ExifTool] Exception reading {tags} from {path}")
+            print(traceback.format_exc())
+            return {}
+        tag_values = {}
+        for meta_data in meta_data_list_raw:
+            file_name = os.path.normpath(meta_data.get("SourceFile",""))
+            tag_values[file_name] = {tag:meta_data.get(tag) for tag in tags}
+        return tag_values
+
+    def get_create_dates(self,path,file_type_filter=['jpg','jpeg']) -> dict:
+        """ reads CreateDate of all images (single exiftool call), returns
+            { filepath: CreateDate string or None } """
+        tag_values = self.get_tag_values(path,["CreateDate"],file_type_filter=file_type_filter)
+        return {file_name:values["CreateDate"] for file_name,values in tag_values.items()}
+
     def get_metadict_from_img2(self, path,file_type_filter=['jpg','jpeg']) -> dict:
         """ reads EXIF data from a single file or a file list
             as filenames path as string is alllowed or a list of path strings
@@ -676,17 +706,18 @@ class ExifTool(object):
         return [tech_params_out,hier_tech_params_out]
 
     @staticmethod
-    def get_gps_keywords_from_gpx(metadict:dict,gpx_dict:dict,gpx_keys:list=None,
+    def get_gps_keywords_from_gpx(metadict:dict,gpx_dict,gpx_keys:list=None,
                                   time_offset=0,timeframe=60,debug=False) -> dict:
         """ reads gpx tracklog data and tries to match with image timestamp
             time offset will be added to camera timestamp to correlate with gps time
-            gpx_keys is the sorted list of gpx_dict_keys / timestamps (should be done before)
+            gpx_dict is a Track (or gpx dict as read by Persistence.read_gpx)
+            gpx_keys is the sorted list of gpx_dict_keys / timestamps (should be done before, only for gpx dict)
             gps_timeframe is acceptable time stamp difference whether data are considered to be matching
             (60 seconds is set)
             """
         gps_dict = {}
 
-        if gpx_keys is None:
+        if not isinstance(gpx_dict,Track) and ( gpx_keys is None ):
             gpx_keys = sorted(list(gpx_dict.keys()))
 
         # get datetime and timestamp
@@ -694,10 +725,16 @@ class ExifTool(object):
         d_ts = Util.get_timestamp(d) + time_offset
 
         # will return -1 if index is out of bounds
-        gpx_idx = Util.get_nearby_index(d_ts,gpx_keys,debug=False)
+        if isinstance(gpx_dict,Track):
+            gpx_idx = gpx_dict.get_index(d_ts)
+        else:
+            gpx_idx = Util.get_nearby_index(d_ts,gpx_keys,debug=False)
         if ( gpx_idx == -1 ):
             return gps_dict
-        d_ts_gpx  = gpx_keys[gpx_idx]
+        if isinstance(gpx_dict,Track):
+            d_ts_gpx = gpx_dict.get_timestamp(gpx_idx)
+        else:
+            d_ts_gpx = gpx_keys[gpx_idx]
         delta_ts = abs(d_ts_gpx-d_ts)
 
         if debug is True:
@@ -707,9 +744,10 @@ class ExifTool(object):
             return gps_dict
 
         # gps from gpx file
-        gpx_lat = gpx_dict[d_ts_gpx]["lat"]
-        gpx_lon = gpx_dict[d_ts_gpx]["lon"]
-        gpx_alt = gpx_dict[d_ts_gpx]["ele"]
+        gpx_point = gpx_dict[d_ts_gpx]
+        gpx_lat = gpx_point["lat"]
+        gpx_lon = gpx_point["lon"]
+        gpx_alt = gpx_point["ele"]
         latlon_gpx = (gpx_lat,gpx_lon)
 
         if debug is True:
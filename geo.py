@@ -6,10 +6,10 @@ from math import cos
 from math import asin
 from math import floor
 from image_meta.util import Util
-from image_meta.persistence import Persistence
+from image_meta.geocoder import GeoClient
+from image_meta.track import Track
 from datetime import datetime
 from datetime import timedelta
-import requests
 import traceback
 
 class Geo:
@@ -18,7 +18,6 @@ class Geo:
     RADIUS_EARTH = 6371 #Earth Radius in kilometers
 
     GEOHACK_URL = "https://geohack.toolforge.org/geohack.php?params="
-    NOMINATIM_REVERSE_URL    = "https://nominatim.openstreetmap.org/reverse"
     NOMINATIM_REVERSE_PARAMS = {'format':'geojson','lat':'0','lon':'0',
                                 'zoom':'18','addressdetails':'18','accept-language':'de'}
 
@@ -52,6 +51,43 @@ class Geo:
             print("Delta Coordinates (X,Y,Z):",delta_c,"\n Distance:",distance)
         return distance
 
+    @staticmethod
+    def cluster_latlon(latlon_dict:dict,radius=100,debug=False)->dict:
+        """ groups coordinates { key:(lat,lon) } into clusters of given radius (meters),
+            (greedy: first point not within radius of an existing cluster center
+            opens a new cluster). Returns { key:(lat,lon) of cluster center } """
+        # cell size in km, so that cluster centers within radius are in adjacent cells
+        cell_size = max(radius,1) / 1000
+        cells = {}
+        centers = []
+        clusters = {}
+        for key,latlon in latlon_dict.items():
+            try:
+                latlon = (float(latlon[0]),float(latlon[1]))
+            except (TypeError,ValueError,IndexError):
+                continue
+            c = Geo.latlon2cartesian(latlon)
+            cell = tuple(floor(coord/cell_size) for coord in c)
+            center_idx = None
+            for dx in (-1,0,1):
+                for dy in (-1,0,1):
+                    for dz in (-1,0,1):
+                        for idx in cells.get((cell[0]+dx,cell[1]+dy,cell[2]+dz),[]):
+                            c_center = centers[idx][1]
+                            d = sqrt(sum([(c_center[i]-c[i])**2 for i in range(3)]))
+                            if d <= cell_size and ( center_idx is None or idx < center_idx ):
+                                center_idx = idx
+            if center_idx is None:
+                center_idx = len(centers)
+                centers.append((latlon,c))
+                cells.setdefault(cell,[]).append(center_idx)
+            clusters[key] = centers[center_idx][0]
+
+        if debug is True:
+            print(f"[Geo] {len(clusters)} coordinates grouped into {len(centers)} clusters (radius {radius}m)")
+
+        return clusters
+
     @staticmethod
     def get_exifmeta_from_latlon(latlon,altitude=None,timestamp:int=None):
         """Creates Exif Metadata Dictionary for GPS Coordinates"""
@@ -264,13 +300,16 @@ class Geo:
         return property_dict
 
     @staticmethod
-    def geo_reverse_from_nominatim(latlon,zoom=18,addressdetails=18,debug=False)->dict:
+    def geo_reverse_from_nominatim(latlon,zoom=18,addressdetails=18,debug=False,client=None)->dict:
         """ Executes reverse search on nominatim geoserver, returns result als flattened dict
             specification https://nominatim.org/release-docs/latest/api/Reverse/
             'https://nominatim.openstreetmap.org/reverse?format=geojson&lat=48.7791304&lon=9.186206&zoom=18&addressdetails=18'
+            client is a GeoClient (server url, rate limit), the shared nominatim client is used per default
         """
 
-        url = Geo.NOMINATIM_REVERSE_URL
+        if client is None:
+            client = GeoClient.get_client()
+
         params = Geo.NOMINATIM_REVERSE_PARAMS.copy()
         params["lat"] = str(latlon[0])
         params["lon"] = str(latlon[1])
@@ -278,11 +317,17 @@ class Geo:
         zoom = str(zoom)
         params["zoom"] = zoom
 
-        response = requests.get(url,params)
+        response = client.get("reverse",params)
 
-        geo_json = response.json()
-        geo_json["nominatim_url"] = response.url
-        geo_json["http_status"] = response.status_code
+        if response is None:
+            geo_json = {"error":"no response from geo server"}
+        else:
+            try:
+                geo_json = response.json()
+            except ValueError:
+                geo_json = {"error":f"invalid response from geo server ({response.status_code})"}
+            geo_json["nominatim_url"] = response.url
+            geo_json["http_status"] = response.status_code
         geo_json["addressdetails"] = zoom
 
         geo_dict = Geo.nominatimreverse2dict(geo_json,debug=debug)
@@ -311,18 +356,17 @@ class Geo:
         url_geohack = Geo.GEOHACK_URL+Geo.latlon2geohack(latlon_ref)
 
         # load gps data
-        gps_coords = Persistence.read_gpx(gpsx_path=gps_fileref)
+        gps_coords = Track.from_gpx(gpsx_path=gps_fileref)
 
         if not gps_coords:
             print(f"no gps data found in file {gps_fileref}")
             return gps_min
 
-        num = len(gps_coords.keys())
+        num = len(gps_coords)
 
-        timestamps = list(gps_coords.keys())
-        timestamps.sort()
-        timestamp_min = min(timestamps)
-        timestamp_max = max(timestamps)
+        # track is sorted by timestamp
+        timestamp_min = gps_coords.get_timestamp(0)
+        timestamp_max = gps_coords.get_timestamp(num-1)
 
         # utc from (utc) timestamp
         dt_min_utc = datetime.utcfromtimestamp(timestamp_min)
@@ -333,9 +377,9 @@ class Geo:
         dt_max = Util.get_localized_datetime(dt_max_utc,tz_in="UTC",tz_out=tz)
 
         # get geo data
-        geo_min = gps_coords[timestamp_min]
+        geo_min = gps_coords.get_point(0)
         latlon_min = (geo_min["lat"],geo_min["lon"])
-        geo_max = gps_coords[timestamp_max]
+        geo_max = gps_coords.get_point(num-1)
         latlon_max = (geo_max["lat"],geo_max["lon"])
 
         if debug:
@@ -354,7 +398,9 @@ class Geo:
 
         timestamp_min = None
 
-        for timestamp,gps_coord in gps_coords.items():
+        for idx in range(num):
+            timestamp = gps_coords.get_timestamp(idx)
+            gps_coord = gps_coords.get_point(idx)
             latlon = [gps_coord["lat"],gps_coord["lon"]]
             dist = int(1000*Geo.get_distance(latlon_ref,latlon))
             if dist < dist_min:
@@ -0,0 +1,339 @@
+""" http client for reverse geo encoding (keep alive session, rate limiting, retries) """
+
+import os
+import time
+import threading
+import traceback
+import requests
+from image_meta.persistence import Persistence
+
+class TokenBucket:
+    """ token bucket rate limiter: tokens are refilled with rate tokens
+        per second up to burst tokens. Each request takes one token, if no token is
+        left caller sleeps exactly until the next token is available """
+
+    def __init__(self,rate=1.0,burst=1):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self)->float:
+        """ takes a token (waits if necessary), returns waiting time in seconds """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,self.tokens+(now-self.timestamp)*self.rate)
+            self.timestamp = now
+            # reserve token, a negative balance is the waiting time of this caller
+            self.tokens -= 1
+            wait = 0.
+            if self.tokens < 0:
+                wait = -self.tokens / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def set_rate(self,rate=1.0,burst=1):
+        """ changes rate / burst, tokens already collected are kept up to the new burst """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,self.tokens+(now-self.timestamp)*self.rate)
+            self.timestamp = now
+            self.rate = float(rate)
+            self.capacity = float(burst)
+            self.tokens = min(self.capacity,self.tokens)
+
+class GeoClient:
+    """ client for nominatim (or compatible) geo server using a pooled
+        keep alive session and a token bucket rate limiter
+        Caveat: Mind the usage terms from Nominatim, (max 1 request per second)
+        https://operations.osmfoundation.org/policies/nominatim/ """
+
+    NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+    # nominatim usage policy: absolute maximum of 1 request per second
+    RATE = 1.0
+    BURST = 1
+    RETRIES = 3
+    BACKOFF = 1.0
+    TIMEOUT = 10
+    RETRY_STATUS = (429,500,502,503,504)
+    USER_AGENT = "image_meta (https://github.com/aiventures/image_meta)"
+
+    # shared clients per server url, so rate limits also apply across runs
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self,url=NOMINATIM_URL,rate=RATE,burst=BURST,retries=RETRIES,backoff=BACKOFF,
+                 timeout=TIMEOUT,user_agent=USER_AGENT,debug=False):
+        """ constructor: url of geo server, rate (requests per second), burst (requests
+            allowed without waiting), retries / backoff (seconds, doubled with each retry)
+            on 429 / 5xx responses, timeout in seconds """
+        self.url = url.rstrip("/")
+        self.limiter = TokenBucket(rate=rate,burst=burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.debug = debug
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent":user_agent})
+        self.num_requests = 0
+        self.wait_time = 0.
+
+    @staticmethod
+    def get_client(url=None,rate=RATE,burst=BURST,debug=False):
+        """ returns shared client for server url (created if not existing), rate / burst
+            of an existing client are updated if they differ """
+        if not url:
+            url = GeoClient.NOMINATIM_URL
+        url = url.rstrip("/")
+        with GeoClient._clients_lock:
+            client = GeoClient._clients.get(url)
+            if client is None:
+                client = GeoClient(url=url,rate=rate,burst=burst,debug=debug)
+                GeoClient._clients[url] = client
+            elif ( client.limiter.rate != float(rate) ) or ( client.limiter.capacity != float(burst) ):
+                if debug:
+                    print(f"[GeoClient] {url} rate changed to {rate}/s, burst {burst}")
+                client.limiter.set_rate(rate=rate,burst=burst)
+        return client
+
+    @staticmethod
+    def is_valid_result(geo_dict:dict)->bool:
+        """ checks whether a (flattened) reverse geo result can be cached / saved: not empty,
+            no error and http status 200 (if contained) """
+        if not geo_dict or ( geo_dict.get("error") is not None ):
+            return False
+        return geo_dict.get("http_status") in (None,200)
+
+    def get(self,path:str,params:dict=None):
+        """ get request for server path (eg "reverse") with rate limit and retries
+            on http status 429 / 5xx and connection errors, returns response
+            (None if request failed) """
+
+        url = "/".join([self.url,path.lstrip("/")])
+        response = None
+
+        for attempt in range(self.retries+1):
+            self.wait_time += self.limiter.acquire()
+            self.num_requests += 1
+            retry_after = None
+            try:
+                response = self.session.get(url,params=params,timeout=self.timeout)
+                if response.status_code not in GeoClient.RETRY_STATUS:
+                    return response
+                retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError,requests.Timeout):
+                response = None
+                if self.debug:
+                    print(traceback.format_exc())
+
+            if attempt >= self.retries:
+                break
+
+            # back off, server may tell how long to wait
+            try:
+                wait = float(retry_after)
+            except (TypeError,ValueError):
+                wait = self.backoff * ( 2 ** attempt )
+            if self.debug:
+                status = None if response is None else response.status_code
+                print(f"[GeoClient] {url} status {status}, retry {attempt+1}/{self.retries} in {wait}s")
+            time.sleep(wait)
+
+        if response is None:
+            print(f"[GeoClient] no response from {url} with params {params}")
+        return response
+
+class GeoQueue:
+    """ persistent queue of pending reverse geo lookups (lat,lon,zoom) with a
+        background worker draining it at the rate allowed by the geo client.
+        Results are saved as geo (json) files, pending lookups are kept in a
+        queue file so that they will be continued in a later run """
+
+    QUEUE_FILE = "geo_queue.json"
+    # min seconds between writes of the queue file (pending items are written in batches)
+    SAVE_INTERVAL = 5.
+
+    def __init__(self,filepath:str,client:GeoClient=None,debug=False):
+        """ constructor: filepath of queue file, geo client (shared nominatim client per default) """
+        if client is None:
+            client = GeoClient.get_client()
+        self.filepath = filepath
+        self.client = client
+        self.debug = debug
+        # geo filepath > item (latlon,zoom,save,ref)
+        self.items = {}
+        # geo filepath > reverse geo dict
+        self.results = {}
+        # geo filepath > image ref and latlon of items added in this session
+        self.refs = {}
+        # (lat,lon,zoom) > reverse geo dict, to reuse results for identical coordinates
+        self.latlon_results = {}
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.stopped = False
+        self.save_time = time.monotonic()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """ reads pending items from queue file """
+        if not os.path.isfile(self.filepath):
+            return
+        items = Persistence.read_json(self.filepath)
+        if isinstance(items,list):
+            with self.cond:
+                for item in items:
+                    self.items[item["filepath"]] = item
+            if self.debug:
+                print(f"[GeoQueue] {len(items)} pending items read from {self.filepath}")
+
+    def save(self,force=False):
+        """ saves pending items to queue file (call with lock held), at most every SAVE_INTERVAL
+            seconds unless forced or the queue is empty (see stop) """
+        self.dirty = True
+        now = time.monotonic()
+        if self.items and not force and ( now - self.save_time < GeoQueue.SAVE_INTERVAL ):
+            return
+        self.save_time = now
+        self.dirty = False
+        if self.items:
+            Persistence.save_json(self.filepath,list(self.items.values()))
+        elif os.path.isfile(self.filepath):
+            os.remove(self.filepath)
+
+    @staticmethod
+    def get_key(latlon,zoom)->tuple:
+        """ key of a lookup (lat,lon,zoom) """
+        return (round(float(latlon[0]),7),round(float(latlon[1]),7),zoom)
+
+    def put(self,filepath:str,latlon,zoom=18,save=True,ref=None):
+        """ adds a reverse geo lookup, result will be saved to filepath (if save is set)
+            results of identical coordinates already looked up are reused """
+        item = {"filepath":filepath,"latlon":list(latlon),"zoom":zoom,"save":save,"ref":ref}
+        with self.cond:
+            self.refs[filepath] = {"ref":ref,"latlon":list(latlon)}
+            if filepath in self.results or filepath in self.items:
+                return
+            geo_dict = self.latlon_results.get(GeoQueue.get_key(latlon,zoom))
+            if geo_dict is not None:
+                self.results[filepath] = geo_dict
+                if save:
+                    Persistence.save_json(filepath=filepath,data=geo_dict)
+                return
+            self.items[filepath] = item
+            self.save()
+            self.cond.notify_all()
+
+    def get_result(self,filepath:str):
+        """ returns reverse geo dict for filepath, None if not available (yet) """
+        with self.cond:
+            return self.results.get(filepath)
+
+    def is_pending(self,filepath:str)->bool:
+        """ checks whether lookup for filepath is still pending """
+        with self.cond:
+            return filepath in self.items
+
+    def get_refs(self)->dict:
+        """ geo filepath > image reference and latlon of all lookups queued in this session """
+        with self.cond:
+            return dict(self.refs)
+
+    def start(self):
+        """ starts the background worker """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped = False
+        self.running = True
+        self.thread = threading.Thread(target=self.run,name="GeoQueue",daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ stops background worker after current lookup, pending items remain in queue file """
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        with self.cond:
+            if self.dirty:
+                self.save(force=True)
+
+    def is_alive(self)->bool:
+        """ checks whether the background worker is running """
+        return self.running
+
+    def join(self,timeout=None)->bool:
+        """ waits until all items are processed, returns False in case of timeout
+            or if the worker isn't running (anymore) while items are pending """
+        with self.cond:
+            return self.cond.wait_for(lambda:( not self.items ) or ( not self.is_alive() ),
+                                      timeout=timeout) and not self.items
+
+    def run(self):
+        """ worker: drains queue using rate limited geo client """
+        try:
+            self.drain()
+        finally:
+            # wake up callers waiting in join, also if the worker ends unexpectedly
+            with self.cond:
+                self.running = False
+                self.cond.notify_all()
+
+    def drain(self):
+        """ processes items until stopped, an item that fails is marked as done without result """
+        from image_meta.geo import Geo
+
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda:self.items or self.stopped)
+                if self.stopped:
+                    return
+                # oldest item is kept in queue until processed
+                filepath,item = next(iter(self.items.items()))
+
+            try:
+                try:
+                    geo_dict = Geo.geo_reverse_from_nominatim(item["latlon"],zoom=item["zoom"],client=self.client)
+                    # failed lookups are neither saved nor reused, they are retried in a later run
+                    if not GeoClient.is_valid_result(geo_dict):
+                        print(f"[GeoQueue] No reverse geo data for {filepath}: {geo_dict.get('error',geo_dict.get('http_status'))}")
+                        geo_dict = {}
+                    if item.get("save",True) and geo_dict:
+                        Persistence.save_json(filepath=filepath,data=geo_dict)
+                except:
+                    print(f"[GeoQueue] Error retrieving reverse geo data for {filepath}")
+                    print(traceback.format_exc())
+                    geo_dict = {}
+
+                if self.debug:
+                    print(f"[GeoQueue] {filepath}: {geo_dict.get('properties_display_name','<NO DATA>')}")
+
+                with self.cond:
+                    key = GeoQueue.get_key(item["latlon"],item["zoom"])
+                    # pending items with identical coordinates get the same result
+                    done = []
+                    if geo_dict:
+                        self.latlon_results[key] = geo_dict
+                        done = [f for f,i in self.items.items() if GeoQueue.get_key(i["latlon"],i["zoom"]) == key]
+                    for f in done:
+                        self.results[f] = geo_dict
+                        save = self.items.pop(f).get("save",True)
+                        if f != filepath and save and geo_dict:
+                            Persistence.save_json(filepath=f,data=geo_dict)
+                    self.results[filepath] = geo_dict
+                    self.items.pop(filepath,None)
+                    self.save()
+                    self.cond.notify_all()
+            except:
+                print(f"[GeoQueue] Error processing {filepath}")
+                print(traceback.format_exc())
+                with self.cond:
+                    self.results.setdefault(filepath,{})
+                    self.items.pop(filepath,None)
+                    self.dirty = True
+                    self.cond.notify_all()
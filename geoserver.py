@@ -0,0 +1,189 @@
+""" local stand-in for the nominatim reverse service (testing, benchmarks) """
+
+import json
+import time
+import threading
+import traceback
+from urllib.parse import urlparse
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from image_meta.geo import Geo
+
+class ReverseHandler(BaseHTTPRequestHandler):
+    """ request handler for /reverse?format=geojson&lat=..&lon=..&zoom=.. """
+
+    def log_message(self,format,*args):
+        if self.server.nominatim.debug:
+            super().log_message(format,*args)
+
+    def send_json(self,status:int,data:dict,headers:dict=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type","application/json; charset=utf-8")
+        self.send_header("Content-Length",str(len(body)))
+        if headers:
+            for k,v in headers.items():
+                self.send_header(k,v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        nominatim = self.server.nominatim
+        url = urlparse(self.path)
+        params = {k:v[0] for k,v in parse_qs(url.query).items()}
+
+        if url.path.rstrip("/") != "/reverse":
+            self.send_json(404,{"error":f"unknown path {url.path}"})
+            return
+
+        retry_after = nominatim.acquire()
+        if retry_after is not None:
+            # retry after is sent in (fractional) seconds
+            self.send_json(429,{"error":"Too many requests"},headers={"Retry-After":f"{retry_after:.3f}"})
+            return
+
+        if nominatim.latency > 0:
+            time.sleep(nominatim.latency)
+
+        if params.get("format","xml") != "geojson":
+            self.send_json(400,{"error":"only format=geojson is supported"})
+            return
+
+        try:
+            latlon = (float(params["lat"]),float(params["lon"]))
+            zoom = int(params.get("zoom",18))
+        except (KeyError,ValueError):
+            self.send_json(400,{"error":"Parameter lat / lon missing or invalid"})
+            return
+
+        try:
+            geo_json = nominatim.get_response(latlon,zoom)
+        except:
+            print(traceback.format_exc())
+            self.send_json(500,{"error":"Internal Server Error"})
+            return
+
+        self.send_json(200,geo_json)
+
+class NominatimServer:
+    """ local http server serving the subset of the nominatim reverse api used
+        by Geo.geo_reverse_from_nominatim (format=geojson). Responses are either
+        canned (geojson files recorded from nominatim, nearest feature is returned)
+        or synthetic (place names derived from a coordinate grid).
+        Latency (seconds per request) and a rate limit (requests per second,
+        exceeding requests are answered with 429 and Retry-After) can be configured """
+
+    LICENCE = "Data © OpenStreetMap contributors, ODbL 1.0. https://osm.org/copyright"
+    # grid size in degrees for synthetic places
+    GRID_SIZE = 0.01
+    # tolerance of rate limit as fraction of request interval
+    TOLERANCE = 0.1
+
+    def __init__(self,host="127.0.0.1",port=0,latency=0.,rate=None,canned:list=None,
+                 grid_size=GRID_SIZE,debug=False):
+        """ constructor: host, port (0: any free port), latency in seconds, rate in requests
+            per second (None: no limit), canned: list of geojson filepaths or geojson
+            responses (dict), grid size in degrees for synthetic places """
+        self.latency = latency
+        self.rate = rate
+        self.grid_size = grid_size
+        self.debug = debug
+        self.canned = []
+        for c in ( canned or [] ):
+            self.add_canned(c)
+        self.num_requests = 0
+        self.num_rejected = 0
+        self.lock = threading.Lock()
+        self.timestamp = None
+        self.httpd = ThreadingHTTPServer((host,port),ReverseHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.nominatim = self
+        self.thread = None
+
+    @property
+    def url(self)->str:
+        """ base url of server """
+        host,port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_canned(self,geo_json):
+        """ adds a canned reverse response (geojson dict or filepath) """
+        if isinstance(geo_json,str):
+            with open(geo_json,encoding="utf-8") as f:
+                geo_json = json.load(f)
+        try:
+            lon,lat = geo_json["features"][0]["geometry"]["coordinates"][:2]
+        except (KeyError,IndexError,TypeError):
+            print("[NominatimServer] canned response without point geometry, skipped")
+            return
+        self.canned.append(((float(lat),float(lon)),geo_json))
+
+    def acquire(self):
+        """ rate limit (generic cell rate algorithm, small tolerance for network jitter):
+            returns None if request is accepted, otherwise seconds to wait """
+        with self.lock:
+            self.num_requests += 1
+            if not self.rate:
+                return None
+            now = time.monotonic()
+            interval = 1 / self.rate
+            if self.timestamp is None:
+                self.timestamp = now
+            # timestamp: theoretical arrival time of next request
+            wait = self.timestamp - now - NominatimServer.TOLERANCE * interval
+            if wait > 0:
+                self.num_rejected += 1
+                return wait
+            self.timestamp = max(now,self.timestamp) + interval
+            return None
+
+    def get_synthetic(self,latlon,zoom=18)->dict:
+        """ synthetic reverse response, place names are derived from grid cell """
+        lat,lon = latlon
+        g = self.grid_size
+        cell_lat = int(lat // g)
+        cell_lon = int(lon // g)
+        city = f"City {int(lat)}_{int(lon)}"
+        suburb = f"Suburb {cell_lat}_{cell_lon}"
+        address = {"road":f"Road {cell_lat % 100}","suburb":suburb,"city":city,
+                   "state":f"State {int(lat//10)}_{int(lon//10)}","postcode":f"{abs(cell_lat*cell_lon)%100000:05d}",
+                   "country":"Testland","country_code":"tl"}
+        if zoom < 14:
+            address.pop("road")
+        if zoom < 10:
+            address.pop("suburb")
+        name = address.get("road",suburb)
+        properties = {"place_id":abs(hash((cell_lat,cell_lon))) % 10**9,"osm_type":"way","osm_id":cell_lat*100000+cell_lon,
+                      "place_rank":zoom,"category":"highway","type":"residential","importance":0.1,
+                      "addresstype":"road","name":name,"display_name":", ".join(address.values()),
+                      "address":address}
+        bbox = [cell_lon*g,cell_lat*g,(cell_lon+1)*g,(cell_lat+1)*g]
+        feature = {"type":"Feature","properties":properties,"bbox":bbox,
+                   "geometry":{"type":"Point","coordinates":[lon,lat]}}
+        return {"type":"FeatureCollection","licence":NominatimServer.LICENCE,"features":[feature]}
+
+    def get_response(self,latlon,zoom=18)->dict:
+        """ nearest canned response or synthetic response """
+        if self.canned:
+            _,geo_json = min(self.canned,key=lambda c:Geo.get_distance(c[0],latlon))
+            return geo_json
+        return self.get_synthetic(latlon,zoom)
+
+    def start(self):
+        """ starts server in background thread """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.httpd.serve_forever,name="NominatimServer",daemon=True)
+        self.thread.start()
+        if self.debug:
+            print(f"[NominatimServer] serving on {self.url}")
+
+    def stop(self):
+        """ stops server """
+        if self.thread is None:
+            return
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+        self.thread = None
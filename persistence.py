@@ -1,20 +1,27 @@
 import json
-import glob
 import os
 from os import listdir
 import traceback
-from xml.dom import minidom
+from xml.etree import ElementTree
 import pytz
 import shutil
 import re
 import time
+import fnmatch
+import itertools
+import queue
+import threading
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import os.path
 from configparser import ConfigParser
-from xml.dom import minidom
 from datetime import datetime
 from pathlib import Path
 from image_meta import util
 from image_meta.util import Util
+from image_meta.statcache import StatCache
+from image_meta.copier import CopyEngine
+from image_meta.rules import RuleSet
 
 class Persistence:
     """ read/write data into persistence (right now, only json)"""
@@ -59,6 +66,16 @@ class Persistence:
     FILEINFO_URL = "url"
     FILEINFO_SIZE = "size"
 
+    # duplicate detection: by file name or by file content
+    DUPLICATES_NAME = "name"
+    DUPLICATES_CONTENT = "content"
+    # content hash: bytes read from start and end of file for partial hash
+    HASH_CHUNK_SIZE = 65536
+    HASH_BLOCK_SIZE = 1048576
+
+    # regex special characters (outside of character sets)
+    REGEX_SPECIAL_CHARS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
     # regex pattern for a raw file name: 3 letters 5 decimals
     REGEX_RAW_FILE_NAME = r"[a-zA-Z]{3}\d{5}"
 
@@ -75,11 +92,13 @@ class Persistence:
         files = None
         if os.path.isdir(self.path) is False:
             print(f"[Persistence] {self.path} is not a directory")
-        else:
-            file_mask = self.path + Persistence.PATH_SEPARATOR + "*." + file_type
-            files = glob.glob(file_mask)
+            return files
 
-        files = list(map(os.path.normpath,files))
+        # same matches as glob (hidden files are skipped), path is already normalized
+        file_mask = "*." + file_type
+        with os.scandir(self.path) as entries:
+            names = [entry.name for entry in entries if not entry.name.startswith(".")]
+        files = [os.path.join(self.path,f) for f in fnmatch.filter(names,file_mask)]
         return files
 
     @staticmethod
@@ -145,59 +164,121 @@ class Persistence:
         """
 
         try:
-            gpsx_xml =  minidom.parse(gpsx_path)
+            gps_dict = {}
+            for ts,point in Persistence.read_gpx_stream(gpsx_path,debug=debug,tz=tz):
+                gps_dict[ts] = point
         except:
             print(f"Error reading gpsx file {gpsx_path}")
             print(traceback.format_exc())
             return {}
 
-        gps_dict = {}
+        return gps_dict
+
+    @staticmethod
+    def read_gpx_stream(gpsx_path:str,debug=False,tz=pytz.timezone("Europe/Berlin")):
+        """ generator reading gpx xml data incrementally (iterparse, processed elements
+            are cleared so memory is bounded), yields (utc timestamp,point dict) in
+            document order, point dict as in read_gpx """
+
+        def local_name(tag):
+            return tag.rsplit("}",1)[-1]
+
+        def find_text(elem,tag):
+            for e in elem.iter():
+                if local_name(e.tag) == tag:
+                    return e.text
+            return None
+
+        # open elements (root first)
+        stack = []
+        in_track = False
+        track_name = None
+        # points of a track read before its name
+        buffer = []
         gps_pts = 0
-        tracks = gpsx_xml.getElementsByTagName('trk')
-        for track in tracks:
-            track_name =  track.getElementsByTagName("name")[0].firstChild.data
-            if debug is True:
-                print("TRACK NAME",track_name)
-            tracksegs = track.getElementsByTagName('trkseg')
-            for trackseg in tracksegs:
-                heart_rate = 0
-                cadence = 0
-                trackpoints = trackseg.getElementsByTagName('trkpt')
-                for trackpoint in trackpoints:
-                    lat = float(trackpoint.getAttribute('lat'))
-                    lon = float(trackpoint.getAttribute('lon'))
-                    ele = float(float(trackpoint.getElementsByTagName('ele')[0].firstChild.data))
-                    ts_s = trackpoint.getElementsByTagName('time')[0].firstChild.data
-                    ts = Util.get_timestamp(ts_s)
-                    gps_dict[ts] = {"lat":lat, "lon":lon, "ele":ele, "track_name":track_name}
-                    gps_pts += 1
-
-                    # optional segments for fitness tracker
-                    # <ns3:TrackPointExtension>
-                    #    <ns3:hr>140</ns3:hr>  heart rate
-                    #    <ns3:cad>83</ns3:cad> cadence / run frequency
-                    extension = trackpoint.getElementsByTagNameNS('*','TrackPointExtension')
-                    if len(extension) == 1:
-                        try:
-                            heart_rate =  int(extension[0].getElementsByTagNameNS('*','hr')[0].firstChild.data)
-                        except:
-                            heart_rate = 0
-                        try:
-                            cadence = int(extension[0].getElementsByTagNameNS('*','cad')[0].firstChild.data)
-                        except:
-                            cadence = 0
-                        gps_dict[ts]["heart_rate"] = heart_rate
-                        gps_dict[ts]["cadence"] = cadence
-
-                if (debug is True):
+        heart_rate = 0
+        cadence = 0
+        last_point = None
+
+        for event,elem in ElementTree.iterparse(gpsx_path,events=("start","end")):
+            tag = local_name(elem.tag)
+            if event == "start":
+                stack.append(elem)
+                if tag == "trk":
+                    in_track = True
+                    track_name = None
+                    buffer = []
+                elif tag == "trkseg":
+                    heart_rate = 0
+                    cadence = 0
+                    last_point = None
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+
+            if not in_track:
+                pass
+            elif tag == "name" and track_name is None:
+                # first name element in track (document order)
+                track_name = elem.text
+                if debug is True:
+                    print("TRACK NAME",track_name)
+                for ts,point in buffer:
+                    point["track_name"] = track_name
+                    yield (ts,point)
+                buffer = []
+            elif tag == "trkpt" and local_name(parent.tag) == "trkseg":
+                lat = float(elem.get("lat"))
+                lon = float(elem.get("lon"))
+                ele = float(find_text(elem,"ele"))
+                ts = Util.get_timestamp(find_text(elem,"time"))
+                point = {"lat":lat, "lon":lon, "ele":ele, "track_name":track_name}
+                gps_pts += 1
+
+                # optional segments for fitness tracker
+                # <ns3:TrackPointExtension>
+                #    <ns3:hr>140</ns3:hr>  heart rate
+                #    <ns3:cad>83</ns3:cad> cadence / run frequency
+                extension = [e for e in elem.iter() if local_name(e.tag) == "TrackPointExtension"]
+                if len(extension) == 1:
+                    try:
+                        heart_rate = int(find_text(extension[0],"hr"))
+                    except:
+                        heart_rate = 0
+                    try:
+                        cadence = int(find_text(extension[0],"cad"))
+                    except:
+                        cadence = 0
+                    point["heart_rate"] = heart_rate
+                    point["cadence"] = cadence
+
+                last_point = (ts,lat,lon,ele)
+                if track_name is None:
+                    buffer.append((ts,point))
+                else:
+                    yield (ts,point)
+            elif tag == "trkseg":
+                if ( debug is True ) and ( last_point is not None ):
+                    ts,lat,lon,ele = last_point
                     url = r"https://www.openstreetmap.org/#map=16/"+str(lat)+r"/"+str(lon)
                     dt = pytz.utc.localize(datetime.utcfromtimestamp(ts)).astimezone(tz)
                     print(f"Reading Track {track_name} ... {gps_pts} Points, Last Date {dt}")
                     if heart_rate > 0:
                         print(f"Running watch: heart rate {heart_rate} cadence {cadence} ")
                     print(f"elevation {ele} last coordinate {url}")
-
-        return gps_dict
+            elif tag == "trk":
+                # track without name
+                for ts,point in buffer:
+                    yield (ts,point)
+                buffer = []
+                in_track = False
+
+            # free processed elements: track points and top level elements
+            if tag == "trkpt" or len(stack) == 1:
+                elem.clear()
+                if parent is not None:
+                    parent.remove(elem)
 
     @staticmethod
     def read_json(filepath:str):
@@ -342,15 +423,19 @@ class Persistence:
         return copy_list
 
     @staticmethod
-    def copy_files(src_path,trg_path,ext=None):
+    def copy_files(src_path,trg_path,ext=None,threads=CopyEngine.THREADS,mode=CopyEngine.MODE_COPY,progress=None):
         """copies files from one file path to another
            filter ext can be supplied to only copy certain file types
-           returns list of copied files in target directory"""
+           threads / mode (copy, hardlink, reflink) / progress: see CopyEngine
+           returns list of copied files in target directory, raises OSError if files couldn't be copied"""
 
         copy_list = Persistence.filter_files(path=src_path,ext=ext)
 
-        copied_files = [shutil.copy(os.path.join(src_path,f),os.path.join(trg_path,f))
-                        for f in copy_list]
+        engine = CopyEngine(threads=threads,mode=mode,preserve_metadata=False,progress=progress)
+        copied_files = engine.copy_files([(os.path.join(src_path,f),os.path.join(trg_path,f)) for f in copy_list])
+        failed = [f for f,trg in zip(copy_list,copied_files) if trg is None]
+        if failed:
+            raise OSError(f"[Persistence] copy_files: {len(failed)} files could not be copied to {trg_path}: {failed[:5]}")
 
         return copied_files
 
@@ -434,8 +519,10 @@ class Persistence:
         return full_filepath
 
     @staticmethod
-    def get_filepath_info(filepath,showinfo=False):
+    def get_filepath_info(filepath,showinfo=False,stat_cache:StatCache=None):
         """ returns metainfo for a given file path
+            stat_cache: StatCache to reuse file system lookups within a run
+            (only path parts needed: use get_path_parts)
             Notabene: doesn't fully work in Desktop folders in Windows (folder info wrong) """
         fileinfo = {}
         try:
@@ -455,9 +542,10 @@ class Persistence:
             is_absolute_path = True
         fileinfo[Persistence.FILEINFO_IS_ABSOLUTE_PATH] = is_absolute_path
         fileinfo[Persistence.FILEINFO_SUFFIX] = p.suffix[1:]
-        fileinfo[Persistence.FILEINFO_IS_DIR] = os.path.isdir(p)
-        fileinfo[Persistence.FILEINFO_IS_FILE] = os.path.isfile(p)
-        parent_is_dir = os.path.isdir(p.parent)
+        fs = os.path if stat_cache is None else stat_cache
+        fileinfo[Persistence.FILEINFO_IS_DIR] = fs.isdir(np)
+        fileinfo[Persistence.FILEINFO_IS_FILE] = fs.isfile(np)
+        parent_is_dir = fs.isdir(str(p.parent))
 
         # only if path contains more than 1 element
         if ( parent_is_dir and len(p.parts) <= 1 ):
@@ -484,11 +572,11 @@ class Persistence:
             fileinfo[Persistence.FILEINFO_ACTIONS] = Persistence.ACTIONS_FILE
             # adding special properties
             # dates and sizes
-            date_changed = datetime.fromtimestamp(int(os.path.getmtime(fileinfo[Persistence.FILEINFO_FILEPATH])))
-            date_created = datetime.fromtimestamp(int(os.path.getctime(fileinfo[Persistence.FILEINFO_FILEPATH])))
+            date_changed = datetime.fromtimestamp(int(fs.getmtime(fileinfo[Persistence.FILEINFO_FILEPATH])))
+            date_created = datetime.fromtimestamp(int(fs.getctime(fileinfo[Persistence.FILEINFO_FILEPATH])))
             fileinfo[Persistence.FILEINFO_CHANGED_ON] = date_changed
             fileinfo[Persistence.FILEINFO_CREATED_ON] = date_created
-            fileinfo[Persistence.FILEINFO_SIZE] =  Path(filepath).stat().st_size
+            fileinfo[Persistence.FILEINFO_SIZE] =  fs.getsize(np)
             # for urls add url field
             if  fileinfo[Persistence.FILEINFO_SUFFIX] == "url":
                 fileinfo[Persistence.FILEINFO_URL] = Persistence.read_internet_shortcut(np)
@@ -511,6 +599,82 @@ class Persistence:
 
         return fileinfo
 
+    @staticmethod
+    def get_path_parts(filepath:str)->dict:
+        """ file path parts as in get_filepath_info (filepath, parent, stem, suffix, drive),
+            from the path string only (no file system access), for use in loops """
+        np = os.path.normpath(filepath)
+        drive,_ = os.path.splitdrive(np)
+        parent,name = os.path.split(np)
+        if parent == "":
+            parent = "."
+        stem,suffix = os.path.splitext(name)
+        # pathlib: trailing dot is no suffix
+        if suffix == ".":
+            stem = name
+            suffix = ""
+        return {Persistence.FILEINFO_FILEPATH:np,Persistence.FILEINFO_PARENT:parent,
+                Persistence.FILEINFO_STEM:stem,Persistence.FILEINFO_SUFFIX:suffix[1:],
+                Persistence.FILEINFO_DRIVE:drive}
+
+    @staticmethod
+    def get_stem_path(filepath:str)->tuple:
+        """ splits normalized file path into path without extension (stem path) and extension
+            (without dot), eg /a/b.jpg -> (/a/b,jpg) """
+        stem_path,suffix = os.path.splitext(os.path.normpath(filepath))
+        return (stem_path,suffix[1:])
+
+    @staticmethod
+    def get_stem_index(path,ext=None)->dict:
+        """ index of files with the same stem (eg image and sidecar files), built with a single
+            directory scan: { stem path: { extension: filepath } } (extensions as in file name)
+            path is a directory (scanned once), or a file path list (no scan)
+            ext: extension or list of extensions to be indexed (case insensitive, None: all files) """
+        ext_set = Persistence.get_ext_set(ext)
+        if isinstance(path,str) and os.path.isdir(path):
+            with os.scandir(path) as entries:
+                filepaths = [os.path.join(path,entry.name) for entry in entries if entry.is_file()]
+        elif isinstance(path,str):
+            filepaths = [path]
+        else:
+            filepaths = path
+        stem_index = {}
+        for filepath in filepaths:
+            stem_path,suffix = Persistence.get_stem_path(filepath)
+            if ( ext_set is not None ) and ( ("."+suffix.lower()) not in ext_set ):
+                continue
+            stem_index.setdefault(stem_path,{})[suffix] = os.path.normpath(filepath)
+        return stem_index
+
+    @staticmethod
+    def get_sidecar(filepath:str,ext:str,stem_index:dict=None)->str:
+        """ filepath of the file with same stem and extension ext (eg filename.geo for filename.jpg)
+            if it exists, otherwise None. Looked up in stem_index (see get_stem_index) if
+            supplied, otherwise in the file system """
+        stem_path,_ = Persistence.get_stem_path(filepath)
+        if stem_index is not None:
+            return stem_index.get(stem_path,{}).get(ext)
+        sidecar = stem_path+"."+ext
+        if os.path.isfile(sidecar):
+            return sidecar
+        return None
+
+    @staticmethod
+    def get_prefix_matches(stems:list,names:list,case_sensitive=False)->dict:
+        """ files names starting with one of the stems, returns { stem: [file names] } (lower case stems
+            if not case_sensitive). Lookup of the name prefixes in a stem set, names keep their order """
+        stem_set = set(stems) if case_sensitive else set([s.lower() for s in stems])
+        lengths = sorted(set([len(s) for s in stem_set]))
+        matches = {}
+        for name in names:
+            name_key = name if case_sensitive else name.lower()
+            for n in lengths:
+                if n > len(name_key):
+                    break
+                if name_key[:n] in stem_set:
+                    matches.setdefault(name_key[:n],[]).append(name)
+        return matches
+
     @staticmethod
     def delete_related_files(fp,src_ext="jpg", del_ext_list=["jpg","xml"],
                             regex_file_pattern = "^#file#",
@@ -595,17 +759,29 @@ class Persistence:
 
             src_files = list(filter(lambda f: (re_src.search(f) is not None), files))
             src_files = sorted(src_files,key=str.casefold)
+            src_stems = [src_file[:(len_ext-1)] for src_file in src_files]
 
-            # create search regex for each file
-            for src_file in src_files:
-                src_file_stem = src_file[:(len_ext-1)]
+            # default pattern (file name starts with stem) and plain stems: prefix lookup instead of a regex per file
+            prefix_matches = None
+            if ( regex_file_pattern == "^"+file_placeholder ) and \
+               all([s.isascii() and ( Persistence.REGEX_SPECIAL_CHARS.search(s) is None ) for s in src_stems]):
+                prefix_matches = Persistence.get_prefix_matches(src_stems,del_list,case_sensitive=case_sensitive)
+            else:
+                # search regex for each source file, merged into one rule set: files not matching
+                # any source file are sorted out with a single regex call
+                regex_files = [regex_file_pattern.replace(file_placeholder,s) for s in src_stems]
+                rules = RuleSet(regex_files,flags=0 if case_sensitive else re.IGNORECASE,search=True)
+                rule_matches = [[] for _ in src_stems]
+                for d in del_list:
+                    for i in rules.get_matching_rules(d):
+                        rule_matches[i].append(d)
+
+            for i,src_file_stem in enumerate(src_stems):
                 regex_file = regex_file_pattern.replace(file_placeholder,src_file_stem)
-                if case_sensitive:
-                    regex = re.compile(regex_file)
+                if prefix_matches is not None:
+                    del_list_files = prefix_matches.get(src_file_stem if case_sensitive else src_file_stem.lower(),[])
                 else:
-                    regex = re.compile(regex_file,re.IGNORECASE)
-
-                del_list_files = list(filter(lambda d_ext: (regex.search(d_ext) is not None), del_list))
+                    del_list_files = rule_matches[i]
                 if show_info:
                     print(f"Match Pattern: {regex_file}\n  found {del_list_files}")
                 del_list_files = list(map(lambda f:os.path.join(subpath,f), del_list_files))
@@ -627,7 +803,8 @@ class Persistence:
         return del_files
 
     @staticmethod
-    def copy_rename(fp,trg_path_root,regex_filter=None,regex_subst=None,s_subst="",debug=False,save=True):
+    def copy_rename(fp,trg_path_root,regex_filter=None,regex_subst=None,s_subst="",debug=False,save=True,
+                    threads=CopyEngine.THREADS,mode=CopyEngine.MODE_COPY,progress=None,recursive=True):
         """  Recursively (from subpaths) copies files matching to regex name patterns and/or renames files
             Parameters
             -----------
@@ -639,6 +816,14 @@ class Persistence:
             s_subst       : substitution string
             debug         : show debug information
             save          : execute the operations. If false, changes are not saved
+            threads       : number of copy threads
+            mode          : copy mode (CopyEngine.MODE_COPY, MODE_HARDLINK, MODE_REFLINK)
+            progress      : show copy progress (True or function, see CopyEngine)
+            recursive     : also process subpaths of fp (otherwise only files in fp)
+
+            Raises
+            --------------
+            OSError if files couldn't be copied (after all other files were copied, before renaming)
 
             Returns
             --------------
@@ -657,8 +842,17 @@ class Persistence:
             print(f"    FILTER: {regex_filter}")
             print(f"    REPLACE PATTERN: {regex_subst} BY {s_subst}")
 
+        # files are copied in parallel after the walk, then renamed
+        copy_list = []
+        rename_list = []
+        rule_filter = None if regex_filter is None else RuleSet.get(regex_filter,search=True)
+        re_subst = None if regex_subst is None else re.compile(regex_subst,re.IGNORECASE)
+
         for subpath,_,files in os.walk(fp):
 
+            if ( not recursive ) and ( subpath != fp ):
+                break
+
             if debug:
                 print(f"\n    --- Processing Folder: {subpath} ---")
 
@@ -684,10 +878,8 @@ class Persistence:
             for f in files:
 
                 # filter file name
-                if regex_filter is not None:
-                    regex_search = re.findall(regex_filter,f)
-
-                    if len(regex_search) == 0:
+                if rule_filter is not None:
+                    if not rule_filter.is_match(f):
                         print(f"        - {f}")
                         continue
 
@@ -697,29 +889,35 @@ class Persistence:
                     fp_trg = os.path.join(copy_path,f)
                     if debug:
                         print(f"        C {f} copied")
-                    if save:
-                        try:
-                            shutil.copy2(fp_src, fp_trg)
-                        except IOError:
-                            os.makedirs(os.path.dirname(fp_trg),0o777)
-                            shutil.copy2(fp_src, fp_trg)
+                    copy_list.append((fp_src,fp_trg))
                 else:
                     fp_trg = fp_src
 
                 # now rename file
-                if regex_subst is not None:
-                    f_subst = re.sub(regex_subst, s_subst, f,flags=re.IGNORECASE)
+                if re_subst is not None:
+                    f_subst = re_subst.sub(s_subst, f)
                     if not f_subst == f:
                         if debug:
                             if not copy_file:
                                 print(f"        O    {f} (RENAME)")
                             print(f"        R -> {f_subst}")
-                            fp_rename = os.path.join(os.path.dirname(fp_trg),f_subst)
-                        if save:
-                            if os.path.isfile(fp_rename):
-                                print(f"        E    {f_subst} exists, no rename")
-                            else:
-                                os.rename(fp_trg, fp_rename)
+                        rename_list.append((fp_trg,os.path.join(os.path.dirname(fp_trg),f_subst),f_subst))
+
+        if not save:
+            return None
+
+        engine = CopyEngine(threads=threads,mode=mode,preserve_metadata=True,progress=progress,debug=debug)
+        copied_files = engine.copy_files(copy_list)
+        # like a failed copy call: raise, so that no cleanup is done after an incomplete copy
+        failed = [fp_src for (fp_src,_),trg in zip(copy_list,copied_files) if trg is None]
+        if failed:
+            raise OSError(f"[Persistence] copy_rename: {len(failed)} files could not be copied to {trg_path_root}: {failed[:5]}")
+
+        for fp_trg,fp_rename,f_subst in rename_list:
+            if os.path.isfile(fp_rename):
+                print(f"        E    {f_subst} exists, no rename")
+            elif os.path.isfile(fp_trg):
+                os.rename(fp_trg, fp_rename)
         return None
 
     @staticmethod
@@ -853,9 +1051,387 @@ class Persistence:
                             print(f"   Update of file {metadata_fp}")
         return True
 
+    @staticmethod
+    def get_ext_set(ext=None)->set:
+        """ set of lower case file extensions (with leading dot) for an extension
+            string or list, None if there is no filter """
+        if ext is None:
+            return None
+        if isinstance(ext,str):
+            ext = [ext]
+        return set([("."+e.lower().lstrip(".")) if e else "" for e in ext])
+
+    @staticmethod
+    def get_ignore_list(ignore_paths=None)->list:
+        """ lower case list of path substrings to be ignored for a string or list
+            (same as Util.contains), empty list if there is no filter """
+        if isinstance(ignore_paths,str):
+            ignore_paths = [ignore_paths]
+        if not isinstance(ignore_paths,list):
+            return []
+        return [p.lower() for p in ignore_paths]
+
+    @staticmethod
+    def scan_dir(subpath:str,ext_set:set=None)->tuple:
+        """ single directory scan (os.scandir, one stat per file), returns
+            ([(filename,size,ctime,mtime)],[DirEntry of subdirectories (no links)])
+            or None if directory can't be read. ext_set see get_ext_set """
+        files = []
+        dirs = []
+        try:
+            with os.scandir(subpath) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if not entry.is_symlink():
+                            dirs.append(entry)
+                        continue
+                    if ( ext_set is not None ) and ( os.path.splitext(entry.name)[1].lower() not in ext_set ):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((entry.name,stat.st_size,stat.st_ctime,stat.st_mtime))
+        except OSError:
+            return None
+        return (files,dirs)
+
+    @staticmethod
+    def get_subdirs(dirs:list,dev:int)->list:
+        """ (path,is_mount,st_dev) for subdirectory entries of a directory on device dev """
+        subdirs = []
+        for entry in dirs:
+            try:
+                dir_dev = entry.stat(follow_symlinks=False).st_dev
+            except OSError:
+                continue
+            subdirs.append((entry.path,dir_dev != dev,dir_dev))
+        return subdirs
+
+    @staticmethod
+    def walk_files(fp:str,ignore_paths=None,ext=None,skip=None):
+        """ walks a directory tree top down like os.walk (not following links), but based on
+            os.scandir with a single stat call per file. Yields per directory
+            (subpath, is_mount, [(filename,size,ctime,mtime)])
+            ignore_paths: subpaths containing one of the strings (case insensitive) are skipped
+            ext: file extension or list of extensions to be returned (None: all files)
+            is_mount: directory is on another device than its parent (st_dev)
+            skip: function(subpath)->bool, subdirectories (and their subtrees) for which it returns True are skipped
+        """
+        ext_set = Persistence.get_ext_set(ext)
+        ignore_list = Persistence.get_ignore_list(ignore_paths)
+        try:
+            dev = os.stat(fp).st_dev
+        except OSError:
+            return
+
+        # directories to be processed (path,is_mount,st_dev), depth first in scandir order
+        stack = [(fp,os.path.ismount(fp),dev)]
+        while stack:
+            subpath,is_mount,dev = stack.pop()
+            if ignore_list and Persistence.is_ignored(subpath,ignore_list):
+                continue
+            if ( skip is not None ) and ( subpath != fp ) and skip(subpath):
+                continue
+            scan = Persistence.scan_dir(subpath,ext_set)
+            if scan is None:
+                continue
+            files,dirs = scan
+            yield (subpath,is_mount,files)
+            stack.extend(reversed(Persistence.get_subdirs(dirs,dev)))
+
+    @staticmethod
+    def is_ignored(subpath:str,ignore_list:list)->bool:
+        """ checks whether path contains one of the (lower case) strings """
+        subpath_lower = subpath.lower()
+        return any([p in subpath_lower for p in ignore_list])
+
+    @staticmethod
+    def get_pattern_regex(patterns):
+        """ single compiled regex (case insensitive) for glob pattern or list of glob patterns, None if empty """
+        if isinstance(patterns,str):
+            patterns = [patterns]
+        if not patterns:
+            return None
+        return re.compile("|".join([f"(?:{fnmatch.translate(p)})" for p in patterns]),re.IGNORECASE)
+
+    @staticmethod
+    def walk_matching_files(fp:str,ext=None,include=None,exclude=None,recursive=True,ignore_paths=None):
+        """ generator: walks directory tree (see walk_files) and yields per directory with matching
+            files (subpath,[filepaths]), one directory at a time (no complete file list in memory)
+            ext: file extension or list of extensions (None: all files)
+            include / exclude: glob pattern or list of patterns (case insensitive), matched against
+            file name or path relative to fp (separator /), exclude patterns matching a directory
+            name skip the whole subtree (eg ["*.tmp","backup*"])
+            recursive: False only scans fp itself """
+        regex_include = Persistence.get_pattern_regex(include)
+        regex_exclude = Persistence.get_pattern_regex(exclude)
+        root = os.path.normpath(fp)
+
+        def get_rel_path(subpath):
+            return os.path.relpath(subpath,root).replace(os.sep,"/")
+
+        def is_excluded_dir(subpath):
+            return bool( regex_exclude.match(os.path.basename(subpath)) or regex_exclude.match(get_rel_path(subpath)) )
+
+        skip = is_excluded_dir if regex_exclude is not None else None
+        for subpath,_,files in Persistence.walk_files(root,ignore_paths=ignore_paths,ext=ext,skip=skip):
+            rel_dir = "" if subpath == root else get_rel_path(subpath)+"/"
+
+            filepaths = []
+            for f in files:
+                name = f[0]
+                if regex_include is not None and not ( regex_include.match(name) or regex_include.match(rel_dir+name) ):
+                    continue
+                if regex_exclude is not None and ( regex_exclude.match(name) or regex_exclude.match(rel_dir+name) ):
+                    continue
+                filepaths.append(os.path.join(subpath,name))
+
+            if filepaths:
+                yield (subpath,filepaths)
+            if not recursive:
+                break
+
+    @staticmethod
+    def iter_files(path,file_type_filter=None,include=None,exclude=None,recursive=True,ignore_paths=None):
+        """ generator version of get_file_list: yields matching file paths of a directory tree
+            path can be a file path, a directory, or a list of both (see walk_matching_files for the
+            other params, files given explicitly are only filtered by extension / pattern) """
+        path_list = path if isinstance(path,list) else [path]
+        ext_set = Persistence.get_ext_set(file_type_filter)
+        regex_include = Persistence.get_pattern_regex(include)
+        regex_exclude = Persistence.get_pattern_regex(exclude)
+        for path_ref in path_list:
+            if os.path.isdir(path_ref):
+                for _,filepaths in Persistence.walk_matching_files(path_ref,ext=file_type_filter,include=include,exclude=exclude,
+                                                                   recursive=recursive,ignore_paths=ignore_paths):
+                    yield from filepaths
+            elif os.path.isfile(path_ref):
+                name = os.path.basename(path_ref)
+                if ext_set is not None and not ( os.path.splitext(name)[1].lower() in ext_set ):
+                    continue
+                if regex_include is not None and not regex_include.match(name):
+                    continue
+                if regex_exclude is not None and regex_exclude.match(name):
+                    continue
+                yield os.path.normpath(path_ref)
+
+    @staticmethod
+    def walk_files_parallel(fps:list,ignore_paths=None,ext=None,threads_per_device=2,queue_size=1000)->list:
+        """ walks several directory trees in parallel: roots are grouped by device (st_dev),
+            each device gets its own worker threads sharing a bounded queue of subdirectories
+            (if the queue is full, workers continue with the subdirectory themselves).
+            Returns list of (subpath, is_mount, [(filename,size,ctime,mtime)]) in the same order
+            as walk_files for the roots one after another (sorted by position in the tree)
+        """
+        if isinstance(fps,str):
+            fps = [fps]
+        ext_set = Persistence.get_ext_set(ext)
+        ignore_list = Persistence.get_ignore_list(ignore_paths)
+
+        # group roots by device
+        device_roots = {}
+        for i,fp in enumerate(fps):
+            try:
+                dev = os.stat(fp).st_dev
+            except OSError:
+                continue
+            device_roots.setdefault(dev,[]).append(((i,),fp,os.path.ismount(fp),dev))
+
+        # results with sort key (root index, index of subdirectory on each level)
+        results = []
+
+        def walk_device(dir_queue:queue.Queue):
+            while True:
+                item = dir_queue.get()
+                if item is None:
+                    dir_queue.task_done()
+                    return
+                try:
+                    stack = [item]
+                    while stack:
+                        key,subpath,is_mount,dev = stack.pop()
+                        if ignore_list and Persistence.is_ignored(subpath,ignore_list):
+                            continue
+                        scan = Persistence.scan_dir(subpath,ext_set)
+                        if scan is None:
+                            continue
+                        files,dirs = scan
+                        results.append((key,subpath,is_mount,files))
+                        for n,subdir in enumerate(Persistence.get_subdirs(dirs,dev)):
+                            subdir_item = (key+(n,),*subdir)
+                            try:
+                                dir_queue.put_nowait(subdir_item)
+                            except queue.Full:
+                                stack.append(subdir_item)
+                except:
+                    print(f"[Persistence] Exception walking {item[1]}")
+                    print(traceback.format_exc())
+                finally:
+                    dir_queue.task_done()
+
+        workers = []
+        for dev,roots in device_roots.items():
+            dir_queue = queue.Queue(maxsize=max(queue_size,len(roots)))
+            for root in roots:
+                dir_queue.put(root)
+            threads = [threading.Thread(target=walk_device,args=(dir_queue,),daemon=True)
+                       for _ in range(max(1,threads_per_device))]
+            for thread in threads:
+                thread.start()
+            workers.append((dir_queue,threads))
+
+        for dir_queue,threads in workers:
+            dir_queue.join()
+            for _ in threads:
+                dir_queue.put(None)
+            for thread in threads:
+                thread.join()
+
+        results.sort(key=lambda r:r[0])
+        return [r[1:] for r in results]
+
+    @staticmethod
+    def get_file_hash(filepath:str,partial=False)->str:
+        """ BLAKE2 hash of file content, partial: only first and last HASH_CHUNK_SIZE bytes
+            (identical to content hash for small files), None if file can't be read """
+        h = hashlib.blake2b(digest_size=32)
+        chunk_size = Persistence.HASH_CHUNK_SIZE
+        try:
+            with open(filepath,"rb") as f:
+                if partial:
+                    h.update(f.read(chunk_size))
+                    size = os.fstat(f.fileno()).st_size
+                    if size > chunk_size:
+                        f.seek(max(chunk_size,size-chunk_size))
+                        h.update(f.read(chunk_size))
+                else:
+                    for block in iter(lambda:f.read(Persistence.HASH_BLOCK_SIZE),b""):
+                        h.update(block)
+        except OSError:
+            print(f"[Persistence] Can't read file {filepath} for hashing")
+            return None
+        return h.hexdigest()
+
+    @staticmethod
+    def get_duplicates(files:list,threads=8,catalog=None,show_info=False)->list:
+        """ finds files with identical content for [(filepath,size,mtime)] in 3 stages:
+            same size, same hash of first and last 64KB, same BLAKE2 hash of whole content
+            (only for remaining candidates, files up to 128KB are already fully covered).
+            Candidates of the same size are stat'ed again (the listing may come from a catalog),
+            hashes are calculated in a thread pool and cached in catalog (FileCatalog)
+            if supplied, keyed by live size and mtime. Returns list of duplicate groups (sorted lists of filepaths)
+        """
+        # stage 1: group by size (empty files are not considered)
+        size_groups = {}
+        for filepath,size,mtime in files:
+            if size > 0:
+                size_groups.setdefault(size,[]).append((filepath,size,mtime))
+        # listing may be stale (catalog): live size / mtime (ns) of the candidates, also used as hash cache key
+        candidates = []
+        for group in size_groups.values():
+            if len(group) < 2:
+                continue
+            for filepath,_,_ in group:
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue
+                candidates.append((filepath,stat.st_size,stat.st_mtime_ns))
+        size_groups = {}
+        for f in candidates:
+            size_groups.setdefault(f[1],[]).append(f)
+        candidates = [f for group in size_groups.values() if len(group) > 1 and group[0][1] > 0 for f in group]
+        hashes = catalog.get_hashes(candidates) if catalog is not None else {}
+
+        def get_hashes(file_list:list,partial:bool)->dict:
+            """ hashes for files, cached ones are reused, new ones are stored """
+            hash_index = 0 if partial else 1
+            missing = [f for f in file_list if hashes.get(f[0],(None,None))[hash_index] is None]
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                new_hashes = list(executor.map(lambda f:Persistence.get_file_hash(f[0],partial=partial),missing))
+            for (filepath,_,_),file_hash in zip(missing,new_hashes):
+                partial_hash,full_hash = hashes.get(filepath,(None,None))
+                hashes[filepath] = (file_hash,full_hash) if partial else (partial_hash,file_hash)
+            if ( catalog is not None ) and missing:
+                catalog.set_hashes([(filepath,size,mtime_ns,*hashes[filepath]) for filepath,size,mtime_ns in missing])
+            return {f[0]:hashes[f[0]][hash_index] for f in file_list}
+
+        # stage 2: hash of first and last chunk
+        partial_hashes = get_hashes(candidates,partial=True)
+        partial_groups = {}
+        for f in candidates:
+            if partial_hashes[f[0]] is not None:
+                partial_groups.setdefault((f[1],partial_hashes[f[0]]),[]).append(f)
+
+        # stage 3: full content hash (small files are completely covered by partial hash)
+        groups = []
+        full_candidates = []
+        for (size,_),group in partial_groups.items():
+            if len(group) < 2:
+                continue
+            if size <= 2 * Persistence.HASH_CHUNK_SIZE:
+                groups.append([f[0] for f in group])
+            else:
+                full_candidates.extend(group)
+        full_hashes = get_hashes(full_candidates,partial=False)
+        full_groups = {}
+        for f in full_candidates:
+            if full_hashes[f[0]] is not None:
+                full_groups.setdefault(full_hashes[f[0]],[]).append(f[0])
+        groups.extend([group for group in full_groups.values() if len(group) > 1])
+
+        groups = sorted([sorted(group) for group in groups])
+        if show_info:
+            print(f"[Persistence] {len(files)} files, {len(candidates)} with same size, "
+                  f"{len(full_candidates)} fully hashed, {len(groups)} duplicate groups")
+        return groups
+
+    @staticmethod
+    def find_duplicates(fps:list,ignore_paths=[],files_filter=None,ext=None,threads=8,
+                        catalog=None,show_info=False)->list:
+        """ finds files with identical content (independent of file name) across file locations,
+            see get_duplicates. Returns list of duplicate groups (sorted lists of filepaths) """
+        files = [(filepath,size,mtime) for filepath,size,mtime,_ in
+                 Persistence.get_files_with_cleanup(fps,ignore_paths=ignore_paths,files_filter=files_filter,
+                                                    ext=ext,catalog=catalog)]
+        return Persistence.get_duplicates(files,threads=threads,catalog=catalog,show_info=show_info)
+
+    @staticmethod
+    def get_files_with_cleanup(fps:list,ignore_paths=[],files_filter=None,ext=None,
+                               delete_marker=None,catalog=None)->list:
+        """ files across file locations as [(filepath,size,mtime,cleanup)], each file only once,
+            cleanup is True if folder contains the delete_marker file (and is no mount point) """
+        if not isinstance(fps,list):
+            fps = [fps]
+        files = []
+        filepaths = set()
+        for fp in fps:
+            walked = catalog.walk_files(fp,ignore_paths=ignore_paths,ext=ext) if catalog is not None else \
+                     Persistence.walk_files(fp,ignore_paths=ignore_paths,ext=ext)
+            for subpath,is_mount,file_list in walked:
+                cleanup_folder = False
+                if isinstance(delete_marker,str):
+                    cleanup_folder = os.path.isfile(os.path.join(subpath,delete_marker)) and not is_mount
+                for f,size,_,mtime in file_list:
+                    if isinstance(files_filter,list) and not(Util.contains(f,files_filter)):
+                        continue
+                    filepath = os.path.join(subpath,f)
+                    filepath_key = os.path.normpath(os.path.abspath(filepath))
+                    if filepath_key in filepaths:
+                        continue
+                    filepaths.add(filepath_key)
+                    files.append((filepath,size,mtime,cleanup_folder))
+        return files
+
     @staticmethod
     def get_file_list_mult(fps:list,ignore_paths=[],files_filter=None,
-                    delete_marker=None, show_info= False, export_as_path_dir=False):
+                    delete_marker=None, show_info= False, export_as_path_dir=False,ext=None,parallel=False,
+                    catalog=None):
         """ creates a dictionary of files across file locations
             can be used for identifying duplicates / automatic deletion
 
@@ -874,6 +1450,14 @@ class Persistence:
             export_as_path_dir : bool
                 export dictionary will have filename as key (referencing found paths ).
                 If set to true the dictionary key will be path instead
+            ext : str or list
+                only files with these file extensions will be processed (None: all files)
+            parallel : bool
+                walk file paths in parallel (threads per drive), same result as sequential walk
+            catalog : FileCatalog
+                file catalog (catalog.py): only directories changed since the last scan are read,
+                sizes / dates of files in unchanged directories come from the catalog (in place
+                edits are not detected, use FileCatalog.walk_files(full=True) to refresh)
 
             Returns
             -------
@@ -888,71 +1472,74 @@ class Persistence:
             else:
                 fps = [fps]
 
+        if catalog is not None:
+            walked = itertools.chain.from_iterable([catalog.walk_files(fp,ignore_paths=ignore_paths,ext=ext)
+                                                    for fp in fps])
+        elif parallel:
+            walked = Persistence.walk_files_parallel(fps,ignore_paths=ignore_paths,ext=ext)
+        else:
+            walked = itertools.chain.from_iterable([Persistence.walk_files(fp,ignore_paths=ignore_paths,ext=ext)
+                                                    for fp in fps])
+
         files_dict = {}
-        for fp in fps:
-            for subpath,_,files in os.walk(fp):
-                # sp = os.path.normpath(os.path.join(fp,subpath))
-                # ignore paths
-                if Util.contains(subpath,ignore_paths):
-                    continue
+        for subpath,is_mount,files in walked:
 
-                # check if subpath contains a marker file for deletion
+            # check if subpath contains a marker file for deletion
+            cleanup_folder = False
+            if isinstance(delete_marker,str):
+                cleanup_folder = os.path.isfile(os.path.join(subpath,delete_marker))
+            if is_mount:
                 cleanup_folder = False
-                if isinstance(delete_marker,str):
-                    cleanup_folder = os.path.isfile(os.path.join(subpath,delete_marker))
-                if os.path.ismount(subpath):
-                    cleanup_folder = False
 
-                if cleanup_folder and show_info:
-                    print(f"--- FOLDER {subpath} marked for cleanup")
+            if cleanup_folder and show_info:
+                print(f"--- FOLDER {subpath} marked for cleanup")
 
-                for f in files:
-                    if isinstance(files_filter,list):
-                        if not(Util.contains(f,files_filter)):
-                            continue
-
-                    # get absolute path
-                    drive,subdrive_path =  os.path.splitdrive(subpath)
-
-                    file_abspath = os.path.join(drive, subdrive_path,f)
-
-                    file_props = files_dict.get(f,{})
-                    file_props_updated = {}
-
-                    # get file path
-                    file_paths = file_props.get("path",[])
-                    file_paths.append(subpath)
-                    file_paths = list(dict.fromkeys(file_paths))
-                    file_props_updated["path"] = file_paths
-                    file_props_updated["filename"] = f
+            for f,size,ctime,mtime in files:
+                if isinstance(files_filter,list):
+                    if not(Util.contains(f,files_filter)):
+                        continue
 
-                    # consider cleanup
-                    file_paths_cleanup = file_props.get("cleanup_path",[])
+                # get absolute path
+                drive,subdrive_path =  os.path.splitdrive(subpath)
+
+                file_abspath = os.path.join(drive, subdrive_path,f)
+
+                file_props = files_dict.get(f,{})
+                file_props_updated = {}
+
+                # get file path
+                file_paths = file_props.get("path",[])
+                file_paths.append(subpath)
+                file_paths = list(dict.fromkeys(file_paths))
+                file_props_updated["path"] = file_paths
+                file_props_updated["filename"] = f
+
+                # consider cleanup
+                file_paths_cleanup = file_props.get("cleanup_path",[])
+                if cleanup_folder:
+                    file_paths_cleanup.append(subpath)
+                file_paths_cleanup = list(dict.fromkeys(file_paths_cleanup))
+                file_props_updated["cleanup_path"] = file_paths_cleanup
+
+                # get other attributes (stat result of directory scan)
+                # byte_info = Util.byte_info(size,num_decimals=1,short=False)
+                created_on = datetime.fromtimestamp(int(ctime))
+                changed_on = datetime.fromtimestamp(int(mtime))
+                file_props_updated["filesize"] = size
+                file_props_updated["created_on"] = created_on
+                file_props_updated["changed_on"] = changed_on
+                # for urls get link address
+                if f[-3:] == "url":
+                    file_props_updated["url"] = Persistence.read_internet_shortcut(file_abspath)
+
+                # update
+                files_dict.update({f:file_props_updated})
+                if show_info:
+                    s_del = ""
                     if cleanup_folder:
-                        file_paths_cleanup.append(subpath)
-                    file_paths_cleanup = list(dict.fromkeys(file_paths_cleanup))
-                    file_props_updated["cleanup_path"] = file_paths_cleanup
-
-                    # get other attributes
-                    size = Path(file_abspath).stat().st_size
-                    # byte_info = Util.byte_info(size,num_decimals=1,short=False)
-                    created_on = datetime.fromtimestamp(int(Path(file_abspath).stat().st_ctime))
-                    changed_on = datetime.fromtimestamp(int(Path(file_abspath).stat().st_mtime))
-                    file_props_updated["filesize"] = size
-                    file_props_updated["created_on"] = created_on
-                    file_props_updated["changed_on"] = changed_on
-                    # for urls get link address
-                    if f[-3:] == "url":
-                        file_props_updated["url"] = Persistence.read_internet_shortcut(file_abspath)
-
-                    # update
-                    files_dict.update({f:file_props_updated})
-                    if show_info:
-                        s_del = ""
-                        if cleanup_folder:
-                            s_del = " [DELETE]"
-                        print("abspath",file_abspath,"subpath",subpath,"drive",drive,"file",f,size,Util.byte_info(size))
-                        print(f"[{drive[0]}] {f[:35]}... ({Util.byte_info(size)},created {created_on}) {s_del}")
+                        s_del = " [DELETE]"
+                    print("abspath",file_abspath,"subpath",subpath,"drive",drive,"file",f,size,Util.byte_info(size))
+                    print(f"[{drive[0]}] {f[:35]}... ({Util.byte_info(size)},created {created_on}) {s_del}")
 
         # export as dictionary with path as key
         if export_as_path_dir:
@@ -971,7 +1558,7 @@ class Persistence:
     @staticmethod
     def display_file_list_mult(fps,ignore_paths=[],files_filter=None,
                     delete_marker=None, delete_all_duplicates=True,
-                    show_del_files_only=False,show_info=False):
+                    show_del_files_only=False,show_info=False,parallel=False,catalog=None):
         """ display files read across file locations
             can be used for identifying duplicates / automatic deletion
 
@@ -992,6 +1579,10 @@ class Persistence:
                 only show files that will be deleted
             show_info : bool
                 show debugging info
+            parallel : bool
+                walk file paths in parallel (threads per drive)
+            catalog : FileCatalog
+                read files from file catalog (catalog.py)
             export_as_path_dir : bool
                 export dictionary will have filename as key (referencing found paths ).
                 If set to true the dictionary key will be path instead
@@ -1004,7 +1595,7 @@ class Persistence:
 
         path_dict = Persistence.get_file_list_mult(fps,ignore_paths=ignore_paths,files_filter=files_filter,
                                                    delete_marker=delete_marker, show_info=False,
-                                                   export_as_path_dir=True)
+                                                   export_as_path_dir=True,parallel=parallel,catalog=catalog)
 
         path_list = sorted(path_dict.keys(),key=str.lower)
 
@@ -1154,7 +1745,8 @@ class Persistence:
     @staticmethod
     def delete_files_mult(fps,ignore_paths=[],files_filter=None,delete_marker=None,
                         delete_all_duplicates = True, delete_folder=True,
-                        delete_ext = ["txt"],persist=False,show_info=True,verbose=False):
+                        delete_ext = ["txt"],persist=False,show_info=True,verbose=False,catalog=None,
+                        duplicates=DUPLICATES_NAME,threads=8):
         """ looks for a delete marker file, will delete all files of same name and eventually
             with different extensions and optionally all its duplicates
 
@@ -1181,54 +1773,81 @@ class Persistence:
                 show debugging info
             verbose : bool
                 show detailed information
+            catalog : FileCatalog
+                read files (and cached content hashes) from file catalog (catalog.py), deletion
+                decisions are checked against the file system (existence, live size / mtime for hashes)
+            duplicates : str
+                DUPLICATES_NAME: files with same name are duplicates,
+                DUPLICATES_CONTENT: files with identical content are duplicates (see get_duplicates)
+            threads : int
+                number of threads for hashing file contents
 
             Returns
             -------
             tuple: (folder_list, file_list) files and folders that were deleted
         """
 
-        fl = Persistence.get_file_list_mult(fps,ignore_paths=ignore_paths,files_filter=files_filter,
-                            delete_marker=delete_marker, show_info=False)
+        # duplicate sets: (label,[(path,filename)],cleanup paths)
+        duplicate_sets = []
+        if duplicates == Persistence.DUPLICATES_CONTENT:
+            files = Persistence.get_files_with_cleanup(fps,ignore_paths=ignore_paths,files_filter=files_filter,
+                                                       delete_marker=delete_marker,catalog=catalog)
+            file_cleanup = {filepath:cleanup for filepath,_,_,cleanup in files}
+            groups = Persistence.get_duplicates([f[:3] for f in files],threads=threads,catalog=catalog,show_info=show_info)
+            grouped = set([filepath for group in groups for filepath in group])
+            # files without duplicates form their own set
+            groups.extend([[filepath] for filepath,_,_,_ in files if not filepath in grouped])
+            for group in groups:
+                members = [os.path.split(filepath) for filepath in group]
+                cleanup_paths = list(dict.fromkeys([p for (p,_),filepath in zip(members,group) if file_cleanup[filepath]]))
+                duplicate_sets.append((os.path.basename(group[0]),members,cleanup_paths))
+        else:
+            fl = Persistence.get_file_list_mult(fps,ignore_paths=ignore_paths,files_filter=files_filter,
+                                delete_marker=delete_marker, show_info=False,catalog=catalog)
+            for f,v in fl.items():
+                duplicate_sets.append((f,[(p,f) for p in v["path"]],v["cleanup_path"]))
 
         if show_info:
-            if isinstance(fl,dict):
-                num_files = len(list(fl.keys()))
+            num_files = len(duplicate_sets)
             print("----------")
-            print(f"Delete extensions {delete_ext}, Duplicates:{delete_all_duplicates}, Folders:{delete_folder}, File count:{num_files}")
+            print(f"Delete extensions {delete_ext}, Duplicates:{delete_all_duplicates} ({duplicates}), Folders:{delete_folder}, File count:{num_files}")
             print("----------")
 
         delete_files = []
         delete_folders = []
+        stat_cache = StatCache()
 
-        for f,v in fl.items():
+        for f,members,cleanup_paths in duplicate_sets:
 
-            cleanup_paths = v["cleanup_path"]
-            p_list = v["path"]
+            p_list = [p for p,_ in members]
             if len(cleanup_paths) == 0:
                 continue
 
-            f_info = Persistence.get_filepath_info(f)
-            f_stem = f_info["stem"]
-            f_del_list = []
-            for ext in delete_ext:
-                f_del_list.append(f"{f_stem}.{ext}")
-
-            # add delete marker
-            f_del_list.append(delete_marker)
             if show_info and verbose:
                 print("----")
                 print(f"DELETE: file {f} \n        Paths {p_list}")
                 print(f"        Del paths {cleanup_paths})")
 
             # process all file duplicates
-            for p in p_list:
+            for p,f_member in members:
                 if ((not (p in cleanup_paths)) and (not delete_all_duplicates)):
                     continue
+
+                f_stem = Persistence.get_path_parts(f_member)[Persistence.FILEINFO_STEM]
+                f_del_list = []
+                for ext in delete_ext:
+                    f_del_list.append(f"{f_stem}.{ext}")
+
+                # add delete marker
+                f_del_list.append(delete_marker)
+
                 if show_info and verbose:
                     print(f"        * DELETE DIRECTORY: {p}")
+                # single directory listing for all files to be checked
+                stat_cache.add_dir(p)
                 for f_del in f_del_list:
                     f_del_abspath = os.path.join(p,f_del)
-                    if (not os.path.isfile(f_del_abspath)):
+                    if (not stat_cache.isfile(f_del_abspath)):
                         continue
                     delete_folders.append(p)
                     if show_info and verbose:
@@ -1281,7 +1900,7 @@ class Persistence:
     @staticmethod
     def get_file_groups(fp:str="",regex_list:list=["^(.{1,19})"],
                         file_match_type:str="ANY", single_match:bool=True,
-                        show_info:bool=False):
+                        show_info:bool=False,catalog=None):
         """ reads all files in a given filepath fp and will return
             groups of files in a dict that belong together, according
             to a list of regex expressions given as r. The Group name is the found regex expression
@@ -1293,61 +1912,50 @@ class Persistence:
             fp = "C.\\ ..."
             regex = ["^(.{1,19})"]
             will return groups for files thsat start with the same 19 characters of filename
+            catalog (FileCatalog, optional) is used to read the files
         """
 
         # get all files first
-        filelist = Persistence.get_file_list_mult([fp])
+        filelist = Persistence.get_file_list_mult([fp],catalog=catalog)
+
+        return Persistence.group_files(filelist,regex_list=regex_list,file_match_type=file_match_type,
+                                       single_match=single_match,show_info=show_info)
+
+    @staticmethod
+    def group_files(filelist:dict,regex_list:list=["^(.{1,19})"],
+                    file_match_type:str="ANY", single_match:bool=True,
+                    show_info:bool=False):
+        """ groups of files (see get_file_groups) for a file list as returned by get_file_list_mult
+            { filename: { "path":[paths] ... } }. The regex list is compiled once into a RuleSet,
+            the group name is the first group of the rule (whole match if the rule has no group)
+        """
         filegroup_dict = {}
 
         if file_match_type != "ALL":
             file_match_type = "ANY"
 
+        rules = RuleSet.get(regex_list,match_type=file_match_type)
+
         if show_info:
             print("\n --- get_file_groups (Persistence) ---")
             print(f"    FILE MATCH TYPE: [{file_match_type}] FILE REGEX RULES: {regex_list} \n")
 
-        for f in filelist.keys():
-            if show_info:
-                print(f"FILE: {f}")
-
-            # check for all regexex
-            file_regex_match_list = []
-            regex_match_result_list = []
-            m_result = ""
-            for r in regex_list:
-                m = re.match(r,f)
-                m_result = ""
-                if m:
-                    file_regex_match_list.append(True)
-                    # add result as key
-                    regex_match_result_list.append(m.groups()[0])
-                    m_result += (m.groups()[0]+", ")
-                else:
-                    file_regex_match_list.append(False)
-                    m_result += "None, "
-
-            # check for results
-            file_match_result = False
-            if file_match_type == "ALL":
-                file_match_result = all(file_regex_match_list)
-            else:
-                file_match_result = any(file_regex_match_list)
+        for f,file_info in filelist.items():
+            regex_match_result_list = rules.get_values(f,single_match=single_match)
+            file_match_result = regex_match_result_list is not None
 
             if show_info:
+                m_result = ", ".join([str(RuleSet.get_value(m)) if m else "None" for m in rules.matches(f)])
+                print(f"FILE: {f}")
                 print(f"  FILE {f}, match: {file_match_result} ({m_result})")
 
-
             # add match results as file patterns
             if file_match_result:
                 for regex_match_result in regex_match_result_list:
                     fg_list = filegroup_dict.get(regex_match_result,[])
-                    paths = filelist[f]["path"]
-                    for p in paths:
-                        fp = os.path.join(p,f)
-                        fg_list.append(fp)
+                    for p in file_info["path"]:
+                        fg_list.append(os.path.join(p,f))
                     filegroup_dict[regex_match_result] = fg_list
-                    if single_match:
-                        break
 
         return filegroup_dict
 
@@ -1378,7 +1986,8 @@ class Persistence:
             print(f"    FILEGROUP MATCH TYPE: {filegroup_match_type}")
             print(f"    FILE MATCH TYPE: [{file_match_type}] FILE REGEX RULES: {regex_list} \n")
 
-        match_result_dict = {}
+        # rules compiled once, empty regex list matches all files
+        rules = RuleSet.get(regex_list,match_type=file_match_type)
         filegroup_list_dict = {}
 
         for fg,filelist in filegroups.items():
@@ -1393,34 +2002,10 @@ class Persistence:
             filegroup_result_dict = {}
 
             for f in filelist:
-                #file_match_list = []
-                #file_match_result = False
-
-                # list of regex matches per file
-                file_regex_match_list = []
-                m_result = ""
-                for r in regex_list:
-                    m = re.match(r,f)
-                    m_result = ""
-                    if m:
-                        file_regex_match_list.append(True)
-                        m_result += (m.groups()[0]+", ")
-                    else:
-                        file_regex_match_list.append(False)
-                        m_result += "None, "
-
-                file_match_result = False
-
-                if file_match_type == "ALL":
-                    file_match_result = all(file_regex_match_list)
-                else:
-                    file_match_result = any(file_regex_match_list)
-
-                # special case: empty regex list defaults to true
-                if not regex_list:
-                    file_match_result = True
+                file_match_result = rules.is_match(f)
 
                 if show_info:
+                    m_result = ", ".join([str(RuleSet.get_value(m)) if m else "None" for m in rules.matches(f)])
                     print(f"  FILE {f}, match: {file_match_result} ({m_result})")
 
                 filegroup_match_list.append(file_match_result)
@@ -0,0 +1,163 @@
+""" compiled regex rule sets for file name grouping and filters """
+
+import re
+from functools import lru_cache
+
+class RuleSet:
+    """ list of regex rules compiled once: the rules are merged into a single alternation
+        with a named group per rule, so a file name is checked against all rules with one
+        regex call (first matching rule, or a quick check that no rule matches at all).
+        Rule sets that can't be merged (backreferences, inline flags, duplicate group names)
+        are checked rule by rule with the compiled single rules.
+        Use RuleSet.get to reuse rule sets across calls
+    """
+
+    MATCH_ANY = "ANY"
+    MATCH_ALL = "ALL"
+
+    # name of the group wrapping rule i in the merged regex
+    RULE_GROUP = "_rule{}"
+    # backreferences can't be merged (group numbers change)
+    REGEX_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+    def __init__(self,regex_list:list,match_type:str=MATCH_ANY,flags:int=0,search:bool=False):
+        """ regex_list: regex rules (str) or a single rule
+            match_type: MATCH_ALL / MATCH_ANY all / any rule needs to match
+            flags: re flags for all rules
+            search: rules are searched anywhere in the string (re.search), otherwise at the start (re.match) """
+        if isinstance(regex_list,str):
+            regex_list = [regex_list]
+        self.regex_list = list(regex_list)
+        self.match_type = RuleSet.MATCH_ALL if match_type == RuleSet.MATCH_ALL else RuleSet.MATCH_ANY
+        self._search = search
+        self._rules = [re.compile(r,flags) for r in self.regex_list]
+        self._merged = None
+        # group index of the first group of each rule in the merged regex
+        self._group_offsets = []
+        if len(self._rules) > 1:
+            self._merge(flags)
+
+    def _merge(self,flags:int):
+        if any([RuleSet.REGEX_BACKREF.search(r) for r in self.regex_list]):
+            return
+        parts = []
+        offsets = []
+        group = 0
+        for i,(r,rule) in enumerate(zip(self.regex_list,self._rules)):
+            group += 1
+            offsets.append(group)
+            parts.append(f"(?P<{RuleSet.RULE_GROUP.format(i)}>{r})")
+            group += rule.groups
+        try:
+            self._merged = re.compile("|".join(parts),flags)
+        except re.error:
+            return
+        self._group_offsets = offsets
+        self._rule_index = {offset:i for i,offset in enumerate(offsets)}
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _get(regex_tuple:tuple,match_type:str,flags:int,search:bool):
+        return RuleSet(list(regex_tuple),match_type=match_type,flags=flags,search=search)
+
+    @staticmethod
+    def get(regex_list,match_type:str=MATCH_ANY,flags:int=0,search:bool=False):
+        """ cached rule set for the rules (same object for repeated calls) """
+        if isinstance(regex_list,str):
+            regex_list = [regex_list]
+        return RuleSet._get(tuple(regex_list),match_type,flags,search)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def _apply(self,regex,s:str):
+        return regex.search(s) if self._search else regex.match(s)
+
+    @staticmethod
+    def get_value(m):
+        """ value of a rule match: first group of the rule (whole match for rules without groups) """
+        return m.group(1) if m.re.groups > 0 else m.group(0)
+
+    def any_match(self,s:str)->bool:
+        """ True if at least one rule matches """
+        if self._merged is not None:
+            return self._apply(self._merged,s) is not None
+        return any([self._apply(rule,s) is not None for rule in self._rules])
+
+    def first_match(self,s:str)->tuple:
+        """ (index,value) of the first matching rule (see get_value), None if no rule matches """
+        if ( self._merged is not None ) and self._search:
+            # leftmost match of the merged regex is not necessarily the first rule
+            if self._merged.search(s) is None:
+                return None
+        elif self._merged is not None:
+            m = self._merged.match(s)
+            if m is None:
+                return None
+            # in an alternation the first matching rule wins at the match position,
+            # its group is the outermost group, so it is the last closed one
+            i = self._rule_index[m.lastindex]
+            offset = self._group_offsets[i]
+            return (i,m.group(offset+1) if self._rules[i].groups > 0 else m.group(offset))
+        for i,rule in enumerate(self._rules):
+            m = self._apply(rule,s)
+            if m is not None:
+                return (i,RuleSet.get_value(m))
+        return None
+
+    def matches(self,s:str)->list:
+        """ match objects (None: no match) of all rules """
+        if self._merged is None:
+            return [self._apply(rule,s) for rule in self._rules]
+        m = self._apply(self._merged,s)
+        # no rule matches: single regex call
+        if m is None:
+            return [None] * len(self._rules)
+        if self._search:
+            return [rule.search(s) for rule in self._rules]
+        # rules before the first matching rule can't match
+        i = self._rule_index[m.lastindex]
+        return [None] * i + [rule.match(s) for rule in self._rules[i:]]
+
+    def _match_all(self,s:str)->list:
+        """ match objects of all rules, None as soon as one rule doesn't match """
+        ms = []
+        for rule in self._rules:
+            m = self._apply(rule,s)
+            if m is None:
+                return None
+            ms.append(m)
+        return ms
+
+    def is_match(self,s:str)->bool:
+        """ all / any rule matches (match_type), True for an empty rule set """
+        if not self._rules:
+            return True
+        if self.match_type == RuleSet.MATCH_ANY:
+            return self.any_match(s)
+        return self._match_all(s) is not None
+
+    def get_values(self,s:str,single_match:bool=False)->list:
+        """ values (see get_value) of the matching rules if the rule set matches
+            (match_type), otherwise None. single_match: only value of the first matching rule """
+        if not self._rules:
+            return None
+        if self.match_type == RuleSet.MATCH_ANY and single_match:
+            first = self.first_match(s)
+            return None if first is None else [first[1]]
+        if self.match_type == RuleSet.MATCH_ALL:
+            ms = self._match_all(s)
+        else:
+            ms = [m for m in self.matches(s) if m is not None]
+        if not ms:
+            return None
+        values = [RuleSet.get_value(m) for m in ms]
+        return values[:1] if single_match else values
+
+    def get_matching_rules(self,s:str)->list:
+        """ indexes of all rules matching s """
+        return [i for i,m in enumerate(self.matches(s)) if m is not None]
+
+    def filter(self,strings:list)->list:
+        """ strings matching the rule set (match_type) """
+        return [s for s in strings if self.is_match(s)]
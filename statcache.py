@@ -0,0 +1,96 @@
+""" per run cache of file system stat calls """
+
+import os
+import stat
+
+class StatCache:
+    """ caches os.stat results of paths for the duration of a run (one stat call per path),
+        directories can be listed with add_dir, then paths in there that are not in the listing
+        are answered without a stat call (names compared with os.path.normcase). The cache is not updated on file system changes,
+        use invalidate after creating / deleting files
+    """
+
+    def __init__(self):
+        # normalized path: stat result (None: path doesn't exist)
+        self._stats = {}
+        # normalized directory path: set of entry names
+        self._dirs = {}
+        self.num_calls = 0
+        self.num_hits = 0
+
+    @staticmethod
+    def get_key(path:str)->str:
+        return os.path.normcase(os.path.normpath(path))
+
+    def add_dir(self,path:str)->bool:
+        """ lists directory once (single scandir), returns False if it couldn't be read """
+        key = StatCache.get_key(path)
+        if key in self._dirs:
+            return True
+        try:
+            with os.scandir(key) as entries:
+                self._dirs[key] = set([os.path.normcase(entry.name) for entry in entries])
+        except OSError:
+            return False
+        return True
+
+    def stat(self,path:str):
+        """ os.stat result of a path (follows symlinks), None if it doesn't exist """
+        key = StatCache.get_key(path)
+        if key in self._stats:
+            self.num_hits += 1
+            return self._stats[key]
+        parent,name = os.path.split(key)
+        names = self._dirs.get(parent)
+        if ( names is not None ) and ( not name in names ):
+            self.num_hits += 1
+            self._stats[key] = None
+            return None
+        self.num_calls += 1
+        try:
+            result = os.stat(key)
+        except (OSError,ValueError):
+            result = None
+        self._stats[key] = result
+        return result
+
+    def exists(self,path:str)->bool:
+        return self.stat(path) is not None
+
+    def isfile(self,path:str)->bool:
+        result = self.stat(path)
+        return ( result is not None ) and stat.S_ISREG(result.st_mode)
+
+    def isdir(self,path:str)->bool:
+        result = self.stat(path)
+        return ( result is not None ) and stat.S_ISDIR(result.st_mode)
+
+    def getmtime(self,path:str)->float:
+        """ modification time, raises OSError like os.path.getmtime if path doesn't exist """
+        return self._get_stat(path).st_mtime
+
+    def getctime(self,path:str)->float:
+        return self._get_stat(path).st_ctime
+
+    def getsize(self,path:str)->int:
+        return self._get_stat(path).st_size
+
+    def _get_stat(self,path:str):
+        result = self.stat(path)
+        if result is None:
+            raise FileNotFoundError(f"[StatCache] {path} doesn't exist")
+        return result
+
+    def invalidate(self,path:str=None):
+        """ removes path (and listing of its directory) from cache, all entries if path is None """
+        if path is None:
+            self._stats = {}
+            self._dirs = {}
+            return
+        key = StatCache.get_key(path)
+        self._stats.pop(key,None)
+        self._dirs.pop(key,None)
+        self._dirs.pop(os.path.dirname(key),None)
+
+    def __len__(self):
+        return len(self._stats)
@@ -0,0 +1,883 @@
+""" columnar gpx track data (numpy arrays) """
+
+import io
+import os
+import re
+import sys
+import glob
+import shutil
+import fnmatch
+import hashlib
+import tempfile
+import traceback
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import pytz
+import numpy as np
+from image_meta.util import Util
+from image_meta.persistence import Persistence
+
+class Track(Mapping):
+    """ gpx track points stored as sorted numpy arrays (utc timestamps int64,
+        lat lon ele float64, optional heart rate / cadence, dictionary encoded
+        track names). Can be used as read only dict { utc timestamp: point dict }
+        as returned by Persistence.read_gpx, point dicts are created on access """
+
+    # marker for points without TrackPointExtension
+    NO_EXTENSION = -1
+    # arrays stored in binary files (attribute > file name)
+    ARRAYS = ["timestamps","lat","lon","ele","name_index","heart_rate","cadence"]
+    # prefix of the folders containing the saved arrays
+    ARRAYS_DIR = "arrays_"
+    # max time (s) between two track points of a continuous track segment
+    MAX_GAP = 300
+
+    def __init__(self,timestamps=None,lat=None,lon=None,ele=None,name_index=None,names=None,
+                 heart_rate=None,cadence=None):
+        """ constructor: arrays need to be sorted by timestamp (use Track.from_points otherwise),
+            name_index: index into list of track names, heart_rate / cadence: -1 for
+            points without TrackPointExtension """
+        self.timestamps = np.asarray(timestamps if timestamps is not None else [],dtype=np.int64)
+        n = len(self.timestamps)
+        self.lat = np.asarray(lat if lat is not None else [],dtype=np.float64)
+        self.lon = np.asarray(lon if lon is not None else [],dtype=np.float64)
+        self.ele = np.asarray(ele if ele is not None else [],dtype=np.float64)
+        if name_index is None:
+            name_index = np.zeros(n,dtype=np.int32)
+        self.name_index = np.asarray(name_index,dtype=np.int32)
+        self.names = list(names) if names else [None]
+        if heart_rate is None:
+            heart_rate = np.full(n,Track.NO_EXTENSION,dtype=np.int32)
+        if cadence is None:
+            cadence = np.full(n,Track.NO_EXTENSION,dtype=np.int32)
+        self.heart_rate = np.asarray(heart_rate,dtype=np.int32)
+        self.cadence = np.asarray(cadence,dtype=np.int32)
+        # max_gap > continuous segments (start,end arrays)
+        self.segments = {}
+
+    @staticmethod
+    def from_points(points)->"Track":
+        """ creates track from iterable of (utc timestamp,point dict) (Persistence.read_gpx_stream),
+            points with identical timestamps: last point wins (same as read_gpx dict) """
+        names = {}
+        timestamps = []
+        lat = []
+        lon = []
+        ele = []
+        name_index = []
+        heart_rate = []
+        cadence = []
+        for ts,point in points:
+            timestamps.append(ts)
+            lat.append(point["lat"])
+            lon.append(point["lon"])
+            ele.append(point["ele"])
+            name_index.append(names.setdefault(point.get("track_name"),len(names)))
+            heart_rate.append(point.get("heart_rate",Track.NO_EXTENSION))
+            cadence.append(point.get("cadence",Track.NO_EXTENSION))
+
+        arrays = {"timestamps":np.asarray(timestamps,dtype=np.int64),"lat":np.asarray(lat,dtype=np.float64),
+                  "lon":np.asarray(lon,dtype=np.float64),"ele":np.asarray(ele,dtype=np.float64),
+                  "name_index":np.asarray(name_index,dtype=np.int32),"heart_rate":np.asarray(heart_rate,dtype=np.int32),
+                  "cadence":np.asarray(cadence,dtype=np.int32)}
+        return Track(names=list(names.keys()),**Track.sort_unique(arrays))
+
+    @staticmethod
+    def sort_unique(arrays:dict)->dict:
+        """ sorts track arrays by timestamp (stable), for identical timestamps the last point is kept """
+        timestamps = arrays["timestamps"]
+        order = np.argsort(timestamps,kind="stable")
+        timestamps = timestamps[order]
+        keep = np.ones(len(order),dtype=bool)
+        if len(order) > 1:
+            keep[:-1] = timestamps[:-1] != timestamps[1:]
+        order = order[keep]
+        return {attribute:values[order] for attribute,values in arrays.items()}
+
+    @staticmethod
+    def from_dict(gpx_dict:dict)->"Track":
+        """ creates track from gpx dict (Persistence.read_gpx) """
+        if isinstance(gpx_dict,Track):
+            return gpx_dict
+        return Track.from_points(gpx_dict.items())
+
+    @staticmethod
+    def from_gpx(gpsx_path:str,debug=False,tz=pytz.timezone("Europe/Berlin"))->"Track":
+        """ reads gpx file into track, empty track if file can't be read """
+        try:
+            return Track.from_points(Persistence.read_gpx_stream(gpsx_path,debug=debug,tz=tz))
+        except:
+            print(f"Error reading gpsx file {gpsx_path}")
+            print(traceback.format_exc())
+            return Track()
+
+    @staticmethod
+    def get_gpx_files(paths)->list:
+        """ gpx files for a folder, a glob pattern or a list of those / of files (sorted, unique) """
+        if isinstance(paths,str):
+            paths = [paths]
+        files = []
+        for p in paths:
+            if os.path.isdir(p):
+                files.extend([os.path.join(p,f) for f in os.listdir(p)
+                              if os.path.splitext(f)[1].lower() == TrackCache.GPX_EXT])
+            elif os.path.isfile(p):
+                files.append(p)
+            else:
+                files.extend(glob.glob(p))
+        files = [os.path.abspath(f) for f in files if os.path.isfile(f)]
+        return sorted(set(files))
+
+    @staticmethod
+    def sort_by_priority(files:list,priority:list=None)->list:
+        """ sorts files by priority: list of file name patterns (eg device names "*fenix*"),
+            files matching the first pattern come first, files not matching any pattern last """
+        if not priority:
+            return list(files)
+        def rank(f):
+            name = os.path.basename(f)
+            for i,pattern in enumerate(priority):
+                if fnmatch.fnmatch(name.lower(),pattern.lower()):
+                    return i
+            return len(priority)
+        return sorted(files,key=lambda f:(rank(f),f))
+
+    @staticmethod
+    def read_gpx_file(gpx_path:str,cache_dir=None)->"Track":
+        """ reads a gpx file, cache_dir: None (no cache), True (default cache folder) or cache folder """
+        if cache_dir:
+            cache_dir = cache_dir if isinstance(cache_dir,str) else None
+            return TrackCache(cache_dir=cache_dir).get_track(gpx_path)
+        return Track.from_gpx(gpx_path)
+
+    @staticmethod
+    def from_gpx_files(paths,priority:list=None,cache_dir=None,processes=None,max_gap=MAX_GAP,loaded:dict=None,
+                       debug=False)->"Track":
+        """ reads gpx files (folder, glob pattern or list) in parallel and merges them into one track,
+            priority: list of file name patterns, see Track.merge
+            loaded: { gpx file path: Track } tracks already read (eg live track), these files aren't read again """
+        files = Track.sort_by_priority(Track.get_gpx_files(paths),priority)
+        if not files:
+            print(f"[Track] no gpx files found in {paths}")
+            return Track()
+        loaded = {os.path.abspath(f):track for f,track in ( loaded or {} ).items()}
+        read_files = [f for f in files if not f in loaded]
+        if len(read_files) <= 1 or processes == 1:
+            read_tracks = [Track.read_gpx_file(f,cache_dir) for f in read_files]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                read_tracks = list(executor.map(Track.read_gpx_file,read_files,[cache_dir]*len(read_files)))
+        read_tracks = dict(zip(read_files,read_tracks))
+        tracks = [loaded[f] if f in loaded else read_tracks[f] for f in files]
+        track = Track.merge(tracks,max_gap=max_gap)
+        if debug:
+            for f,t in zip(files,tracks):
+                print(f"[Track] {f}: {len(t)} points")
+            print(f"[Track] merged track from {len(files)} files: {len(track)} points")
+        return track
+
+    @staticmethod
+    def merge(tracks:list,max_gap=MAX_GAP)->"Track":
+        """ merges tracks into one sorted track without duplicate timestamps, tracks are
+            given in order of priority: points of a track are dropped where a track with higher
+            priority already covers the time (continuous segments with gaps up to max_gap seconds) """
+        names = {}
+        # covered time intervals (sorted, not overlapping)
+        starts = np.zeros(0,dtype=np.int64)
+        ends = np.zeros(0,dtype=np.int64)
+        columns = {attribute:[] for attribute in Track.ARRAYS}
+
+        for track in tracks:
+            if len(track) == 0:
+                continue
+            ts = track.timestamps
+            keep = np.ones(len(ts),dtype=bool)
+            if len(starts) > 0:
+                idx = np.searchsorted(starts,ts,side="right") - 1
+                keep = ~( ( idx >= 0 ) & ( ts <= ends[np.maximum(idx,0)] ) )
+            for attribute in Track.ARRAYS:
+                columns[attribute].append(np.asarray(getattr(track,attribute))[keep])
+            # remap track names
+            name_map = np.array([names.setdefault(n,len(names)) for n in track.names],dtype=np.int32)
+            columns["name_index"][-1] = name_map[columns["name_index"][-1]]
+            # add coverage of this track
+            seg_starts,seg_ends = track.get_segments(max_gap=max_gap)
+            starts,ends = Track.union_intervals(np.concatenate([starts,seg_starts]),np.concatenate([ends,seg_ends]))
+
+        if not names:
+            return Track()
+
+        arrays = {attribute:np.concatenate(columns[attribute]) for attribute in Track.ARRAYS}
+        # points are unique (covered points were dropped), sort by timestamp
+        order = np.argsort(arrays["timestamps"],kind="stable")
+        arrays = {attribute:values[order] for attribute,values in arrays.items()}
+        return Track(names=list(names.keys()),**arrays)
+
+    @staticmethod
+    def union_intervals(starts,ends)->tuple:
+        """ union of closed intervals [start,end], returns sorted arrays (starts,ends) """
+        if len(starts) == 0:
+            return (starts,ends)
+        order = np.argsort(starts,kind="stable")
+        starts = starts[order]
+        ends = ends[order]
+        # running max of ends, new interval starts after all previous intervals ended
+        ends_max = np.maximum.accumulate(ends)
+        new = np.ones(len(starts),dtype=bool)
+        new[1:] = starts[1:] > ends_max[:-1]
+        group_start = np.flatnonzero(new)
+        group_end = np.append(group_start[1:],len(starts)) - 1
+        return (starts[group_start],ends_max[group_end])
+
+    def get_segments(self,max_gap=MAX_GAP)->tuple:
+        """ continuous segments of track (time between points up to max_gap seconds),
+            returns arrays (start timestamps,end timestamps), index is built once per max_gap """
+        segments = self.segments.get(max_gap)
+        if segments is not None:
+            return segments
+        ts = self.timestamps
+        if len(ts) == 0:
+            return (np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64))
+        gap = np.flatnonzero(np.diff(ts) > max_gap)
+        starts = np.concatenate([ts[:1],ts[gap+1]])
+        ends = np.concatenate([ts[gap],ts[-1:]])
+        self.segments[max_gap] = (starts,ends)
+        return (starts,ends)
+
+    def get_segment_index(self,timestamps,max_gap=MAX_GAP)->np.ndarray:
+        """ index of the continuous track segment covering each timestamp (None allowed),
+            -1 if timestamp is in a gap or outside of track (binary search over segments) """
+        starts,ends = self.get_segments(max_gap=max_gap)
+        n = len(timestamps)
+        if ( n == 0 ) or ( len(starts) == 0 ):
+            return np.full(n,Util.NOT_FOUND,dtype=np.int64)
+        valid = np.array([t is not None for t in timestamps],dtype=bool)
+        ts = np.array([0 if t is None else t for t in timestamps],dtype=np.int64)
+        idx = np.searchsorted(starts,ts,side="right") - 1
+        covered = valid & ( idx >= 0 ) & ( ts <= ends[np.maximum(idx,0)] )
+        return np.where(covered,idx,Util.NOT_FOUND)
+
+    def is_covered(self,timestamps,max_gap=MAX_GAP)->np.ndarray:
+        """ bool array, True if timestamp is covered by a continuous track segment """
+        return self.get_segment_index(timestamps,max_gap=max_gap) != Util.NOT_FOUND
+
+    def get_coverage(self,timestamps:dict,max_gap=MAX_GAP)->dict:
+        """ coverage report for { key (eg image): utc timestamp }: number of images, segments,
+            keys covered / in gaps / outside of track / without timestamp, segments used """
+        keys = list(timestamps.keys())
+        values = [timestamps[k] for k in keys]
+        segment_index = self.get_segment_index(values,max_gap=max_gap)
+        starts,ends = self.get_segments(max_gap=max_gap)
+        report = {"images":len(keys),"segments":len(starts),"covered":[],"gap":[],"outside":[],"no_timestamp":[]}
+        for k,v,idx in zip(keys,values,segment_index.tolist()):
+            if v is None:
+                report["no_timestamp"].append(k)
+            elif idx != Util.NOT_FOUND:
+                report["covered"].append(k)
+            elif ( len(starts) > 0 ) and ( starts[0] <= v <= ends[-1] ):
+                report["gap"].append(k)
+            else:
+                report["outside"].append(k)
+        used = sorted(set(segment_index[segment_index != Util.NOT_FOUND].tolist()))
+        report["segments_used"] = [(int(starts[i]),int(ends[i])) for i in used]
+        return report
+
+    # earth radius in m
+    RADIUS_EARTH = 6371000.
+    # distance cap (m) for a single image when estimating clock offsets
+    OFFSET_MAX_DISTANCE = 1000.
+
+    def get_cartesian(self,idx=None)->np.ndarray:
+        """ cartesian coordinates (x,y,z) in m of track points (all or index array), shape (n,3) """
+        if idx is None:
+            idx = slice(None)
+        lat = np.radians(self.lat[idx])
+        lon = np.radians(self.lon[idx])
+        lat_radius = np.cos(lat) * Track.RADIUS_EARTH
+        return np.stack([np.sin(lon)*lat_radius,np.cos(lon)*lat_radius,np.sin(lat)*Track.RADIUS_EARTH],axis=1)
+
+    def get_subset(self,idx)->"Track":
+        """ track with points of index array / bool mask """
+        arrays = {attribute:np.asarray(getattr(self,attribute))[idx] for attribute in Track.ARRAYS}
+        return Track(names=self.names,**arrays)
+
+    def simplify(self,tolerance=None,interval=None,keep_timestamps=None,max_gap=MAX_GAP,debug=False)->"Track":
+        """ returns simplified track:
+            interval: time decimation, keeps (about) one track point per interval seconds
+            tolerance: Douglas Peucker on cartesian coordinates (m), using the time synchronized
+            distance (point vs. position interpolated by time), so coordinates interpolated
+            for a timestamp stay within tolerance
+            Always kept: first / last point of continuous segments (gaps > max_gap, segments are
+            split so that no gap > max_gap is created) and the track points before / after
+            each timestamp of keep_timestamps (image timestamps, matching stays unchanged) """
+        n = len(self)
+        if ( n < 3 ) or not ( tolerance or interval ):
+            return self
+        ts = self.timestamps
+
+        # points always kept
+        keep = np.zeros(n,dtype=bool)
+        keep[[0,-1]] = True
+        gap_idx = np.flatnonzero(np.diff(ts) > max_gap)
+        keep[gap_idx] = True
+        keep[gap_idx+1] = True
+        if keep_timestamps is not None:
+            t = np.array([k for k in keep_timestamps if k is not None],dtype=np.int64)
+            t = t[( t >= ts[0] ) & ( t <= ts[-1] )]
+            idx = np.searchsorted(ts,t,side="right") - 1
+            keep[idx] = True
+            keep[np.minimum(idx+1,n-1)] = True
+
+        # candidates: time decimation, first point in each time interval
+        candidates = np.ones(n,dtype=bool)
+        if interval:
+            bucket = ( ts - ts[0] ) // int(interval)
+            candidates[1:] = bucket[1:] != bucket[:-1]
+        candidates |= keep
+        cand = np.flatnonzero(candidates)
+
+        if tolerance:
+            keep_cand = keep[cand]
+            xyz = self.get_cartesian(cand)
+            ts_cand = ts[cand]
+            fixed = np.flatnonzero(keep_cand)
+            stack = list(zip(fixed[:-1].tolist(),fixed[1:].tolist()))
+            while stack:
+                i,j = stack.pop()
+                if j - i < 2:
+                    continue
+                span = ts_cand[j] - ts_cand[i]
+                w = ( ts_cand[i+1:j] - ts_cand[i] ) / span
+                p = xyz[i] + w[:,None] * ( xyz[j] - xyz[i] )
+                d = np.sqrt(np.sum(( xyz[i+1:j] - p ) ** 2,axis=1))
+                k = int(np.argmax(d))
+                if d[k] > tolerance:
+                    m = i + 1 + k
+                elif span > max_gap:
+                    # split in the middle (by time), no artificial gaps
+                    m = i + 1 + int(np.searchsorted(ts_cand[i+1:j],ts_cand[i]+span//2))
+                    m = min(max(m,i+1),j-1)
+                else:
+                    continue
+                keep_cand[m] = True
+                stack.extend([(i,m),(m,j)])
+            cand = cand[keep_cand]
+
+        track = self.get_subset(cand)
+        if debug:
+            print(f"[Track] simplified track from {n} to {len(track)} points (tolerance {tolerance}m, interval {interval}s)")
+        return track
+
+    def extend(self,other:"Track")->"Track":
+        """ returns track with points of other track added (other wins for identical timestamps) """
+        if len(other) == 0:
+            return self
+        if len(self) == 0:
+            return other
+        names = {n:i for i,n in enumerate(self.names)}
+        name_map = np.array([names.setdefault(n,len(names)) for n in other.names],dtype=np.int32)
+        arrays = {attribute:np.concatenate([getattr(self,attribute),getattr(other,attribute)]) for attribute in Track.ARRAYS}
+        arrays["name_index"][len(self):] = name_map[other.name_index]
+        # appended points are usually newer, sorting only needed otherwise
+        if other.timestamps[0] <= self.timestamps[-1]:
+            arrays = Track.sort_unique(arrays)
+        return Track(names=list(names.keys()),**arrays)
+
+    def save(self,dirpath:str,info:dict=None):
+        """ saves arrays as .npy files (can be memory mapped) and names / info as json.
+            Arrays are written to a new sub folder, the meta file pointing to it is replaced
+            last, so readers (also memory mapped ones) never see a partially written track.
+            Array folders are removed once they were replaced twice """
+        os.makedirs(dirpath,exist_ok=True)
+        meta_file = os.path.join(dirpath,TrackCache.META_FILE)
+        previous = {}
+        if os.path.isfile(meta_file):
+            try:
+                previous = Persistence.read_json(meta_file) or {}
+            except:
+                previous = {}
+        arrays_path = tempfile.mkdtemp(prefix=Track.ARRAYS_DIR,dir=dirpath)
+        for attribute in Track.ARRAYS:
+            np.save(os.path.join(arrays_path,attribute+".npy"),getattr(self,attribute),allow_pickle=False)
+        meta = {"names":self.names,"len":len(self),
+                "arrays":os.path.basename(arrays_path),"previous":previous.get("arrays")}
+        if info:
+            meta.update(info)
+        meta_tmp = os.path.join(arrays_path,TrackCache.META_FILE)
+        Persistence.save_json(meta_tmp,meta)
+        os.replace(meta_tmp,meta_file)
+        # folder replaced twice can't be in use by a reader of the previous meta file
+        outdated = previous.get("previous")
+        if outdated and outdated.startswith(Track.ARRAYS_DIR):
+            shutil.rmtree(os.path.join(dirpath,outdated),ignore_errors=True)
+
+    @staticmethod
+    def load(dirpath:str,mmap=True)->"Track":
+        """ loads track saved with Track.save, arrays are memory mapped per default,
+            returns None if there is no complete track """
+        meta_file = os.path.join(dirpath,TrackCache.META_FILE)
+        if not os.path.isfile(meta_file):
+            return None
+        meta = Persistence.read_json(meta_file)
+        mmap_mode = "r" if mmap else None
+        # tracks saved without array folder have their arrays in dirpath
+        arrays_path = os.path.join(dirpath,meta.get("arrays") or "")
+        arrays = {}
+        for attribute in Track.ARRAYS:
+            arrays[attribute] = np.load(os.path.join(arrays_path,attribute+".npy"),mmap_mode=mmap_mode,allow_pickle=False)
+        return Track(names=meta.get("names"),**arrays)
+
+    def get_index(self,timestamp)->int:
+        """ index of the last track point at or before timestamp,
+            Util.NOT_FOUND if timestamp is outside of track (same as Util.get_nearby_index) """
+        n = len(self.timestamps)
+        if ( timestamp is None ) or ( n == 0 ):
+            return Util.NOT_FOUND
+        if ( timestamp < self.timestamps[0] ) or ( timestamp > self.timestamps[-1] ):
+            return Util.NOT_FOUND
+        return int(np.searchsorted(self.timestamps,timestamp,side="right")) - 1
+
+    def match(self,timestamps,offset=0,timeframe=None,interpolate=True,max_gap=None)->dict:
+        """ matches a list of utc timestamps (None allowed) plus offset (s) to the track in one pass,
+            returns dict of arrays: valid (inside track and within timeframe seconds of a track point),
+            index (track point at or before timestamp, -1 if not valid), nearest (index of nearest track point),
+            timestamp (of nearest track point), lat / lon / ele (linearly interpolated between the
+            bracketing track points if interpolate is set, otherwise of track point at index),
+            gap (seconds to nearest track point), span (seconds between bracketing track points),
+            covered (inside a continuous track segment, see get_segments). If max_gap is set,
+            timestamps not covered (gaps longer than max_gap seconds) are not valid """
+        n = len(timestamps)
+        valid = np.array([t is not None for t in timestamps],dtype=bool)
+        ts = np.array([0 if t is None else t for t in timestamps],dtype=np.int64) + int(offset)
+        result = {"valid":np.zeros(n,dtype=bool),"index":np.full(n,Util.NOT_FOUND,dtype=np.int64),
+                  "nearest":np.full(n,Util.NOT_FOUND,dtype=np.int64),"timestamp":np.zeros(n,dtype=np.int64),
+                  "lat":np.full(n,np.nan),"lon":np.full(n,np.nan),"ele":np.full(n,np.nan),
+                  "gap":np.full(n,np.nan),"span":np.full(n,np.nan),"covered":np.zeros(n,dtype=bool)}
+        num_points = len(self)
+        if ( n == 0 ) or ( num_points == 0 ):
+            return result
+
+        track_ts = self.timestamps
+        valid &= ( ts >= track_ts[0] ) & ( ts <= track_ts[-1] )
+        idx = np.clip(np.searchsorted(track_ts,ts,side="right") - 1,0,num_points-1)
+        idx_next = np.minimum(idx+1,num_points-1)
+        t0 = track_ts[idx]
+        t1 = track_ts[idx_next]
+        span = t1 - t0
+        nearest = np.where(( idx_next != idx ) & ( t1 - ts < ts - t0 ),idx_next,idx)
+        gap = np.abs(track_ts[nearest] - ts)
+        if timeframe is not None:
+            valid &= gap <= timeframe
+        covered = self.is_covered(ts.tolist(),max_gap=Track.MAX_GAP if max_gap is None else max_gap)
+        covered &= valid
+        if max_gap is not None:
+            valid = covered
+
+        w = np.zeros(n)
+        if interpolate:
+            np.divide(ts - t0,span,out=w,where=span > 0)
+        # longitude difference across the antimeridian
+        dlon = ( self.lon[idx_next] - self.lon[idx] + 180. ) % 360. - 180.
+        lat = self.lat[idx] + w * ( self.lat[idx_next] - self.lat[idx] )
+        lon = np.where(w > 0,( self.lon[idx] + w * dlon + 180. ) % 360. - 180.,self.lon[idx])
+        ele = self.ele[idx] + w * ( self.ele[idx_next] - self.ele[idx] )
+
+        result["valid"] = valid
+        result["covered"] = covered
+        result["index"] = np.where(valid,idx,Util.NOT_FOUND)
+        result["nearest"] = np.where(valid,nearest,Util.NOT_FOUND)
+        result["timestamp"] = np.where(valid,track_ts[nearest],0)
+        for k,v in {"lat":lat,"lon":lon,"ele":ele,"gap":gap,"span":span}.items():
+            result[k] = np.where(valid,v,np.nan)
+        return result
+
+    def estimate_offset(self,timestamps,latlons=None,window=3600,center=0,step=1,max_gap=MAX_GAP,
+                        tolerance=50.,max_cells=2000000,debug=False)->dict:
+        """ estimates the camera clock offset (seconds to be added to image utc timestamps, None allowed)
+            by checking all offsets center-window ... center+window (step seconds) in one vectorized pass:
+            latlons given (image gps coordinates (lat,lon) or None, same order as timestamps): offset with
+            the smallest mean distance (capped at OFFSET_MAX_DISTANCE) between images and track positions,
+            confidence is the share of images within tolerance (m) times the contrast to the median score
+            otherwise: offset with most images covered by continuous track segments (ties: nearest to center),
+            confidence is the share of covered images, reduced if many offsets cover as many images
+            returns { offset (None if nothing matches), confidence (0...1), score, method, images } """
+        result = {"offset":None,"confidence":0.,"score":None,"method":None,"images":0}
+        ts = [t for t in timestamps]
+        if latlons is not None:
+            sel = [i for i,(t,latlon) in enumerate(zip(ts,latlons)) if ( t is not None ) and latlon]
+            method = "distance"
+        else:
+            sel = [i for i,t in enumerate(ts) if t is not None]
+            method = "coverage"
+        result["method"] = method
+        result["images"] = len(sel)
+        num_points = len(self)
+        if ( len(sel) == 0 ) or ( num_points < 2 ):
+            return result
+
+        ts = np.array([ts[i] for i in sel],dtype=np.int64)
+        offsets = np.arange(int(center)-int(window),int(center)+int(window)+1,max(int(step),1),dtype=np.int64)
+        starts,ends = self.get_segments(max_gap=max_gap)
+        track_ts = self.timestamps
+        if method == "distance":
+            lat = np.radians([latlons[i][0] for i in sel])
+            lon = np.radians([latlons[i][1] for i in sel])
+            img_xyz = np.stack([np.sin(lon)*np.cos(lat),np.cos(lon)*np.cos(lat),np.sin(lat)],axis=1) * Track.RADIUS_EARTH
+            track_xyz = self.get_cartesian()
+        scores = np.empty(len(offsets))
+
+        # process offsets in chunks, so that (offsets x images) arrays stay small
+        chunk = max(1,max_cells // len(ts))
+        for c in range(0,len(offsets),chunk):
+            t = ts[None,:] + offsets[c:c+chunk,None]
+            seg = np.searchsorted(starts,t,side="right") - 1
+            covered = ( seg >= 0 ) & ( t <= ends[np.maximum(seg,0)] )
+            if method == "coverage":
+                scores[c:c+chunk] = covered.sum(axis=1)
+                continue
+            idx = np.clip(np.searchsorted(track_ts,t,side="right") - 1,0,num_points-2)
+            t0 = track_ts[idx]
+            w = np.clip(( t - t0 ) / ( track_ts[idx+1] - t0 ),0.,1.)
+            d2 = np.zeros(t.shape)
+            for axis in range(3):
+                p0 = track_xyz[idx,axis]
+                d2 += ( p0 + w * ( track_xyz[idx+1,axis] - p0 ) - img_xyz[None,:,axis] ) ** 2
+            d = np.where(covered,np.minimum(np.sqrt(d2),Track.OFFSET_MAX_DISTANCE),Track.OFFSET_MAX_DISTANCE)
+            scores[c:c+chunk] = d.mean(axis=1)
+
+        dist_center = np.abs(offsets - int(center))
+        if method == "coverage":
+            best = np.lexsort((dist_center,-scores))[0]
+            if scores[best] == 0:
+                return result
+            ambiguity = np.count_nonzero(scores == scores[best]) / len(offsets)
+            confidence = ( scores[best] / len(ts) ) * ( 1. - ambiguity )
+        else:
+            best = np.lexsort((dist_center,scores))[0]
+            if scores[best] >= Track.OFFSET_MAX_DISTANCE:
+                return result
+            t = ts + offsets[best]
+            match = self.match(t.tolist(),max_gap=max_gap)
+            lat = np.radians(match["lat"])
+            lon = np.radians(match["lon"])
+            xyz = np.stack([np.sin(lon)*np.cos(lat),np.cos(lon)*np.cos(lat),np.sin(lat)],axis=1) * Track.RADIUS_EARTH
+            d = np.linalg.norm(xyz - img_xyz,axis=1)
+            inliers = np.count_nonzero(match["valid"] & ( d <= tolerance )) / len(ts)
+            median_score = np.median(scores)
+            contrast = ( 1. - scores[best] / median_score ) if median_score > 0 else 0.
+            confidence = inliers * contrast
+
+        result["offset"] = int(offsets[best])
+        result["score"] = float(scores[best])
+        result["confidence"] = float(np.clip(confidence,0.,1.))
+        if debug:
+            print(f"[Track] Estimated offset {result['offset']}s ({method}, {len(ts)} images, "
+                  f"{len(offsets)} offsets), score {result['score']:.1f}, confidence {result['confidence']:.2f}")
+        return result
+
+    def get_matched_point(self,match:dict,i:int)->dict:
+        """ point dict for i-th result of Track.match (None if not valid), contains
+            interpolated lat lon ele and attributes of the nearest track point """
+        if not match["valid"][i]:
+            return None
+        point = self.get_point(int(match["nearest"][i]))
+        point["lat"] = float(match["lat"][i])
+        point["lon"] = float(match["lon"][i])
+        point["ele"] = float(match["ele"][i])
+        return point
+
+    def get_timestamp(self,idx:int)->int:
+        """ utc timestamp of track point """
+        return int(self.timestamps[idx])
+
+    def get_point(self,idx:int)->dict:
+        """ track point as dict (lat,lon,ele,track_name,[heart_rate,cadence]) """
+        point = {"lat":float(self.lat[idx]),"lon":float(self.lon[idx]),"ele":float(self.ele[idx]),
+                 "track_name":self.names[self.name_index[idx]]}
+        if self.heart_rate[idx] != Track.NO_EXTENSION:
+            point["heart_rate"] = int(self.heart_rate[idx])
+            point["cadence"] = int(self.cadence[idx])
+        return point
+
+    def to_dict(self)->dict:
+        """ track as dict { utc timestamp: point dict } """
+        return {ts:self.get_point(i) for i,ts in enumerate(self.timestamps.tolist())}
+
+    def __getitem__(self,timestamp)->dict:
+        idx = self.get_index(timestamp)
+        if ( idx == Util.NOT_FOUND ) or ( self.timestamps[idx] != timestamp ):
+            raise KeyError(timestamp)
+        return self.get_point(idx)
+
+    def __iter__(self):
+        return iter(self.timestamps.tolist())
+
+    def __len__(self)->int:
+        return len(self.timestamps)
+
+    def __contains__(self,timestamp)->bool:
+        try:
+            self[timestamp]
+        except (KeyError,TypeError):
+            return False
+        return True
+
+class TrackCache:
+    """ binary cache of parsed gpx tracks, each track is stored in a folder
+        (memory mapped .npy arrays) named after the gpx file path, cache is valid
+        as long as size and modification time of the gpx file don't change """
+
+    # default cache folder (created next to gpx file)
+    CACHE_DIR = ".gpx_cache"
+    META_FILE = "track.json"
+    GPX_EXT = ".gpx"
+
+    def __init__(self,cache_dir:str=None,debug=False):
+        """ constructor: cache_dir (None: folder CACHE_DIR next to each gpx file) """
+        self.cache_dir = cache_dir
+        self.debug = debug
+
+    def get_cache_path(self,gpx_path:str)->str:
+        """ cache folder of a gpx file """
+        gpx_path = os.path.abspath(gpx_path)
+        cache_dir = self.cache_dir
+        if not cache_dir:
+            cache_dir = os.path.join(os.path.dirname(gpx_path),TrackCache.CACHE_DIR)
+        key = hashlib.sha1(gpx_path.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(cache_dir,"_".join([os.path.basename(gpx_path),key]))
+
+    @staticmethod
+    def get_file_key(gpx_path:str)->dict:
+        """ attributes identifying a gpx file version (path,size,mtime) """
+        stat = os.stat(gpx_path)
+        return {"path":os.path.abspath(gpx_path),"size":stat.st_size,"mtime_ns":stat.st_mtime_ns}
+
+    def load_meta(self,gpx_path:str)->dict:
+        """ info of cached track (file key, track names, ...), None if there is no cache """
+        meta_file = os.path.join(self.get_cache_path(gpx_path),TrackCache.META_FILE)
+        if not os.path.isfile(meta_file):
+            return None
+        return Persistence.read_json(meta_file)
+
+    def load(self,gpx_path:str)->Track:
+        """ returns cached track if it is valid, otherwise None """
+        try:
+            file_key = TrackCache.get_file_key(gpx_path)
+            cache_path = self.get_cache_path(gpx_path)
+            meta = self.load_meta(gpx_path)
+            if meta is None:
+                return None
+            if any([meta.get(k) != v for k,v in file_key.items()]):
+                return None
+            return Track.load(cache_path)
+        except:
+            print(f"[TrackCache] Error reading cache for {gpx_path}")
+            print(traceback.format_exc())
+            return None
+
+    def save(self,gpx_path:str,track:Track,file_key:dict=None):
+        """ stores track in cache, file_key: (path,size,mtime) of gpx file at time of parsing
+            (may contain additional info to be stored) """
+        if file_key is None:
+            file_key = TrackCache.get_file_key(gpx_path)
+        cache_path = self.get_cache_path(gpx_path)
+        try:
+            track.save(cache_path,info=file_key)
+        except:
+            print(f"[TrackCache] Error writing cache {cache_path}")
+            print(traceback.format_exc())
+            shutil.rmtree(cache_path,ignore_errors=True)
+
+    def get_track(self,gpx_path:str,debug=False,tz=pytz.timezone("Europe/Berlin"))->Track:
+        """ returns track from cache or parses the gpx file and updates cache """
+        track = self.load(gpx_path)
+        if track is not None:
+            if self.debug or debug:
+                print(f"[TrackCache] {gpx_path}: {len(track)} points read from cache")
+            return track
+        if not os.path.isfile(gpx_path):
+            print(f"[TrackCache] {gpx_path} is not a file")
+            return Track()
+        # key before parsing, a file changed while parsing will be read again next time
+        file_key = TrackCache.get_file_key(gpx_path)
+        try:
+            track = Track.from_points(Persistence.read_gpx_stream(gpx_path,debug=debug,tz=tz))
+        except:
+            print(f"Error reading gpsx file {gpx_path}")
+            print(traceback.format_exc())
+            return Track()
+        self.save(gpx_path,track,file_key=file_key)
+        if self.debug or debug:
+            print(f"[TrackCache] {gpx_path}: {len(track)} points parsed and cached")
+        return track
+
+    def prebuild(self,path:str,recursive=True)->int:
+        """ builds cache for all gpx files in path, returns number of parsed files """
+        num = 0
+        for subpath,_,files in os.walk(path):
+            for f in files:
+                if os.path.splitext(f)[1].lower() != TrackCache.GPX_EXT:
+                    continue
+                gpx_path = os.path.join(subpath,f)
+                if self.load(gpx_path) is not None:
+                    continue
+                track = self.get_track(gpx_path)
+                print(f"[TrackCache] {gpx_path}: {len(track)} points")
+                num += 1
+            if not recursive:
+                break
+        return num
+
+class TrackTail:
+    """ incremental reader for gpx files that are growing (live tracking): remembers
+        the byte offset after the last complete track point and parses only track points
+        appended since then. Closing tags rewritten by the logger are ignored, the file is
+        read completely again if it was replaced or changed before the offset.
+        State (and track) is kept in memory and optionally in a TrackCache """
+
+    # elements found in raw gpx data (any namespace prefix)
+    REGEX_ROOT = re.compile(rb"<(?:[\w.-]+:)?gpx\b[^>]*>")
+    REGEX_TRKPT = re.compile(rb"<(?:[\w.-]+:)?trkpt\b.*?</(?:[\w.-]+:)?trkpt\s*>",re.DOTALL)
+    REGEX_TRK = re.compile(rb"<(?:[\w.-]+:)?trk\b[^>]*>")
+    REGEX_NAME = re.compile(rb"<(?:[\w.-]+:)?name\s*>(.*?)</(?:[\w.-]+:)?name\s*>",re.DOTALL)
+    REGEX_TRKPT_END = re.compile(rb"</(?:[\w.-]+:)?trkpt\s*>$")
+    # bytes at file start used to detect replaced files
+    HEAD_SIZE = 4096
+    # max bytes of gpx header containing root element
+    ROOT_SIZE = 65536
+
+    def __init__(self,cache:TrackCache=None,debug=False):
+        """ constructor: optional TrackCache to persist tracks and offsets across runs """
+        self.cache = cache
+        self.debug = debug
+        # gpx filepath > state (track,offset,last_ts,root,track_name,head)
+        self.states = {}
+
+    @staticmethod
+    def get_head(f,offset:int)->str:
+        """ hash of file start (up to HEAD_SIZE bytes before offset) """
+        f.seek(0)
+        return hashlib.sha1(f.read(min(offset,TrackTail.HEAD_SIZE))).hexdigest()
+
+    def get_state(self,gpx_path:str)->dict:
+        """ state from memory or from cache """
+        state = self.states.get(gpx_path)
+        if ( state is not None ) or ( self.cache is None ):
+            return state
+        meta = self.cache.load_meta(gpx_path)
+        if ( meta is None ) or ( meta.get("tail") is None ):
+            return None
+        track = Track.load(self.cache.get_cache_path(gpx_path))
+        if track is None:
+            return None
+        state = {"track":track,**meta["tail"]}
+        self.states[gpx_path] = state
+        return state
+
+    def is_valid(self,f,state:dict,size:int)->bool:
+        """ checks whether file still contains the data read so far """
+        offset = state["offset"]
+        if ( offset == 0 ) or ( size < offset ):
+            return offset == 0
+        if TrackTail.get_head(f,offset) != state["head"]:
+            return False
+        f.seek(max(0,offset-64))
+        return TrackTail.REGEX_TRKPT_END.search(f.read(offset-max(0,offset-64))) is not None
+
+    def parse_chunk(self,data:bytes,root:bytes,track_name,tz=pytz.timezone("Europe/Berlin"))->tuple:
+        """ parses complete track points in raw data, returns (track,end offset in data,track name)
+            track points are wrapped into a minimal gpx document (root element keeps namespaces) """
+        parts = []
+        pos = 0
+        end = 0
+        in_track = False
+        for match in TrackTail.REGEX_TRKPT.finditer(data):
+            # a new track may start between track points
+            gap = data[pos:match.start()]
+            trk = None
+            for trk in TrackTail.REGEX_TRK.finditer(gap):
+                pass
+            if trk is not None:
+                name = TrackTail.REGEX_NAME.search(gap,trk.end())
+                track_name = None if name is None else name.group(1)
+                if in_track:
+                    parts.append(b"</trkseg></trk>")
+                    in_track = False
+            if not in_track:
+                name_tag = b"" if track_name is None else b"<name>"+track_name+b"</name>"
+                parts.extend([b"<trk>",name_tag,b"<trkseg>"])
+                in_track = True
+            parts.append(match.group(0))
+            pos = end = match.end()
+
+        if not parts:
+            return (Track(),0,track_name)
+
+        root_tag = re.match(rb"<([\w.:-]+)",root).group(1)
+        doc = b"".join([root,*parts,b"</trkseg></trk></",root_tag,b">"])
+        track = Track.from_points(Persistence.read_gpx_stream(io.BytesIO(doc),tz=tz))
+        return (track,end,track_name)
+
+    def get_track(self,gpx_path:str,tz=pytz.timezone("Europe/Berlin"))->Track:
+        """ returns track of gpx file, parsing only data appended since the last call """
+        gpx_path = os.path.abspath(gpx_path)
+        if not os.path.isfile(gpx_path):
+            print(f"[TrackTail] {gpx_path} is not a file")
+            return Track()
+
+        state = self.get_state(gpx_path)
+        with open(gpx_path,"rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if ( state is None ) or ( not self.is_valid(f,state,size) ):
+                f.seek(0)
+                root = TrackTail.REGEX_ROOT.search(f.read(TrackTail.ROOT_SIZE))
+                if root is None:
+                    print(f"[TrackTail] {gpx_path} no gpx root element found (yet)")
+                    return Track()
+                state = {"track":Track(),"offset":0,"last_ts":None,"root":root.group(0).decode("utf-8"),
+                         "track_name":None,"head":None}
+                if self.debug:
+                    print(f"[TrackTail] {gpx_path}: reading complete file")
+
+            offset = state["offset"]
+            f.seek(offset)
+            data = f.read(size-offset)
+
+        track_name = state["track_name"]
+        if track_name is not None:
+            track_name = track_name.encode("utf-8")
+        try:
+            track,end,track_name = self.parse_chunk(data,state["root"].encode("utf-8"),track_name,tz=tz)
+        except:
+            print(f"[TrackTail] Error parsing {gpx_path} from offset {offset}")
+            print(traceback.format_exc())
+            return state["track"]
+
+        if end == 0:
+            return state["track"]
+
+        state["track"] = state["track"].extend(track)
+        state["offset"] = offset + end
+        state["last_ts"] = state["track"].get_timestamp(-1)
+        state["track_name"] = None if track_name is None else track_name.decode("utf-8")
+        with open(gpx_path,"rb") as f:
+            state["head"] = TrackTail.get_head(f,state["offset"])
+        self.states[gpx_path] = state
+
+        if self.debug:
+            print(f"[TrackTail] {gpx_path}: {len(track)} new points, {len(state['track'])} points, offset {state['offset']}")
+
+        if self.cache is not None:
+            tail = {k:v for k,v in state.items() if k != "track"}
+            self.cache.save(gpx_path,state["track"],file_key={**TrackCache.get_file_key(gpx_path),"tail":tail})
+
+        return state["track"]
+
+if __name__ == "__main__":
+    # prebuild cache: python -m image_meta.track <gpx folder> [<cache folder>]
+    if len(sys.argv) < 2:
+        print("usage: python -m image_meta.track <gpx folder> [<cache folder>]")
+        sys.exit(1)
+    cache_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    num_files = TrackCache(cache_dir=cache_dir).prebuild(sys.argv[1])
+    print(f"[TrackCache] {num_files} gpx files added to cache")
@@ -0,0 +1,112 @@
+""" bulk conversion of local date times into UTC timestamps (precomputed DST transitions) """
+
+import numpy as np
+import pytz
+from datetime import datetime
+from image_meta.util import Util
+
+class TzConverter:
+    """ converts naive local times of a timezone into UTC timestamps in bulk:
+        the UTC offset transitions of the pytz timezone are precomputed as arrays
+        (in local wall time), so an array of naive local epoch seconds (local wall
+        time counted as if it was UTC) is converted with a single searchsorted.
+        Ambiguous and non-existent local times are resolved like pytz localize
+        (is_dst=False), which is used by Util.get_localized_datetime
+    """
+
+    # naive epoch of the first pytz transition (datetime.min)
+    EPOCH_MIN = np.iinfo(np.int64).min // 2
+    EPOCH_MAX = np.iinfo(np.int64).max // 2
+
+    def __init__(self,tz="Europe/Berlin",debug=False):
+        self._debug = debug
+        self._tz = Util.get_pytz(tz)
+        transition_times = getattr(self._tz,"_utc_transition_times",None)
+        if transition_times:
+            utc = [TzConverter.EPOCH_MIN]
+            utc.extend([int(t.replace(tzinfo=pytz.utc).timestamp()) for t in transition_times[1:]])
+            offsets = [int(info[0].total_seconds()) for info in self._tz._transition_info]
+            dst = [info[1].total_seconds() != 0 for info in self._tz._transition_info]
+        else:
+            # static timezone (UTC, fixed offsets)
+            utc = [TzConverter.EPOCH_MIN]
+            offsets = [int(self._tz.utcoffset(datetime(2000,1,1)).total_seconds())]
+            dst = [False]
+        # period i: utc in [utc_i,utc_i+1) with offset_i, in local time [start_i,end_i)
+        self.offsets = np.array(offsets,dtype=np.int64)
+        self.dst = np.array(dst,dtype=bool)
+        utc = np.array(utc,dtype=np.int64)
+        self.starts = utc + self.offsets
+        self.starts[0] = TzConverter.EPOCH_MIN
+        self.ends = np.append(utc[1:] + self.offsets[:-1],TzConverter.EPOCH_MAX)
+        if debug:
+            print(f"[TzConverter] {self._tz}, {len(self.offsets)} periods")
+
+    @property
+    def tz(self):
+        return self._tz
+
+    def get_offsets(self,local_epochs)->np.ndarray:
+        """ utc offsets (s) for naive local epoch seconds (array), pytz localize rules (is_dst=False):
+            non-existent times (gap) get the offset before the transition, ambiguous times
+            (overlap) the offset without dst, otherwise the smaller offset """
+        local = np.asarray(local_epochs,dtype=np.int64)
+        idx = np.maximum(np.searchsorted(self.starts,local,side="right") - 1,0)
+        offsets = self.offsets[idx]
+        # period before also contains the local time: overlap
+        prev = np.maximum(idx - 1,0)
+        ambiguous = ( idx > 0 ) & ( local < self.ends[prev] ) & ( local < self.ends[idx] )
+        if np.any(ambiguous):
+            o_prev = self.offsets[prev]
+            dst_prev = self.dst[prev]
+            dst_cur = self.dst[idx]
+            use_prev = np.where(dst_prev != dst_cur,~dst_prev,o_prev < offsets)
+            offsets = np.where(ambiguous & use_prev,o_prev,offsets)
+        # gaps keep the offset of the period before the transition (= period idx)
+        return offsets
+
+    def to_utc(self,local_epochs)->np.ndarray:
+        """ UTC timestamps for naive local epoch seconds (array) """
+        local = np.asarray(local_epochs,dtype=np.int64)
+        return local - self.get_offsets(local)
+
+    @staticmethod
+    def get_local_epochs(datetime_list:list)->tuple:
+        """ naive local epoch seconds for date strings in local time format (####:##:## ##:##:##),
+            returns (int64 array, bool array valid) """
+        n = len(datetime_list)
+        valid = np.zeros(n,dtype=bool)
+        iso = np.full(n,"NaT",dtype=object)
+        for i,s in enumerate(datetime_list):
+            if isinstance(s,str) and ( len(s) == 19 ) and Util.REGEX_FAST_LOCALIZED.fullmatch(s):
+                iso[i] = s[0:4]+"-"+s[5:7]+"-"+s[8:10]+"T"+s[11:19]
+                valid[i] = True
+        try:
+            epochs = np.array(iso.tolist(),dtype="datetime64[s]").astype(np.int64)
+        except ValueError:
+            # invalid dates (eg month 13), convert one by one
+            epochs = np.zeros(n,dtype=np.int64)
+            for i in np.flatnonzero(valid):
+                try:
+                    epochs[i] = np.datetime64(iso[i],"s").astype(np.int64)
+                except ValueError:
+                    valid[i] = False
+        epochs[~valid] = 0
+        return (epochs,valid)
+
+    def get_timestamps(self,datetime_list:list)->list:
+        """ UTC timestamps (int, None if not convertible) for date strings / datetimes,
+            same results as Util.get_localized_datetime(as_timestamp=True) with this timezone,
+            local time strings are converted in bulk, all other input one by one """
+        epochs,valid = TzConverter.get_local_epochs(datetime_list)
+        utc = self.to_utc(epochs).tolist()
+        timestamps = []
+        for i,dt in enumerate(datetime_list):
+            if valid[i]:
+                timestamps.append(utc[i])
+                continue
+            try:
+                timestamps.append(Util.get_localized_datetime(dt_in=dt,tz_in=self._tz,tz_out="UTC",as_timestamp=True))
+            except:
+                timestamps.append(None)
+        return timestamps
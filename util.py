@@ -2,6 +2,7 @@ import re
 from datetime import datetime
 from datetime import date
 from datetime import timedelta
+from datetime import timezone
 from dateutil.parser import parse
 from dateutil.tz import tzutc
 from dateutil.tz import tzoffset
@@ -10,6 +11,7 @@ from math import inf
 from math import log
 from math import floor
 from functools import reduce
+from functools import lru_cache
 import pytz
 
 class Util:
@@ -17,6 +19,74 @@ class Util:
 
     NOT_FOUND = -1
 
+    # date time formats (see get_datetime_from_string), precompiled
+    REGEX_UTC = re.compile("\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}Z$")
+    REGEX_DT = re.compile("\\d{4}[:-]\\d{2}[:-]\\d{2} \\d{2}[:-]\\d{2}[:-]\\d{2}")
+    REGEX_UTC2 = re.compile("\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}[.]000Z$")
+    REGEX_TZ = re.compile("\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}[+-]\\d{2}:\\d{2}$")
+    # fixed width formats that can be converted by slicing (get_fast_timestamp)
+    REGEX_FAST = re.compile("\\d{4}[:-]\\d{2}[:-]\\d{2} \\d{2}[:-]\\d{2}[:-]\\d{2}|"
+                            "\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}(?:[.]000Z|Z|[+-]\\d{2}:\\d{2})")
+    # formats where get_localized_datetime gives the same result as the fast path
+    REGEX_FAST_LOCALIZED = re.compile("\\d{4}[:-]\\d{2}[:-]\\d{2} \\d{2}:\\d{2}:\\d{2}|"
+                                      "\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}(?:[.]000Z|Z|[+-]\\d{2}:\\d{2})")
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_pytz(tz):
+        """ cached pytz timezone for timezone name (pytz timezones are returned as is, UTC otherwise) """
+        if isinstance(tz,pytz.BaseTzInfo):
+            return tz
+        elif isinstance(tz,str):
+            return pytz.timezone(tz)
+        return pytz.utc
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def get_utc_offset(tz,year:int,month:int,day:int,hour:int,minute:int)->int:
+        """ cached utc offset in seconds of local time (minute resolution) in timezone,
+            localized like pytz localize (is_dst=False) """
+        tz_info = Util.get_pytz(tz)
+        dt = tz_info.localize(datetime(year,month,day,hour,minute))
+        return int(dt.utcoffset().total_seconds())
+
+    @staticmethod
+    def get_fast_timestamp(datetime_s:str,local_tz='Europe/Berlin'):
+        """ fast path of get_timestamp for the fixed width formats (slicing instead of parsing),
+            returns None if string can't be converted this way """
+        if not ( isinstance(datetime_s,str) and Util.REGEX_FAST.fullmatch(datetime_s) ):
+            return None
+        try:
+            year,month,day = int(datetime_s[0:4]),int(datetime_s[5:7]),int(datetime_s[8:10])
+            hour,minute,second = int(datetime_s[11:13]),int(datetime_s[14:16]),int(datetime_s[17:19])
+            ts = int(datetime(year,month,day,hour,minute,second,tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            return None
+        n = len(datetime_s)
+        if n == 19:
+            # local time
+            ts -= Util.get_utc_offset(local_tz,year,month,day,hour,minute)
+        elif n == 25:
+            # time zone offset (+/-)hh:mm
+            offset = int(datetime_s[20:22]) * 3600 + int(datetime_s[23:25]) * 60
+            ts += ( offset if datetime_s[19] == "-" else -offset )
+        return ts
+
+    @staticmethod
+    def get_timestamps(datetime_list:list,local_tz='Europe/Berlin')->list:
+        """ batch conversion of date strings into UTC timestamps (formats see get_datetime_from_string),
+            returns list of int, None for strings that can't be converted """
+        timestamps = []
+        for datetime_s in datetime_list:
+            ts = Util.get_fast_timestamp(datetime_s,local_tz)
+            if ts is None:
+                try:
+                    ts = Util.get_timestamp(datetime_s,local_tz)
+                except:
+                    ts = None
+            timestamps.append(ts)
+        return timestamps
+
     @staticmethod
     def get_datetime_from_string(datetime_s:str,local_tz='Europe/Berlin',debug=False):
         """ returns datetime for date string with timezone 
@@ -32,26 +102,20 @@ class Util:
         if debug is True:
             datetime_s_in = datetime_s[:]
 
-        reg_expr_utc = "\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}Z$"
-        reg_expr_dt = "\\d{4}[:-]\\d{2}[:-]\\d{2} \\d{2}[:-]\\d{2}[:-]\\d{2}"
-
-        reg_expr_utc2 = "\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}[.]000Z$"
-        reg_expr_tz = "\\d{4}-\\d{2}-\\d{2}T\\d{2}:\\d{2}:\\d{2}[+-]\\d{2}:\\d{2}$"
-        
-        if ( ( len(re.findall(reg_expr_dt, datetime_s)) == 1 ) ): # date time format
+        if ( ( len(Util.REGEX_DT.findall(datetime_s)) == 1 ) ): # date time format
             try:
-                timezone_loc = pytz.timezone(local_tz)
+                timezone_loc = Util.get_pytz(local_tz)
                 dt_s = datetime_s[0:4]+"-"+datetime_s[5:7]+"-"+datetime_s[8:10]+" "+datetime_s[11:13]+"-"+datetime_s[14:16]+"-"+datetime_s[17:19]
                 dt = datetime.strptime(dt_s,"%Y-%m-%d %H-%M-%S")
                 dt = timezone_loc.localize(dt) # abstain from datetime.replace :-) ...
             except:
                 return 0
 
-        elif  ( len(re.findall(reg_expr_utc2, datetime_s)) == 1 ): # utc2 format
+        elif  ( len(Util.REGEX_UTC2.findall(datetime_s)) == 1 ): # utc2 format
             datetime_s = datetime_s[:-5] + "+00:00" 
-        elif ( len(re.findall(reg_expr_utc, datetime_s)) == 1 ): # utc format
+        elif ( len(Util.REGEX_UTC.findall(datetime_s)) == 1 ): # utc format
             datetime_s = datetime_s[:-1] + "+00:00" 
-        elif ( len(re.findall(reg_expr_tz, datetime_s)) == 1 ): # time zone format  
+        elif ( len(Util.REGEX_TZ.findall(datetime_s)) == 1 ): # time zone format  
             pass # this time zone already has the correct format
         else:
             print(f"can't evaluate time format {datetime_s} ")
@@ -76,6 +140,11 @@ class Util:
         """ returns UTC timestamp for date string  
         """
 
+        if debug is False:
+            ts = Util.get_fast_timestamp(datetime_s,local_tz)
+            if ts is not None:
+                return ts
+
         dt = Util.get_datetime_from_string(datetime_s,local_tz,debug)
         ts = int(dt.timestamp())
         if debug is True:
@@ -121,6 +190,12 @@ class Util:
 
         if dt_in is None:
             return None
+
+        # fast path for fixed width date strings
+        if as_timestamp and ( debug is False ) and isinstance(dt_in,str) and Util.REGEX_FAST_LOCALIZED.fullmatch(dt_in):
+            ts = Util.get_fast_timestamp(dt_in,tz_in)
+            if ts is not None:
+                return ts
         
         tz_utc = pytz.timezone("UTC")
         pytz_in = get_tz_info(tz_in)